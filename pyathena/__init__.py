@@ -32,43 +32,96 @@ __all__ = [
            "LoadSimTIGRESSXCO",
            "LoadSimTIGRESSXCOAll"]
 
-from .io.read_vtk import read_vtk, AthenaDataSet
-from .io.read_athinput import read_athinput
-from .io.read_hst import read_hst
-from .io.read_sphst import read_sphst
-from .io.read_timeit import read_timeit
-from .io.read_starpar_vtk import read_starpar_vtk
-from .io.read_zprof import read_zprof, read_zprof_all
-from .io.read_rst import read_rst, RestartHandler
+import importlib
 
-from .classic.vtk_reader import AthenaDataSet as AthenaDataSetClassic
+# Top-level names are imported on first access (PEP 562), so that
+# `import pyathena` does not import yt, matplotlib, scipy, IPython, and all
+# problem specific subpackages. Map name -> (module, attribute); attribute None
+# means the module itself.
+_lazy_imports = dict(
+    read_vtk=('.io.read_vtk', 'read_vtk'),
+    AthenaDataSet=('.io.read_vtk', 'AthenaDataSet'),
+    read_athinput=('.io.read_athinput', 'read_athinput'),
+    read_hst=('.io.read_hst', 'read_hst'),
+    read_sphst=('.io.read_sphst', 'read_sphst'),
+    read_timeit=('.io.read_timeit', 'read_timeit'),
+    read_starpar_vtk=('.io.read_starpar_vtk', 'read_starpar_vtk'),
+    read_zprof=('.io.read_zprof', 'read_zprof'),
+    read_zprof_all=('.io.read_zprof', 'read_zprof_all'),
+    read_rst=('.io.read_rst', 'read_rst'),
+    RestartHandler=('.io.read_rst', 'RestartHandler'),
 
-# LoadSim classes
-from .load_sim import LoadSim, LoadSimAll
+    AthenaDataSetClassic=('.classic.vtk_reader', 'AthenaDataSet'),
 
-# Problem specific subclasses
-from .feedback_test.load_sim_feedback_test import LoadSimFeedbackTest, LoadSimFeedbackTestAll
+    # LoadSim classes
+    LoadSim=('.load_sim', 'LoadSim'),
+    LoadSimAll=('.load_sim', 'LoadSimAll'),
 
-from .sf_cloud.load_sim_sf_cloud import LoadSimSFCloud, LoadSimSFCloudAll
-from .sf_cloud_rad.load_sim_sf_cloud_rad import LoadSimSFCloudRad, LoadSimSFCloudRadAll
+    # Problem specific subclasses
+    LoadSimFeedbackTest=('.feedback_test.load_sim_feedback_test', 'LoadSimFeedbackTest'),
+    LoadSimFeedbackTestAll=('.feedback_test.load_sim_feedback_test', 'LoadSimFeedbackTestAll'),
+    LoadSimSFCloud=('.sf_cloud.load_sim_sf_cloud', 'LoadSimSFCloud'),
+    LoadSimSFCloudAll=('.sf_cloud.load_sim_sf_cloud', 'LoadSimSFCloudAll'),
+    LoadSimSFCloudRad=('.sf_cloud_rad.load_sim_sf_cloud_rad', 'LoadSimSFCloudRad'),
+    LoadSimSFCloudRadAll=('.sf_cloud_rad.load_sim_sf_cloud_rad', 'LoadSimSFCloudRadAll'),
+    LoadSimTIGRESSDIG=('.tigress_dig.load_sim_tigress_dig', 'LoadSimTIGRESSDIG'),
+    LoadSimTIGRESSDIGAll=('.tigress_dig.load_sim_tigress_dig', 'LoadSimTIGRESSDIGAll'),
+    LoadSimTIGRESSSingleSN=('.tigress_single_sn.load_sim_tigress_single_sn', 'LoadSimTIGRESSSingleSN'),
+    LoadSimTIGRESSSingleSNAll=('.tigress_single_sn.load_sim_tigress_single_sn', 'LoadSimTIGRESSSingleSNAll'),
+    LoadSimTIGRESSXCO=('.tigress_xco.load_sim_tigress_xco', 'LoadSimTIGRESSXCO'),
+    LoadSimTIGRESSXCOAll=('.tigress_xco.load_sim_tigress_xco', 'LoadSimTIGRESSXCOAll'),
+    LoadSimTIGRESSNCR=('.tigress_ncr.load_sim_tigress_ncr', 'LoadSimTIGRESSNCR'),
+    LoadSimTIGRESSNCRAll=('.tigress_ncr.load_sim_tigress_ncr', 'LoadSimTIGRESSNCRAll'),
 
-from .tigress_dig.load_sim_tigress_dig import LoadSimTIGRESSDIG, LoadSimTIGRESSDIGAll
-from .tigress_single_sn.load_sim_tigress_single_sn import LoadSimTIGRESSSingleSN, LoadSimTIGRESSSingleSNAll
-from .tigress_xco.load_sim_tigress_xco import LoadSimTIGRESSXCO, LoadSimTIGRESSXCOAll
-from .tigress_ncr.load_sim_tigress_ncr import LoadSimTIGRESSNCR, LoadSimTIGRESSNCRAll
+    # ReadObs class
+    ReadObs=('.obs.read_obs', 'ReadObs'),
 
-# ReadObs class
-from .obs.read_obs import ReadObs
+    # Utils
+    Units=('.util.units', 'Units'),
+    ac=('.util.units', 'ac'),
+    au=('.util.units', 'au'),
+    rebin_xyz=('.util.rebin', 'rebin_xyz'),
+    rebin_xy=('.util.rebin', 'rebin_xy'),
+    mass_to_lum=('.util.mass_to_lum', 'mass_to_lum'),
 
-# Utils
-from .util.units import Units, ac, au
-from .util.rebin import rebin_xyz, rebin_xy
-from .util.mass_to_lum import mass_to_lum
+    Colormaps=('.plt_tools.cmap', 'Colormaps'),
+    cmap_shift=('.plt_tools.cmap', 'cmap_shift'),
+    get_cmap_planck=('.plt_tools.cmap', 'get_cmap_planck'),
+    get_cmap_parula=('.plt_tools.cmap', 'get_cmap_parula'),
+    scatter_sp=('.plt_tools.plt_starpar', 'scatter_sp'),
+    make_movie=('.plt_tools.make_movie', 'make_movie'),
+    display_movie=('.plt_tools.make_movie', 'display_movie'),
+    set_plt_default=('.plt_tools.set_plt', 'set_plt_default'),
+    set_plt_fancy=('.plt_tools.set_plt', 'set_plt_fancy'),
 
-from .plt_tools.cmap import Colormaps, cmap_shift, get_cmap_planck, get_cmap_parula
-from .plt_tools.plt_starpar import scatter_sp
-from .plt_tools.make_movie import make_movie, display_movie
-from .plt_tools.set_plt import set_plt_default, set_plt_fancy
+    # Microphysics
+    cool=('.microphysics.cool', None),
+    cool_gnat12=('.microphysics.cool_gnat12', None),
+    rec_rate=('.microphysics.rec_rate', None),
+    photx=('.microphysics.photx', None),
+    dust_draine=('.microphysics.dust_draine', None),
+)
 
-# Microphysics
-from .microphysics import cool, cool_gnat12, rec_rate, photx, dust_draine
+def __getattr__(name):
+    try:
+        module, attr = _lazy_imports[name]
+    except KeyError:
+        # Submodules not listed above (e.g., pyathena.util)
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as e:
+            if e.name != __name__ + '.' + name:
+                raise
+            raise AttributeError('module {0:s} has no attribute {1:s}'.\
+                                 format(__name__, name)) from None
+
+    obj = importlib.import_module(module, __name__)
+    if attr is not None:
+        obj = getattr(obj, attr)
+
+    # Cache so that __getattr__ is not called again
+    globals()[name] = obj
+    return obj
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazy_imports))
@@ -2,7 +2,8 @@ import struct
 import numpy as np
 import glob
 import os
-import sys
+
+from ..io.read_rst import _to_eint, _to_etot, _degrade, _refine
 
 #writer 
 
@@ -110,157 +111,20 @@ def write_allfile(pardata,rstdata,grids,grid_disp=np.array([0,0,0]),
     return
 
 def get_eint(rstdata,neg_correct=True):
-    eint=rstdata['ENERGY'].copy()
-    eint -= 0.5*rstdata['1-MOMENTUM']**2/rstdata['DENSITY']
-    eint -= 0.5*rstdata['2-MOMENTUM']**2/rstdata['DENSITY']
-    eint -= 0.5*rstdata['3-MOMENTUM']**2/rstdata['DENSITY']
-    
-    for i,f in enumerate(['1-FIELD','2-FIELD','3-FIELD']):
-        if f is '1-FIELD': Bc=0.5*(rstdata[f][:,:,:-1]+rstdata[f][:,:,1:])
-        elif f is '2-FIELD': Bc=0.5*(rstdata[f][:,:-1,:]+rstdata[f][:,1:,:])
-        elif f is '3-FIELD': Bc=0.5*(rstdata[f][:-1,:,:]+rstdata[f][1:,:,:])
-        eint -= 0.5*Bc**2
-    
-    if neg_correct:
-        k_end,j_end,i_end = eint.shape
-        k_str=j_str=i_str = 0
-        k,j,i=np.where(eint<0)
-        eavg=[]
-        for kk,jj,ii in zip(k,j,i):
-            kl=kk if kk==k_str else kk-1
-            kh=kk+1 if kk==(k_end-1) else kk+2
-            jl=jj if jj==j_str else jj-1
-            jh=jj+1 if jj==(j_end-1) else jj+2
-            il=ii if ii==i_str else ii-1
-            ih=ii+1 if ii==(i_end-1) else ii+2
-            epart=eint[kl:kh,jl:jh,il:ih]
-            e_neg=epart[epart<0]
-            Nneg=len(e_neg)
-            eavg.append((epart.sum()-e_neg.sum())/(epart.size-e_neg.size))
-            print(kk,jj,ii,eint[kk,jj,ii],eavg[-1],epart.sum(),e_neg.sum())
-        eint[k,j,i]=np.array(eavg)
-        if len(eint[eint<0]) > 0: sys.exit("negative energy persist!")
- 
-    return eint
+    """Convert total energy to internal energy and correct negative energy"""
+    return _to_eint(rstdata,neg_correct=neg_correct)
 
 def to_etot(rstdata):
-    eint=rstdata['ENERGY'].copy()
-   
-    eint += 0.5*rstdata['1-MOMENTUM']**2/rstdata['DENSITY']
-    eint += 0.5*rstdata['2-MOMENTUM']**2/rstdata['DENSITY']
-    eint += 0.5*rstdata['3-MOMENTUM']**2/rstdata['DENSITY']
-    
-    for i,f in enumerate(['1-FIELD','2-FIELD','3-FIELD']):
-        if f is '1-FIELD': Bc=0.5*(rstdata[f][:,:,:-1]+rstdata[f][:,:,1:])
-        elif f is '2-FIELD': Bc=0.5*(rstdata[f][:,:-1,:]+rstdata[f][:,1:,:])
-        elif f is '3-FIELD': Bc=0.5*(rstdata[f][:-1,:,:]+rstdata[f][1:,:,:])
-        eint += 0.5*Bc**2
-    return eint
+    """Convert internal energy to total energy"""
+    return _to_etot(rstdata)
 
 def degrade(rstdata,scalar=0):
-    
-    cc_varnames=['DENSITY','1-MOMENTUM','2-MOMENTUM','3-MOMENTUM',\
-                 'ENERGY','POTENTIAL']
-    fc_varnames=['1-FIELD','2-FIELD','3-FIELD']
-
-    scalar_varnames=[]
-    for ns in range(scalar):
-        scalar_varnames.append('SCALAR %d' % ns)
-    if scalar: cc_varnames += scalar_varnames
-
-    rstdata_new={}
-    for f in cc_varnames:
-        if f is 'ENERGY':
-            data=get_eint(rstdata)
-        else:
-            data=rstdata[f].copy()
-        shape=np.array(data.shape)/2
-        newdata=np.zeros(shape,dtype='d')
-        for i in range(2):
-            for j in range(2):
-                for k in range(2):
-                    newdata += data[k::2,j::2,i::2]
-        rstdata_new[f]=newdata*0.125
-        
-    for f in fc_varnames:
-        data=rstdata[f].copy()
-        shape=np.array(data.shape)/2
-        if f is '1-FIELD':
-            newdata=np.zeros(shape+np.array([0,0,1]),dtype='d')
-            for j in range(2):
-                for k in range(2):
-                    newdata += data[k::2,j::2,::2]
-        if f is '2-FIELD':
-            newdata=np.zeros(shape+np.array([0,1,0]),dtype='d')
-            for i in range(2):
-                for k in range(2):
-                    newdata += data[k::2,::2,i::2]
-        if f is '3-FIELD':
-            newdata=np.zeros(shape+np.array([1,0,0]),dtype='d')
-            for j in range(2):
-                for i in range(2):
-                    newdata += data[::2,j::2,i::2]
-        rstdata_new[f]=newdata*0.25
-        
-    rstdata_new['ENERGY']=to_etot(rstdata_new)
-    return rstdata_new
+    """Degrade restart dumps (average over 2^3 cells)"""
+    return _degrade(rstdata,scalar=scalar)
 
 def refine(rstdata,scalar=0):
-    
-    cc_varnames=['DENSITY','1-MOMENTUM','2-MOMENTUM','3-MOMENTUM',\
-                 'ENERGY']
-    if 'POTENTIAL' in rstdata: cc_varnames += ['POTENTIAL']
-    fc_varnames=['1-FIELD','2-FIELD','3-FIELD']
-    scalar_varnames=[]
-    for ns in range(scalar):
-        scalar_varnames.append('SCALAR %d' % ns)
-    
-    if scalar: cc_varnames += scalar_varnames
-    rstdata_new={}
-    for f in cc_varnames:
-        if f is 'ENERGY':
-            data=get_eint(rstdata)
-        else:
-            data=rstdata[f]
-        shape=np.array(data.shape)*2
-        newdata=np.zeros(shape,dtype='d')
-        for i in range(2):
-            for j in range(2):
-                for k in range(2):
-                    newdata[k::2,j::2,i::2] = data.copy()
-        rstdata_new[f]=newdata
-        
-    for f in fc_varnames:
-        data=rstdata[f]
-        shape=np.array(data.shape)*2
-        if f is '1-FIELD':
-            newdata=np.zeros(shape-np.array([0,0,1]),dtype='d')
-            idata = 0.5*(data[:,:,:-1]+data[:,:,1:])
-
-            for j in range(2):
-                for k in range(2):
-                    newdata[k::2,j::2,::2] = data.copy()
-                    newdata[k::2,j::2,1::2] = idata.copy()
-
-        if f is '2-FIELD':
-            newdata=np.zeros(shape-np.array([0,1,0]),dtype='d')
-            idata = 0.5*(data[:,:-1,:]+data[:,1:,:])
-            for i in range(2):
-                for k in range(2):
-                    newdata[k::2,::2,i::2] = data.copy()
-                    newdata[k::2,1::2,i::2] = idata.copy()
-                    
-        if f is '3-FIELD':
-            newdata=np.zeros(shape-np.array([1,0,0]),dtype='d')
-            idata = 0.5*(data[:-1,:,:]+data[1:,:,:])
-            for j in range(2):
-                for i in range(2):
-                    newdata[::2,j::2,i::2] = data.copy()
-                    newdata[1::2,j::2,i::2] = idata.copy()
-        rstdata_new[f]=newdata
-        
-    rstdata_new['ENERGY']=to_etot(rstdata_new)
-    return rstdata_new
+    """Refine restart dump (donor cell)"""
+    return _refine(rstdata,scalar=scalar)
 
 def calculate_grid(Nx,NBx):
     NGrids=(np.array(Nx)/np.array(NBx)).astype('int')
@@ -10,7 +10,11 @@ from matplotlib.colors import Normalize, LogNorm
 
 from ..plt_tools.cmap import cmap_apply_alpha,cmap_shift
 from ..microphysics.cool import get_xe_mol
-from .xray_emissivity import get_xray_emissivity
+
+try:
+    import numexpr
+except ImportError:
+    numexpr = None
 
 def static_vars(**kwargs):
     def decorate(func):
@@ -19,6 +23,47 @@ def static_vars(**kwargs):
         return func
     return decorate
 
+def evaluate(expr, local_dict):
+    """
+    Evaluate elementwise arithmetic expression of fields.
+
+    If numexpr is installed and all fields are numpy arrays, the expression
+    is evaluated in a single (multi-threaded) pass without full-size
+    temporaries. Otherwise, it is evaluated using xarray arithmetic (e.g.,
+    for dask arrays). Python scalars are cast to the dtype of the fields as
+    numpy does, so that both give the same result.
+
+    Parameters
+    ----------
+    expr: str
+       Expression, e.g., 'pressure/density*c'. Use names for all constants
+       because numexpr treats literals as double.
+    local_dict: dict
+       Dictionary of xarray DataArrays and scalars used in expr
+
+    Returns
+    -------
+    xarray DataArray
+    """
+
+    arrs = [v for v in local_dict.values() if isinstance(v, xr.DataArray)]
+    like = arrs[0]
+    if numexpr is not None and \
+       all([isinstance(v.data, np.ndarray) for v in arrs]):
+        ld = dict()
+        for k, v in local_dict.items():
+            if isinstance(v, xr.DataArray):
+                ld[k] = v.data
+            elif type(v) in (int, float):
+                # Python scalars do not change dtype of arrays in numpy
+                ld[k] = like.dtype.type(v)
+            else:
+                ld[k] = v
+        return xr.DataArray(numexpr.evaluate(expr, local_dict=ld),
+                            coords=like.coords, dims=like.dims)
+    else:
+        return eval(expr, {'__builtins__': None}, dict(local_dict))
+
 def set_derived_fields_def(par, x0, newcool):
     """
     Function to define derived fields info, for example,
@@ -225,15 +270,31 @@ def set_derived_fields_def(par, x0, newcool):
                          name='cmap_pyathena_Mr_abs')
     take_log[f] = True
 
+    # Internal: temperature from pressure and mean molecular weight
+    # (1.1 + xe - xH2) per H. Defined regardless of par, because fields of
+    # radiation and new cooling use it even when T is not defined or is the
+    # temperature field of the simulation.
+    f = '_T_mu'
+    field_dep[f] = set(['density','pressure','xe','xH2'])
+    def _T_mu(d, u):
+        return evaluate('pressure/(density*(a + xe - xH2))/c',
+                        dict(pressure=d['pressure'], density=d['density'],
+                             xe=d['xe'], xH2=d['xH2'], a=1.1,
+                             c=(ac.k_B/u.energy_density).cgs.value))
+    func[f] = _T_mu
+    label[f] = r'$T\;[{\rm K}]$'
+    cmap[f] = 'RdYlBu_r'
+    vminmax[f] = (1e1,1e7)
+    take_log[f] = True
+
     # Cooling related fields
     if par['configure']['cooling'] == 'ON':
         # T [K] - gas temperature
         f = 'T'
         if newcool:
-            field_dep[f] = set(['density','pressure','xe','xH2'])
+            field_dep[f] = set(['_T_mu'])
             def _T(d, u):
-                return d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-                    (ac.k_B/u.energy_density).cgs.value
+                return d['_T_mu']
         else:
             field_dep[f] = set(['temperature'])
             def _T(d, u):
@@ -671,11 +732,9 @@ def set_derived_fields_newcool(par, x0):
         xCtot = 1.6e-4*par['problem']['Z_gas']
         xOtot = 3.2e-4*par['problem']['Z_gas']
 
-    field_dep[f] = set(['xe','xH2','xHI','pressure','density','CR_ionization_rate'])
+    field_dep[f] = set(['xe','xH2','xHI','_T_mu','density','CR_ionization_rate'])
     def _xCII(d, u):
-        d['T'] = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-            (ac.k_B/u.energy_density).cgs.value
-        xe_mol = get_xe_mol(d['density'],d['xH2'],d['xe'],d['T'],d['CR_ionization_rate'],
+        xe_mol = get_xe_mol(d['density'],d['xH2'],d['xe'],d['_T_mu'],d['CR_ionization_rate'],
                             par['problem']['Z_gas'],par['problem']['Z_dust'])
         # Apply floor and ceiling
         return np.maximum(0.0,np.minimum(xCtot,
@@ -697,11 +756,9 @@ def set_derived_fields_newcool(par, x0):
         xCtot = 1.6e-4*par['problem']['Z_gas']
         xOtot = 3.2e-4*par['problem']['Z_gas']
 
-    field_dep[f] = set(['xe','xH2','xHI','pressure','density'])
+    field_dep[f] = set(['xe','xH2','xHI','_T_mu','density'])
     def _xCII_alt(d, u):
-        d['T'] = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-            (ac.k_B/u.energy_density).cgs.value
-        xe_mol = get_xe_mol(d['density'],d['xH2'],d['xe'],d['T'],par['problem']['xi_CR0'],
+        xe_mol = get_xe_mol(d['density'],d['xH2'],d['xe'],d['_T_mu'],par['problem']['xi_CR0'],
                             par['problem']['Z_gas'],par['problem']['Z_dust'])
         # Apply floor and ceiling
         return np.maximum(0.0,np.minimum(xCtot,
@@ -899,14 +956,13 @@ def set_derived_fields_rad(par, x0):
     # Caution: Draine (2011)'s alpha_eff_Halpha valid for ~1000 K < T < ~30000 K
     # Better to use this for warm gas only
     f = 'j_Halpha'
-    field_dep[f] = set(['density', 'pressure', 'xe', 'xHI', 'xH2'])
+    field_dep[f] = set(['density', '_T_mu', 'xe', 'xHI', 'xH2'])
     def _j_Halpha(d, u):
         hnu_Halpha = (ac.h*ac.c/(6562.8*au.angstrom)).to('erg')
         alpha_eff_Halpha = lambda T: 1.17e-13*(T*1e-4)**(-0.942-0.031*np.log(T*1e-4))
         # j_Halpha = nHII*ne*alpha_eff_Halpha*hnu_Halpha/(4pi)
         return d['density']**2*(1.0 - d['xHI'] - d['xH2'])*d['xe']*\
-            alpha_eff_Halpha(d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-                (ac.k_B/u.energy_density).cgs.value)*hnu_Halpha/(4.0*np.pi)
+            alpha_eff_Halpha(d['_T_mu'])*hnu_Halpha/(4.0*np.pi)
     func[f] = _j_Halpha
     label[f] = r'$\mathcal{j}_{\rm H\alpha}\;[{\rm erg}\,{\rm cm}^{-3}\,{\rm sr}^{-1}]$'
     cmap[f] = 'plasma'
@@ -1031,13 +1087,12 @@ def set_derived_fields_rad(par, x0):
 
     # Grain charge parameter
     f = 'psi_gr'
-    field_dep[f] = set(['density','pressure','xe','xH2',
+    field_dep[f] = set(['density','_T_mu','xe',
                         'rad_energy_density_LW','rad_energy_density_PE'])
     def _psi_gr(d, u):
         G0 = (d['rad_energy_density_PE']*u.energy_density.cgs.value/Erad_PE0 +
               d['rad_energy_density_LW']*u.energy_density.cgs.value/Erad_LW0)/1.7
-        T = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-                    (ac.k_B/u.energy_density).cgs.value
+        T = d['_T_mu']
         return G0*T**0.5/(d['density']*d['xe']) + 50.0 # add a floor
     
     func[f] = _psi_gr
@@ -1048,13 +1103,12 @@ def set_derived_fields_rad(par, x0):
 
     # PE heating efficiency
     f = 'eps_pe'
-    field_dep[f] = set(['density','pressure','xe','xH2',
+    field_dep[f] = set(['density','_T_mu','xe',
                         'rad_energy_density_LW','rad_energy_density_PE'])
     def _eps_pe(d, u):
         CPE_ = np.array([5.22, 2.25, 0.04996, 0.00430, 0.147, 0.431, 0.692])
         conv = u.energy_density.cgs.value*ac.c.cgs.value
-        T = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-            (ac.k_B/u.energy_density).cgs.value
+        T = d['_T_mu']
         chi_FUV = (d['rad_energy_density_PE']*u.energy_density.cgs.value/Erad_PE0 +
                    d['rad_energy_density_LW']*u.energy_density.cgs.value/Erad_LW0)
         G0 = chi_FUV*1.7 # Habing field
@@ -1077,14 +1131,13 @@ def set_derived_fields_rad(par, x0):
 
     # PE heating rate
     f = 'Gamma_pe'
-    field_dep[f] = set(['density','pressure','xe','xH2',
+    field_dep[f] = set(['density','_T_mu','xe',
                         'rad_energy_density_LW','rad_energy_density_PE'])
     def _eps_PE(d, u):
         CPE_ = np.array([5.22, 2.25, 0.04996, 0.00430, 0.147, 0.431, 0.692])
         G0 = (d['rad_energy_density_PE']*u.energy_density.cgs.value/Erad_PE0 +
               d['rad_energy_density_LW']*u.energy_density.cgs.value/Erad_LW0)*1.7
-        T = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-                    (ac.k_B/u.energy_density).cgs.value
+        T = d['_T_mu']
         # Grain charging
         x = G0*T**0.5/(d['density']*d['xe']) + 50.0 # add a floor
         return (CPE_[0] + CPE_[1]*np.power(T, CPE_[4]))/ \
@@ -1186,6 +1239,9 @@ def set_derived_fields_wind(par, x0):
 
 def set_derived_fields_xray(par, x0, newcool):
 
+    # Imports yt
+    from .xray_emissivity import get_xray_emissivity
+
     func = dict()
     field_dep = dict()
     label = dict()
@@ -1203,15 +1259,16 @@ def set_derived_fields_xray(par, x0, newcool):
     # Normalized FUV radiation field strength (Draine field unit)
     f = 'j_X'
     if newcool:
-        field_dep[f] = set(['density','pressure','xe','xH2'])
+        field_dep[f] = set(['density','_T_mu'])
     else:
         field_dep[f] = set(['density','temperature'])
     # Frequency integrated volume emissivity
     def _j_Xray(d, u):
         if newcool:
-            d['temperature'] = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
-                               (ac.k_B/u.energy_density).cgs.value
-        em = get_xray_emissivity(d['temperature'].data, Z_gas,
+            T = d['_T_mu']
+        else:
+            T = d['temperature']
+        em = get_xray_emissivity(T.data, Z_gas,
                                  emin, emax, energy=energy)
         return d['density']**2*em
     func[f] = _j_Xray
@@ -0,0 +1,37 @@
+import numpy as np
+import xarray as xr
+import astropy.constants as ac
+import pytest
+
+from pyathena.fields.fields import DerivedFields
+from pyathena.util.units import Units
+
+def get_par(cooling, new_cooling):
+    return dict(configure=dict(gas='hydro', cooling=cooling,
+                               new_cooling=new_cooling, radps='ON'),
+                problem=dict(Z_gas=1.0, Z_dust=1.0, xi_CR0=2e-16),
+                feedback=dict(iSN=1, iWind=0, iEarly=0),
+                domain1=dict(x1min=-1.0, x1max=1.0, x2min=-1.0, x2max=1.0,
+                             x3min=-1.0, x3max=1.0, Nx1=2, Nx2=2, Nx3=2))
+
+@pytest.mark.parametrize('cooling', ['ON', 'OFF'])
+@pytest.mark.parametrize('new_cooling', ['ON', 'OFF'])
+def test_radiation_fields_temperature(cooling, new_cooling):
+    """Fields that compute temperature from pressure and mean molecular
+    weight must not depend on T, which is not defined (cooling off) or is
+    the temperature field (old cooling).
+    """
+
+    dfi = DerivedFields(get_par(cooling, new_cooling)).dfi
+    for f in ('psi_gr', 'eps_pe', 'Gamma_pe', 'j_Halpha', 'j_X'):
+        if f in dfi:
+            assert 'T' not in dfi[f]['field_dep']
+
+    u = Units(kind='LV', muH=1.4271)
+    rng = np.random.default_rng(0)
+    d = dict([(k, xr.DataArray(rng.uniform(0.1, 2.0, (3, 4, 5)).astype(np.float32),
+                               dims=('z', 'y', 'x')))
+              for k in ('density', 'pressure', 'xe', 'xH2')])
+    T = d['pressure']/(d['density']*(1.1 + d['xe'] - d['xH2']))/\
+        (ac.k_B/u.energy_density).cgs.value
+    assert np.array_equal(dfi['_T_mu']['func'](d, u).values, T.values)
@@ -4,20 +4,32 @@ Read athena history file using pandas
 
 from __future__ import print_function
 
+import io
 import os
 import re
 import numpy as np
 import pandas as pd
 
+# Increase when the layout of the hst cache changes
+_HST_CACHE_VERSION = 1
+# Number of bytes before the parsed offset used to detect rewritten files
+_HST_CACHE_TAIL = 256
+
 def read_hst(filename, force_override=False, verbose=False):
-    """ Function to read athena history file and pickle
-    
+    """ Function to read athena history file and cache it
+
+    Parsed columns are cached in an HDF5 file (filename + '.h5') together with
+    the byte offset up to which the history file has been parsed. When the
+    history file grows (e.g., running simulation), only appended lines are
+    parsed and appended to the cache. The cache is rebuilt if the history
+    file is truncated or rewritten.
+
     Parameters
     ----------
     filename : string
         Name of the file to open, including extension
     force_override : bool
-        Flag to force read of hst file even when pickle exists
+        Flag to force read of hst file even when cache exists
     verbose : bool
         Print verbose messages
 
@@ -29,30 +41,149 @@ def read_hst(filename, force_override=False, verbose=False):
 
     skiprows = 3
 
-    fpkl = filename + '.p'
-    if not force_override and os.path.exists(fpkl) and \
-       os.path.getmtime(fpkl) > os.path.getmtime(filename):
-        hst = pd.read_pickle(fpkl)
+    fcache = filename + '.h5'
+    vlist = _get_hst_var(filename)
+    size = os.path.getsize(filename)
+
+    hst = None
+    if not force_override:
+        hst, offset = _read_hst_cache(fcache, filename, vlist)
+
+    if hst is None:
+        if verbose:
+            print('[read_hst]: cache does not exist or hst file rewritten.' + \
+                  ' Reading {0:s}'.format(filename))
+        with open(filename, 'rb') as fp:
+            for i in range(skiprows):
+                fp.readline()
+            offset = fp.tell()
+        hst_old = None
+    elif offset == size:
         if verbose:
-            print('[read_hst]: reading from existing pickle.')
+            print('[read_hst]: reading from existing cache.')
+        return hst
     else:
         if verbose:
-            print('[read_hst]: pickle does not exist or hst file updated.' + \
-                      ' Reading {0:s}'.format(filename))
-        vlist = _get_hst_var(filename)
-
-        # c engine does not support regex separators
-        hst = pd.read_csv(filename, names=vlist, skiprows=skiprows,
-                          comment='#', delim_whitespace=True, engine='python')
-        #hst = pd.read_table(filename, names=vlist, skiprows=skiprows,
-        #                    comment='#', delim_whitespace=True, engine='python')
-        try:
-            hst.to_pickle(fpkl)
-        except IOError:
-            pass
+            print('[read_hst]: parsing {0:d} bytes appended to {1:s}'.\
+                  format(size - offset, filename))
+        hst_old = hst
+
+    with open(filename, 'rb') as fp:
+        fp.seek(offset)
+        buf = fp.read(size - offset)
+
+    # Only complete lines are cached; the last line may still be written
+    end = buf.rfind(b'\n') + 1
+    hst_new = _parse_hst_lines(buf[:end], vlist)
+    hst_tail = _parse_hst_lines(buf[end:], vlist)
+
+    if hst_old is None:
+        hst = hst_new
+        _write_hst_cache(fcache, filename, vlist, hst, offset + end, rebuild=True)
+    else:
+        hst = pd.concat([hst_old, hst_new], ignore_index=True)
+        # Rewrite cache if dtype of any column changed (e.g., int to float)
+        rebuild = (hst.dtypes != hst_old.dtypes).any()
+        _write_hst_cache(fcache, filename, vlist, hst if rebuild else hst_new,
+                         offset + end, rebuild=rebuild)
+
+    if len(hst_tail) > 0:
+        hst = pd.concat([hst, hst_tail], ignore_index=True)
 
     return hst
 
+def _parse_hst_lines(buf, vlist):
+    """Parse lines of history file (bytes) using the C engine of read_csv
+    """
+
+    if len(buf.strip()) == 0:
+        return pd.DataFrame({v: np.array([], dtype=np.float64) for v in vlist})
+
+    # sep='\\s+' is equivalent to delim_whitespace=True and handled by the
+    # C engine
+    return pd.read_csv(io.BytesIO(buf), names=vlist, comment='#', sep=r'\s+',
+                       header=None)
+
+def _read_hst_cache(fcache, filename, vlist):
+    """Read cached history and byte offset parsed so far.
+
+    Returns (None, None) if the cache does not exist or is invalid.
+    """
+
+    if not os.path.exists(fcache):
+        return None, None
+
+    import h5py
+    try:
+        with h5py.File(fcache, 'r') as f:
+            attrs = f.attrs
+            if attrs['version'] != _HST_CACHE_VERSION or \
+               list(attrs['columns']) != list(vlist):
+                return None, None
+
+            offset = int(attrs['offset'])
+            tail = bytes(attrs['tail'].tobytes())
+            with open(filename, 'rb') as fp:
+                fp.seek(offset - len(tail))
+                if fp.read(len(tail)) != tail:
+                    return None, None
+
+            nrows = int(attrs['nrows'])
+            hst = pd.DataFrame({v: f[v][()] for v in vlist})
+            if len(hst) != nrows:
+                return None, None
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+    return hst, offset
+
+def _write_hst_cache(fcache, filename, vlist, hst, offset, rebuild=False):
+    """Write (rebuild=True) or append rows to cache and record offset.
+    """
+
+    import h5py
+
+    if not isinstance(hst.index, pd.RangeIndex):
+        # Number of fields does not match header; do not cache
+        return
+
+    with open(filename, 'rb') as fp:
+        n = min(_HST_CACHE_TAIL, offset)
+        fp.seek(offset - n)
+        tail = np.frombuffer(fp.read(n), dtype=np.uint8)
+
+    try:
+        if rebuild:
+            ftmp = '{0:s}.{1:d}.tmp'.format(fcache, os.getpid())
+            try:
+                with h5py.File(ftmp, 'w') as f:
+                    f.attrs['version'] = _HST_CACHE_VERSION
+                    f.attrs['columns'] = vlist
+                    for v in vlist:
+                        f.create_dataset(v, data=hst[v].values,
+                                         maxshape=(None,),
+                                         chunks=(16384,))
+                    f.attrs['nrows'] = len(hst)
+                    f.attrs['offset'] = offset
+                    f.attrs['tail'] = tail
+                os.replace(ftmp, fcache)
+            finally:
+                if os.path.exists(ftmp):
+                    os.remove(ftmp)
+        else:
+            with h5py.File(fcache, 'a') as f:
+                nrows = int(f.attrs['nrows'])
+                for v in vlist:
+                    dset = f[v]
+                    dset.resize((nrows + len(hst),))
+                    dset[nrows:] = hst[v].values
+                f.attrs['nrows'] = nrows + len(hst)
+                f.attrs['offset'] = offset
+                f.attrs['tail'] = tail
+    except (IOError, PermissionError, TypeError):
+        # Not writable or columns that cannot be stored (e.g., garbled lines)
+        pass
+
       
 def _get_hst_var(filename):
     """Read variable names from history file
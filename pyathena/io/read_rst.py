@@ -7,6 +7,9 @@ import sys
 import re
 from tqdm import tqdm
 
+# Number of z-planes processed at a time to limit temporary arrays
+_NSLAB = 16
+
 def read_rst(filename, verbose=False):
     """Wrapper function to return RestartHandler class to read/handle restart file"""
     return RestartHandler(filename, verbose=verbose)
@@ -70,25 +73,29 @@ class RestartHandler(object):
 
     def reset_par(self,pid=None):
         """Reset input parameters. May not be able to handle this fully automatically"""
-        par = self.par_misc['par'].decode()
-        parnew = self.par_misc.copy()
-
         if hasattr(self,'data_target'):
             Nx_new = self.data_target['DENSITY'].shape
             Nx = dict(Nx1=Nx_new[2],Nx2=Nx_new[1],Nx3=Nx_new[0])
-            is_new_domain = True
         else:
-            is_new_domain = False
+            Nx = None
 
         if hasattr(self,'NGrid_target'):
             NGrid = dict(NGrid_x1=self.NGrid_target[0],
                          NGrid_x2=self.NGrid_target[1],
                          NGrid_x3=self.NGrid_target[2])
-            is_new_grid = True
         else:
-            is_new_grid = False
+            NGrid = None
+
+        return self._reset_par(pid=pid,Nx=Nx,NGrid=NGrid,
+                               x3min=getattr(self,'new_x3min',None),
+                               x3max=getattr(self,'new_x3max',None),
+                               ideg=self.ideg,iref=self.iref)
+
+    def _reset_par(self,pid=None,Nx=None,NGrid=None,x3min=None,x3max=None,
+                   ideg=0,iref=0):
+        par = self.par_misc['par'].decode()
+        parnew = self.par_misc.copy()
 
-        ideg, iref = self.ideg, self.iref
         plist = par.split('\n')
         for i, p in enumerate(plist):
             psp = re.split('\s+',p)
@@ -97,20 +104,20 @@ class RestartHandler(object):
                 pnew = p.replace(psp[2],'{:s}'.format(pid))
                 if self.verbose: print('reset {}:'.format(psp[0]),pnew)
 
-            if(p.startswith('Nx') & is_new_domain):
+            if(p.startswith('Nx') & (Nx is not None)):
                 pnew = p.replace(psp[2],'{:d}'.format(Nx[psp[0]]))
                 if self.verbose: print('reset {}:'.format(psp[0]),pnew)
 
-            if(p.startswith('NGrid') & is_new_grid):
+            if(p.startswith('NGrid') & (NGrid is not None)):
                 pnew = p.replace('= '+psp[2],'= {:d}'.format(NGrid[psp[0]]))
                 if self.verbose: print('reset {}:'.format(psp[0]),pnew)
 
-            if(p.startswith('x3min') & hasattr(self,'new_x3min')):
-                pnew = p.replace(psp[2],'{:.1f}'.format(self.new_x3min))
+            if(p.startswith('x3min') & (x3min is not None)):
+                pnew = p.replace(psp[2],'{:.1f}'.format(x3min))
                 if self.verbose: print('reset {}:'.format(psp[0]),pnew)
 
-            if(p.startswith('x3max') & hasattr(self,'new_x3max')):
-                pnew = p.replace(psp[2],'{:.1f}'.format(self.new_x3max))
+            if(p.startswith('x3max') & (x3max is not None)):
+                pnew = p.replace(psp[2],'{:.1f}'.format(x3max))
                 if self.verbose: print('reset {}:'.format(psp[0]),pnew)
 
             if(p.startswith('eps_extinct') & ((ideg>0) | (iref>0))):
@@ -126,7 +133,6 @@ class RestartHandler(object):
 
         return parnew
 
-
     def reset_grids(self,ngrid=None):
         """Reset grid list with new grid size
 
@@ -197,8 +203,8 @@ class RestartHandler(object):
 
         rstdata_target=_degrade(data,scalar=ns)
         if check_divB:
-            divB = _divergence_B(rstdata_target)
-            if self.verbose: print("divB max:", divB.max())
+            divB = _max_divergence_B(rstdata_target)
+            if self.verbose: print("|divB| max:", divB)
         self.data_target = rstdata_target
         self.reset_grids() # recacluate grid as this changed domain
         self.ideg += 1
@@ -216,8 +222,8 @@ class RestartHandler(object):
 
         rstdata_target=_refine(data,scalar=ns)
         if check_divB:
-            divB = _divergence_B(rstdata_target)
-            if self.verbose: print("divB max:", divB.max())
+            divB = _max_divergence_B(rstdata_target)
+            if self.verbose: print("|divB| max:", divB)
         self.data_target = rstdata_target
         self.reset_grids() # recacluate grid as this changed domain
         self.iref += 1
@@ -248,6 +254,93 @@ class RestartHandler(object):
 
         return data
 
+    def write_streaming(self,outdir=None,pid="newrst",itime=0,level=0,
+                        zmin=None,zmax=None,ngrid=None,nprocs=1):
+        """Cut, degrade/refine, and write restart dump rank by rank.
+
+        Out-of-core alternative to read/cut_z/degrade/refine/write. The full
+        domain is never assembled: for each new rank, the region it needs is
+        read from memory-mapped restart files of the old ranks (with one cell
+        halo), transformed, and written. Peak memory is a few ranks' worth of
+        data per process. Result is identical to the in-memory pipeline.
+
+        Parameters
+        ----------
+        outdir : str
+            Output directory. Default is ../newrst relative to restart file.
+        pid : str
+            problem_id of new restart dump
+        itime : int
+            Restart file number
+        level : int
+            1 to degrade, -1 to refine, 0 to keep resolution
+        zmin, zmax : float
+            If given, cut vertical domain (before degrade/refine)
+        ngrid : array like
+            New grid dimension [nx, ny, nz]. Default is the current grid size
+            (limited by the new domain size).
+        nprocs : int
+            Number of processes to write ranks in parallel. Default is 1.
+
+        Returns
+        -------
+        new_fname : str
+            Name of restart file of rank 0
+        """
+        if level not in (-1,0,1):
+            raise ValueError('level should be -1 (refine), 0, or 1 (degrade)')
+
+        # Domain to be transformed (after cut_z) in cells of original domain
+        Nsrc = self.Nx.copy()
+        k0 = 0
+        x3min = x3max = None
+        if zmin is not None or zmax is not None:
+            k0,k1 = self._find_kmin_kmax(
+                self.dm['x3min'] if zmin is None else zmin,
+                self.dm['x3max'] if zmax is None else zmax)
+            Nsrc[2] = k1 - k0
+            x3min, x3max = self.xfc['z'][k0], self.xfc['z'][k1]
+
+        if level == 1:
+            Nnew = Nsrc//2
+        elif level == -1:
+            Nnew = Nsrc*2
+        else:
+            Nnew = Nsrc
+
+        if ngrid is None:
+            ngrid = np.gcd(Nnew,self.ngrid)
+        grids, NGrid = _calculate_grid(Nnew,ngrid,verbose=self.verbose)
+
+        par = self._reset_par(pid=pid,
+                              Nx=dict(Nx1=Nnew[0],Nx2=Nnew[1],Nx3=Nnew[2]),
+                              NGrid=dict(NGrid_x1=NGrid[0],NGrid_x2=NGrid[1],
+                                         NGrid_x3=NGrid[2]),
+                              x3min=x3min,x3max=x3max,
+                              ideg=int(level == 1),iref=int(level == -1))
+
+        if outdir is None:
+            outdir = osp.join(osp.dirname(self.fname),'../newrst')
+        if not osp.isdir(outdir): os.mkdir(outdir)
+
+        job = dict(fnames=[_get_rank_fname(self.fname,g['id']) for g in self.grids],
+                   grids=self.grids, Nsrc=Nsrc, k0=k0, level=level,
+                   nscalars=self.nscalars, par=par, stars=self.stars,
+                   outdir=outdir, pid=pid, itime=itime)
+
+        if nprocs > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            import functools
+            with ProcessPoolExecutor(nprocs) as ex:
+                fnames = list(tqdm(ex.map(functools.partial(_write_rank,job),grids,
+                                          chunksize=max(1,len(grids)//(4*nprocs))),
+                                   total=len(grids),desc='Writing...'))
+        else:
+            fnames = [_write_rank(job,g) for g in tqdm(grids,desc='Writing...')]
+
+        if self.verbose: print("new restart dump is written in: {}".format(fnames[0]))
+        return fnames[0]
+
     def pop_scalar(self,ipop):
         """Pop scalar"""
         if hasattr(self,'data_target'):
@@ -399,19 +492,100 @@ def write_allfile(pardata,rstdata,grids,stars,grid_disp=np.array([0,0,0]),
 
     return fname0
 
+def _get_rank_fname(rstfile,i):
+    """Restart file name of i-th rank (in the same or ../id{i} directory)"""
+    if i == 0: return rstfile
+    dirname=osp.dirname(rstfile)
+    basename=osp.basename(rstfile)
+    rstfname = '%s/%s-id%d%s' % (dirname,basename[:-9],i,basename[-9:])
+    if not osp.isfile(rstfname):
+        rstfname = '%s/../id%d/%s-id%d%s' % (dirname,i,basename[:-9],i,basename[-9:])
+    return rstfname
+
+def _write_rank(job,g):
+    """Read region of (transformed) domain covered by new grid g from old
+    ranks, transform, and write restart file of g"""
+    level=job['level']
+    Nsrc=job['Nsrc']
+    lo=g['is']
+    hi=g['is']+g['Nx']
+
+    # Region of source domain needed (with halo for negative energy correction)
+    if level == 1:
+        slo=np.maximum(2*lo-2,0)
+        shi=np.minimum(2*hi+2,Nsrc)
+        rlo=slo//2
+    elif level == -1:
+        slo=np.maximum(lo//2-1,0)
+        shi=np.minimum(-(-hi//2)+1,Nsrc)
+        rlo=slo*2
+    else:
+        slo,shi,rlo=lo,hi,lo
+
+    k0=np.array([0,0,job['k0']])
+    data=_read_box(job['fnames'],job['grids'],slo+k0,shi+k0)
+
+    ns=job['nscalars']
+    if level == 1:
+        data=_degrade(data,scalar=ns)
+    elif level == -1:
+        data=_refine(data,scalar=ns)
+
+    # Crop to grid
+    il=lo-rlo
+    iu=hi-rlo
+    data_part={}
+    for f in data:
+        ib,jb,kb=(0,0,0)
+        if f.startswith('1-FIELD'): ib=1
+        if f.startswith('2-FIELD'): jb=1
+        if f.startswith('3-FIELD'): kb=1
+        data_part[f]=data[f][il[2]:iu[2]+kb,il[1]:iu[1]+jb,il[0]:iu[0]+ib]
+
+    if g['id'] == 0:
+        fname=job['pid']+'.%4.4d.rst' % job['itime']
+    else:
+        fname=job['pid']+'-id%d.%4.4d.rst' % (g['id'],job['itime'])
+    fname=osp.join(job['outdir'],fname)
+    _write_onefile(fname,data_part,job['par'],job['stars'])
+
+    return fname
+
+def _read_box(fnames,grids,lo,hi):
+    """Read region [lo, hi) (cells, x-y-z order) of the domain from
+    memory-mapped restart files of all ranks. Face-centered fields include
+    the upper faces. Shared faces are taken from the rank with larger id as
+    in _read_all_grid."""
+    rstdata={}
+    for g,fname in zip(grids,fnames):
+        gis=g['is']
+        gie=gis+g['Nx']
+        if (gis > hi).any() or (gie < lo).any():
+            continue
+
+        par,fm,data=_map_one_grid(fname)
+        for k in data:
+            ib,jb,kb=(0,0,0)
+            if k.startswith('1'): ib=1
+            if k.startswith('2'): jb=1
+            if k.startswith('3'): kb=1
+            b=np.array([ib,jb,kb]) if fm[k]['vtype'] == 'fcvar' else np.zeros(3,dtype=int)
+            if k not in rstdata:
+                rstdata[k]=np.empty(tuple((hi-lo+b)[::-1]),dtype=fm[k]['dtype'])
+            # Overlap in global (face) index
+            l=np.maximum(gis,lo)
+            u=np.minimum(gie+b,hi+b)
+            if (u <= l).any():
+                continue
+            rstdata[k][l[2]-lo[2]:u[2]-lo[2],l[1]-lo[1]:u[1]-lo[1],l[0]-lo[0]:u[0]-lo[0]]=\
+                data[k][l[2]-gis[2]:u[2]-gis[2],l[1]-gis[1]:u[1]-gis[1],l[0]-gis[0]:u[0]-gis[0]]
+
+    return rstdata
+
 def _to_eint(rstdata,neg_correct=True):
     """Convert total energy to internal energy and correct negative energy"""
     eint=rstdata['ENERGY'].copy()
-    eint -= 0.5*rstdata['1-MOMENTUM']**2/rstdata['DENSITY']
-    eint -= 0.5*rstdata['2-MOMENTUM']**2/rstdata['DENSITY']
-    eint -= 0.5*rstdata['3-MOMENTUM']**2/rstdata['DENSITY']
-
-    if '1-FIELD' in rstdata:
-        for i,f in enumerate(['1-FIELD','2-FIELD','3-FIELD']):
-            if f == '1-FIELD': Bc=0.5*(rstdata[f][:,:,:-1]+rstdata[f][:,:,1:])
-            elif f == '2-FIELD': Bc=0.5*(rstdata[f][:,:-1,:]+rstdata[f][:,1:,:])
-            elif f == '3-FIELD': Bc=0.5*(rstdata[f][:-1,:,:]+rstdata[f][1:,:,:])
-            eint -= 0.5*Bc**2
+    _add_ekin_emag(eint,rstdata,sign=-1)
 
     if neg_correct:
         k_end,j_end,i_end = eint.shape
@@ -438,122 +612,155 @@ def _to_eint(rstdata,neg_correct=True):
 def _to_etot(rstdata):
     """Convert internal energy to total energy"""
     eint=rstdata['ENERGY'].copy()
-
-    eint += 0.5*rstdata['1-MOMENTUM']**2/rstdata['DENSITY']
-    eint += 0.5*rstdata['2-MOMENTUM']**2/rstdata['DENSITY']
-    eint += 0.5*rstdata['3-MOMENTUM']**2/rstdata['DENSITY']
-
-    if '1-FIELD' in rstdata:
-        for i,f in enumerate(['1-FIELD','2-FIELD','3-FIELD']):
-            if f == '1-FIELD': Bc=0.5*(rstdata[f][:,:,:-1]+rstdata[f][:,:,1:])
-            elif f == '2-FIELD': Bc=0.5*(rstdata[f][:,:-1,:]+rstdata[f][:,1:,:])
-            elif f == '3-FIELD': Bc=0.5*(rstdata[f][:-1,:,:]+rstdata[f][1:,:,:])
-            eint += 0.5*Bc**2
+    _add_ekin_emag(eint,rstdata,sign=1)
     return eint
 
+def _add_ekin_emag(e,rstdata,sign=1):
+    """Add (sign=1) or subtract (sign=-1) kinetic and magnetic energy density
+    to e in place. Temporary arrays are limited to _NSLAB z-planes."""
+    d=rstdata['DENSITY']
+    mhd='1-FIELD' in rstdata
+    nz=e.shape[0]
+    for ks in range(0,nz,_NSLAB):
+        ke=min(ks+_NSLAB,nz)
+        es=e[ks:ke]
+        tmp=np.empty_like(es)
+        for f in ['1-MOMENTUM','2-MOMENTUM','3-MOMENTUM']:
+            np.square(rstdata[f][ks:ke],out=tmp)
+            tmp*=0.5
+            tmp/=d[ks:ke]
+            if sign > 0: es+=tmp
+            else: es-=tmp
+
+        if mhd:
+            for f in ['1-FIELD','2-FIELD','3-FIELD']:
+                B=rstdata[f]
+                if f == '1-FIELD': np.add(B[ks:ke,:,:-1],B[ks:ke,:,1:],out=tmp)
+                elif f == '2-FIELD': np.add(B[ks:ke,:-1,:],B[ks:ke,1:,:],out=tmp)
+                elif f == '3-FIELD': np.add(B[ks:ke,:,:],B[ks+1:ke+1,:,:],out=tmp)
+                tmp*=0.5
+                np.square(tmp,out=tmp)
+                tmp*=0.5
+                if sign > 0: es+=tmp
+                else: es-=tmp
+
+def _block_mean(data):
+    """Average cell-centered data over 2^3 blocks (last three axes)"""
+    nz,ny,nx=data.shape[-3:]
+    shape=data.shape[:-3]+(nz//2,2,ny//2,2,nx//2,2)
+    return data.reshape(shape).mean(axis=(-5,-3,-1),dtype='d')
+
+def _block_mean_face(data,f):
+    """Average face-centered data over 2^2 faces of coarse face"""
+    newdata=np.zeros(data[::2,::2,::2].shape,dtype='d')
+    if f == '1-FIELD':
+        for j in range(2):
+            for k in range(2):
+                newdata += data[k::2,j::2,::2]
+    if f == '2-FIELD':
+        for i in range(2):
+            for k in range(2):
+                newdata += data[k::2,::2,i::2]
+    if f == '3-FIELD':
+        for j in range(2):
+            for i in range(2):
+                newdata += data[::2,j::2,i::2]
+    newdata*=0.25
+    return newdata
+
+def _prolong(data):
+    """Copy cell-centered data to 2^3 fine cells (last three axes)"""
+    nz,ny,nx=data.shape[-3:]
+    lead=data.shape[:-3]
+    newdata=np.broadcast_to(data[...,:,None,:,None,:,None],
+                            lead+(nz,2,ny,2,nx,2)).astype('d')
+    return newdata.reshape(lead+(2*nz,2*ny,2*nx))
+
+def _apply_scalars(func,rstdata,rstdata_new,scalar):
+    """Apply func to all passive scalars stacked along a new axis (one pass)"""
+    if scalar == 0: return
+    names=['SCALAR %d' % ns for ns in range(scalar)]
+    newdata=func(np.stack([rstdata[f] for f in names]))
+    for f,d in zip(names,newdata):
+        rstdata_new[f]=d
+
+def _prolong_face(data,f):
+    """Prolongate face-centered data: copy coarse faces to 2^2 fine faces and
+    interpolate linearly to fine faces in between along the normal
+    direction (divergence of fine cells = divergence of coarse cell)"""
+    shape=np.array(data.shape)*2
+    if f == '1-FIELD':
+        newdata=np.empty(shape-np.array([0,0,1]),dtype='d')
+        idata=np.add(data[:,:,:-1],data[:,:,1:])
+        idata*=0.5
+        for j in range(2):
+            for k in range(2):
+                newdata[k::2,j::2,::2] = data
+                newdata[k::2,j::2,1::2] = idata
+    if f == '2-FIELD':
+        newdata=np.empty(shape-np.array([0,1,0]),dtype='d')
+        idata=np.add(data[:,:-1,:],data[:,1:,:])
+        idata*=0.5
+        for i in range(2):
+            for k in range(2):
+                newdata[k::2,::2,i::2] = data
+                newdata[k::2,1::2,i::2] = idata
+    if f == '3-FIELD':
+        newdata=np.empty(shape-np.array([1,0,0]),dtype='d')
+        idata=np.add(data[:-1,:,:],data[1:,:,:])
+        idata*=0.5
+        for j in range(2):
+            for i in range(2):
+                newdata[::2,j::2,i::2] = data
+                newdata[1::2,j::2,i::2] = idata
+    return newdata
+
 def _degrade(rstdata,scalar=0):
-    """Degrade restart dumps (average over 2^3 cells)"""
+    """Degrade restart dumps (average over 2^3 cells)
+
+    Face-centered fields are averaged over 2^2 faces so that div B of a
+    coarse cell is the average of div B of its fine cells."""
     cc_varnames=['DENSITY','1-MOMENTUM','2-MOMENTUM','3-MOMENTUM',\
                  'ENERGY','POTENTIAL']
     fc_varnames=['1-FIELD','2-FIELD','3-FIELD']
 
-    scalar_varnames=[]
-    for ns in range(scalar):
-        scalar_varnames.append('SCALAR %d' % ns)
-    if scalar: cc_varnames += scalar_varnames
-
     rstdata_new={}
     for f in cc_varnames:
         if f == 'ENERGY':
-            data=_to_eint(rstdata)
+            rstdata_new[f]=_block_mean(_to_eint(rstdata))
         else:
-            data=rstdata[f].copy()
-        shape=(np.array(data.shape)/2).astype('int')
-        newdata=np.zeros(shape,dtype='d')
-        for i in range(2):
-            for j in range(2):
-                for k in range(2):
-                    newdata += data[k::2,j::2,i::2]
-        rstdata_new[f]=newdata*0.125
+            rstdata_new[f]=_block_mean(rstdata[f])
+    _apply_scalars(_block_mean,rstdata,rstdata_new,scalar)
 
     for f in fc_varnames:
-        data=rstdata[f].copy()
-        if f == '1-FIELD':
-            newdata=np.zeros(shape+np.array([0,0,1]),dtype='d')
-            for j in range(2):
-                for k in range(2):
-                    newdata += data[k::2,j::2,::2]
-        if f == '2-FIELD':
-            newdata=np.zeros(shape+np.array([0,1,0]),dtype='d')
-            for i in range(2):
-                for k in range(2):
-                    newdata += data[k::2,::2,i::2]
-        if f == '3-FIELD':
-            newdata=np.zeros(shape+np.array([1,0,0]),dtype='d')
-            for j in range(2):
-                for i in range(2):
-                    newdata += data[::2,j::2,i::2]
-        rstdata_new[f]=newdata*0.25
-
-    rstdata_new['ENERGY']=_to_etot(rstdata_new)
+        rstdata_new[f]=_block_mean_face(rstdata[f],f)
+
+    _add_ekin_emag(rstdata_new['ENERGY'],rstdata_new,sign=1)
     return rstdata_new
 
 def _refine(rstdata,scalar=0):
-    """Refine restart dump (donor cell)"""
+    """Refine restart dump (donor cell)
+
+    Face-centered fields are interpolated linearly along the normal
+    direction so that div B of fine cells equals that of the coarse cell."""
     cc_varnames=['DENSITY','1-MOMENTUM','2-MOMENTUM','3-MOMENTUM',\
                  'ENERGY']
     if 'POTENTIAL' in rstdata: cc_varnames += ['POTENTIAL']
     if '1-FIELD' in rstdata: fc_varnames=['1-FIELD','2-FIELD','3-FIELD']
     else: fc_varnames=[]
-    scalar_varnames=[]
-    for ns in range(scalar):
-        scalar_varnames.append('SCALAR %d' % ns)
 
-    if scalar: cc_varnames += scalar_varnames
     rstdata_new={}
     for f in cc_varnames:
         if f == 'ENERGY':
-            data=_to_eint(rstdata)
+            rstdata_new[f]=_prolong(_to_eint(rstdata))
         else:
-            data=rstdata[f]
-        shape=np.array(data.shape)*2
-        newdata=np.zeros(shape,dtype='d')
-        for i in range(2):
-            for j in range(2):
-                for k in range(2):
-                    newdata[k::2,j::2,i::2] = data.copy()
-        rstdata_new[f]=newdata
+            rstdata_new[f]=_prolong(rstdata[f])
+    _apply_scalars(_prolong,rstdata,rstdata_new,scalar)
 
     for f in fc_varnames:
-        data=rstdata[f]
-        shape=np.array(data.shape)*2
-        if f == '1-FIELD':
-            newdata=np.zeros(shape-np.array([0,0,1]),dtype='d')
-            idata = 0.5*(data[:,:,:-1]+data[:,:,1:])
-
-            for j in range(2):
-                for k in range(2):
-                    newdata[k::2,j::2,::2] = data.copy()
-                    newdata[k::2,j::2,1::2] = idata.copy()
-
-        if f == '2-FIELD':
-            newdata=np.zeros(shape-np.array([0,1,0]),dtype='d')
-            idata = 0.5*(data[:,:-1,:]+data[:,1:,:])
-            for i in range(2):
-                for k in range(2):
-                    newdata[k::2,::2,i::2] = data.copy()
-                    newdata[k::2,1::2,i::2] = idata.copy()
-
-        if f == '3-FIELD':
-            newdata=np.zeros(shape-np.array([1,0,0]),dtype='d')
-            idata = 0.5*(data[:-1,:,:]+data[1:,:,:])
-            for j in range(2):
-                for i in range(2):
-                    newdata[::2,j::2,i::2] = data.copy()
-                    newdata[1::2,j::2,i::2] = idata.copy()
-        rstdata_new[f]=newdata
-
-    rstdata_new['ENERGY']=_to_etot(rstdata_new)
+        rstdata_new[f]=_prolong_face(rstdata[f],f)
+
+    _add_ekin_emag(rstdata_new['ENERGY'],rstdata_new,sign=1)
     return rstdata_new
 
 def _calculate_grid(Nx,NBx,verbose=False):
@@ -752,7 +959,7 @@ def _read_one_grid(rstfile,verbose=False,starghost=True):
                       print(star_list[nstar-1])
                 data_array[var]=star_list
             else:
-                arr=np.asarray(struct.unpack('<'+ndata*dtype,data))
+                arr=np.frombuffer(bytearray(data),dtype='<'+dtype)
                 arr.shape = rst[var]['nx']
                 data_array[var]=arr
                 if verbose: print(var, arr.mean(), arr.shape)
@@ -765,6 +972,32 @@ def _read_one_grid(rstfile,verbose=False,starghost=True):
 
     return par,rst,data_array
 
+def _map_one_grid(rstfile):
+    """Map cell- and face-centered variables of restart dump of one grid
+    to memory (zero-copy). Star particles are not read."""
+    par=_parse_par(rstfile)
+
+    rst={}
+    offset={}
+    with open(rstfile,'rb') as fp:
+        fp.seek(par['par_end'])
+        while 1:
+            l=fp.readline().decode('utf-8')
+            var=l.strip()
+            if not _parse_rst(var,par,rst) or rst[var]['vtype'] == 'star':
+                break
+            offset[var]=fp.tell()
+            fp.seek(rst[var]['ndata']*struct.calcsize(rst[var]['dtype']),1)
+            fp.readline()
+
+    data_array={}
+    for var in offset:
+        if rst[var]['vtype'] in ('ccvar','fcvar'):
+            data_array[var]=np.memmap(rstfile,dtype='<'+rst[var]['dtype'],mode='r',
+                                      offset=offset[var],shape=rst[var]['nx'])
+
+    return par,rst,data_array
+
 def _read_all_grid(rstfile,grids,NGrids,parfile=None,verbose=False,starghost=True):
     """Read restart dumpe of all grids"""
     if parfile==None: par=_parse_par(rstfile)
@@ -774,8 +1007,6 @@ def _read_all_grid(rstfile,grids,NGrids,parfile=None,verbose=False,starghost=Tru
     rstdata={}
     nx=NGrids*grids[0]['Nx']
     nx=nx[::-1]
-    dirname=osp.dirname(rstfile)
-    basename=osp.basename(rstfile)
 
     g=grids[0]
     gis=g['is']
@@ -788,13 +1019,7 @@ def _read_all_grid(rstfile,grids,NGrids,parfile=None,verbose=False,starghost=Tru
         gnx=g['Nx']
         gie=gis+gnx
 
-        if i == 0:
-            par,fm,data=_read_one_grid(rstfile,verbose=False,starghost=starghost)
-        else:
-            rstfname = '%s/%s-id%d%s' % (dirname,basename[:-9],i,basename[-9:])
-            if not osp.isfile(rstfname):
-                rstfname = '%s/../id%d/%s-id%d%s' % (dirname,i,basename[:-9],i,basename[-9:])
-            par,fm,data=_read_one_grid(rstfname,starghost=starghost)
+        par,fm,data=_map_one_grid(_get_rank_fname(rstfile,i))
 
         for k in fm:
             ib,jb,kb=(0,0,0)
@@ -854,7 +1079,7 @@ def _read_part(rstfile,grids,nx,verbose=False):
             rstfname = rstfile.replace('id{}/{}.'.format(gid,pid),
                                        'id{}/{}-id{}.'.format(gid,pid,gid))
 
-        par,fm,data=_read_one_grid(rstfname)
+        par,fm,data=_map_one_grid(rstfname)
 
         if verbose > 1: print(i,fm['DENSITY']['nx'],gnx)
 
@@ -950,6 +1175,21 @@ def to_hdf5(h5file,rstdata,ds):
 
     f.close()
 
+def _max_divergence_B(rstdata):
+    """Maximum of |div B| from restart dump (computed slab by slab)"""
+    Bx=rstdata['1-FIELD']
+    By=rstdata['2-FIELD']
+    Bz=rstdata['3-FIELD']
+    nz=Bx.shape[0]
+    dBmax=0.0
+    for ks in range(0,nz,_NSLAB):
+        ke=min(ks+_NSLAB,nz)
+        dB=np.diff(Bx[ks:ke],axis=2)
+        dB+=np.diff(By[ks:ke],axis=1)
+        dB+=np.diff(Bz[ks:ke+1],axis=0)
+        dBmax=max(dBmax,np.abs(dB).max())
+    return dBmax
+
 def _divergence_B(rstdata):
     """Calculate divergence B from restart dump"""
     Bx=rstdata['1-FIELD']
@@ -5,7 +5,6 @@ Read athena starpar vtk file using pandas, dictionary
 from __future__ import print_function
 
 import os
-import struct
 import pandas as pd
 import numpy as np
 
@@ -83,75 +82,115 @@ def read_starpar_vtk(filename, force_override=False, verbose=False):
     fpkl = filename + '.p'
     if not force_override and os.path.exists(fpkl) and \
        os.path.getmtime(fpkl) > os.path.getmtime(filename):
-        hst = pd.read_pickle(fpkl)
-        if verbose:
-            print('[read_starpar_vtk]: reading from existing pickle.')
+        df = pd.read_pickle(fpkl)
+        # Pickles written by older versions do not have time in attrs
+        if 'time' in df.attrs:
+            if verbose:
+                print('[read_starpar_vtk]: reading from existing pickle.')
+            df.time = df.attrs['time']
+            df.nstars = df.attrs['nstars']
+            return df
     else:
         if verbose:
             print('[read_starpar_vtk]: pickle does not exist or starpar file updated.' + \
                       ' Reading {0:s}'.format(filename))    
 
+    time, nstars, star = _read_starpar_vtk_arrays(filename)
+    for k, v in star.items():
+        # Same dtypes as obtained by struct.unpack (float64 and int64)
+        star[k] = v.astype(np.float64 if v.dtype.kind == 'f' else np.int64)
+
+    # Add time, nstars keys at the end
+    try:
+        df = pd.DataFrame(star)
+    except:
+        df = pd.DataFrame(index=star.keys())
+        
+    df.time = time
+    df.nstars = nstars
+    df.attrs['time'] = time
+    df.attrs['nstars'] = nstars
+    try:
+        df.to_pickle(fpkl)
+    except IOError:
+        pass
+    
+    return df
+
+def _read_starpar_vtk_arrays(filename):
+    """
+    Read starpar vtk file. Field data are read with np.frombuffer and returned
+    in the dtype of the file (native byte order), sorted by id.
+
+    Returns
+    -------
+    time : float
+    nstars : int
+    star : dict of numpy arrays
+    """
+
     # Check for existance of file
     if not os.path.isfile(filename):
         raise IOError('starpar vtk file {0:s} is not found'.format(filename))
 
-    star = {}
     with open(filename, 'rb') as f:
-        grid = {}
-        line = f.readline()
-        # Read time, nstars
-        while line:
-            spl = line.strip().split()
-            _parse_starpar_vtk_line(spl, grid)
-            line = f.readline()
-            if b"POINT_DATA" in spl:
-                break
-
-        time = grid['time']
-        nstars = grid['nstars']
-
-        # Read field info
-        _field_map = {}
-        while line != b'':
-            spl = line.strip().split()
-            _parse_starpar_vtk_line(spl, grid)
+        buf = f.read()
+
+    # Parse header and find offsets of binary data of all fields
+    grid = {}
+    _field_map = {}
+    pos = 0
+    while pos < len(buf):
+        end = buf.find(b'\n', pos)
+        if end < 0:
+            end = len(buf)
+        spl = buf[pos:end].strip().split()
+        pos = end + 1
+        if not spl:
+            continue
+
+        _parse_starpar_vtk_line(spl, grid)
+        if b"POINTS" in spl:
+            # Skip binary data of point coordinates
+            pos += 4*3*grid['nstars']
+        elif b"SCALARS" in spl or b"VECTORS" in spl:
             if b"SCALARS" in spl:
-                field = grid['read_field']
-                datatype = grid['data_type']
-                line = f.readline()  # Read the lookup table line
-                _field_map[field] = ('scalar', f.tell(), datatype)
-            elif b"VECTORS" in spl:
-                field = grid['read_field']
-                datatype = grid['data_type']
-                _field_map[field] = ('vector', f.tell(), datatype)
-            line = f.readline()
-
-        # Read all fields
-        for k, v in _field_map.items():
-            if v[0] == 'scalar':
-                nvar = 1
-                shape = [nstars, 1]
-            elif v[0]=='vector':
-                nvar = 3
-                shape = [nstars, 3]
+                # Skip the lookup table line
+                pos = buf.find(b'\n', pos) + 1
+                kind, nvar = 'scalar', 1
             else:
-                raise ValueError('Unknown variable type')
-
-            if v[2] == b'float':
-                fmt = '>{}f'.format(nvar*nstars)
-            elif v[2] == b'int':
-                fmt = '>{}i'.format(nvar*nstars)
-
-            f.seek(v[1])
-            size = struct.calcsize(fmt)
-            data = np.array(struct.unpack(fmt, f.read(size)))
-            name = _convert_field_name(k)
-            star[name] = np.transpose(np.reshape(data, shape), (0, 1))
-            if nstars > 1:
-                star[name] = np.squeeze(star[name])
-            elif nstars == 1:
-                if v[0] != 'vector':
-                    star[name] = star[name][0]
+                kind, nvar = 'vector', 3
+            _field_map[grid['read_field']] = (kind, pos, grid['data_type'])
+            # Skip binary data
+            pos += 4*nvar*grid['nstars']
+
+    time = grid['time']
+    nstars = grid['nstars']
+
+    star = {}
+    for k, v in _field_map.items():
+        if v[0] == 'scalar':
+            nvar = 1
+            shape = [nstars, 1]
+        elif v[0]=='vector':
+            nvar = 3
+            shape = [nstars, 3]
+        else:
+            raise ValueError('Unknown variable type')
+
+        if v[2] == b'float':
+            dtype = '>f4'
+        elif v[2] == b'int':
+            dtype = '>i4'
+
+        data = np.frombuffer(buf, dtype=dtype, count=nvar*nstars, offset=v[1])
+        name = _convert_field_name(k)
+        star[name] = np.reshape(data.astype(data.dtype.newbyteorder('=')), shape)
+        if nstars > 1:
+            star[name] = np.squeeze(star[name])
+        elif nstars == 1:
+            if v[0] != 'vector':
+                star[name] = star[name][0]
 
     star['x1'] = star['x'][:,0]
     star['x2'] = star['x'][:,1]
@@ -168,17 +207,326 @@ def read_starpar_vtk(filename, force_override=False, verbose=False):
         for k, v in star.items():
             star[k] = v[idsrt]
 
-    # Add time, nstars keys at the end
-    try:
-        df = pd.DataFrame(star)
-    except:
-        df = pd.DataFrame(index=star.keys())
-        
-    df.time = time
-    df.nstars = nstars
-    try:
-        df.to_pickle(fpkl)
-    except IOError:
-        pass
-    
+    return time, nstars, star
+
+# Increase when the layout of the starpar store changes
+_STORE_VERSION = 3
+# Chunk size (number of rows) of datasets in the starpar store. Fixed so that
+# a store created with a few rows is not stuck with tiny chunks.
+_STORE_CHUNK = 65536
+# Groups in the starpar store that are not particle columns
+_STORE_GROUPS = ('snapshot', 'track')
+
+def update_starpar_store(fnames, fstore, force_override=False, verbose=False):
+    """
+    Append particle data of starpar vtk files to a columnar HDF5 store.
+
+    Each column (num, time, id, mass, age, x1, ..., v3, ...) is a 1d dataset
+    with one row per particle per snapshot. Only files not yet in the store
+    are read. The store is rebuilt if a file already in the store was
+    modified or a new file precedes the last snapshot in the store. Columns
+    missing in some snapshots are filled with NaN. An index of rows sorted
+    by particle id (group track) is kept up to date for read_star_track.
+
+    Parameters
+    ----------
+    fnames : list of str
+        Names of starpar vtk files (problem_id.xxxx.starpar.vtk)
+    fstore : str
+        Name of the HDF5 file
+    force_override : bool
+        Rebuild the store from scratch. Default value is False.
+
+    Returns
+    -------
+    fstore : str
+    """
+
+    import h5py
+
+    fnames = list(fnames)
+    nums = np.array([int(os.path.basename(f).split('.')[-3]) for f in fnames],
+                    dtype=int)
+    mtime = np.array([os.stat(f).st_mtime_ns for f in fnames], dtype=np.int64)
+    order = np.argsort(nums)
+    fnames = [fnames[i] for i in order]
+    nums = nums[order]
+    mtime = mtime[order]
+    if len(nums) == 0:
+        return fstore
+
+    rebuild = force_override or not os.path.exists(fstore)
+    if not rebuild:
+        try:
+            with h5py.File(fstore, 'r') as f:
+                if f.attrs['version'] != _STORE_VERSION:
+                    rebuild = True
+                else:
+                    nums_old = f['snapshot/num'][()]
+                    mtime_old = f['snapshot/mtime'][()]
+        except (OSError, KeyError):
+            rebuild = True
+
+    if not rebuild:
+        # Snapshots in store whose file is modified
+        idx = np.searchsorted(nums, nums_old)
+        idx = np.minimum(idx, len(nums) - 1)
+        found = (len(nums) > 0) & (nums[idx] == nums_old)
+        if (mtime[idx[found]] != mtime_old[found]).any():
+            rebuild = True
+
+    if rebuild:
+        new = np.ones(len(nums), dtype=bool)
+    else:
+        new = ~np.isin(nums, nums_old)
+        if new.any() and len(nums_old) > 0 and nums[new].min() < nums_old.max():
+            rebuild = True
+            new[:] = True
+
+    if not new.any():
+        return fstore
+
+    if verbose:
+        print('[update_starpar_store]: reading {0:d} starpar files'.format(new.sum()))
+
+    # Read new snapshots
+    stars = []
+    snap = dict(num=[], time=[], nstars=[], mtime=[])
+    for fname, num, mt in zip([f for f, n in zip(fnames, new) if n],
+                              nums[new], mtime[new]):
+        time, nstars, star = _read_starpar_vtk_arrays(fname)
+        snap['num'].append(num)
+        snap['time'].append(time)
+        snap['nstars'].append(nstars)
+        snap['mtime'].append(mt)
+        if nstars > 0:
+            star = {k: np.atleast_1d(v) for k, v in star.items()}
+            star['num'] = np.full(nstars, num, dtype=np.int32)
+            star['time'] = np.full(nstars, time)
+            stars.append(star)
+
+    for k in snap.keys():
+        snap[k] = np.array(snap[k])
+
+    columns = []
+    for star in stars:
+        columns += [k for k in star.keys() if k not in columns]
+    if not rebuild:
+        with h5py.File(fstore, 'r') as f:
+            columns_old = [k for k in f.keys() if k not in _STORE_GROUPS]
+        if len(stars) > 0 and len(columns_old) > 0 and \
+           not set(columns) <= set(columns_old):
+            # New columns appeared; read everything again
+            return update_starpar_store(fnames, fstore, force_override=True,
+                                        verbose=verbose)
+        if len(columns_old) > 0:
+            columns = columns_old
+
+    # Columns missing in some snapshots are filled with NaN. No rows are
+    # appended if none of the new snapshots has particles.
+    cols = dict()
+    if len(stars) > 0:
+        for k in columns:
+            cols[k] = np.concatenate([star[k] if k in star else
+                                      np.full(len(star['num']), np.nan)
+                                      for star in stars])
+
+    if rebuild:
+        ftmp = '{0:s}.{1:d}.tmp'.format(fstore, os.getpid())
+        os.makedirs(os.path.dirname(os.path.abspath(fstore)), exist_ok=True)
+        try:
+            with h5py.File(ftmp, 'w') as f:
+                f.attrs['version'] = _STORE_VERSION
+                _append_columns(f, cols)
+                _append_columns(f.create_group('snapshot'), snap)
+                _write_track_index(f)
+            os.replace(ftmp, fstore)
+        finally:
+            if os.path.exists(ftmp):
+                os.remove(ftmp)
+    else:
+        with h5py.File(fstore, 'a') as f:
+            _append_columns(f, cols)
+            _append_columns(f['snapshot'], snap)
+            _write_track_index(f)
+
+    return fstore
+
+def read_starpar_store(fstore, columns=None, nums=None):
+    """
+    Read particle data from a columnar store created by update_starpar_store.
+
+    Parameters
+    ----------
+    fstore : str
+        Name of the HDF5 file
+    columns : list of str
+        Columns to read. Default is all columns. num and time are always read.
+    nums : sequence of int
+        Snapshot numbers to select. Default is all snapshots.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        One row per particle per snapshot with columns num, time, id, ...
+        Float and int columns are float64 and int64 as in read_starpar_vtk.
+    """
+
+    import h5py
+
+    with h5py.File(fstore, 'r') as f:
+        if columns is None:
+            columns = [k for k in f.keys()
+                       if k not in _STORE_GROUPS + ('num', 'time')]
+        if nums is None:
+            sel = slice(None)
+        else:
+            sel = np.isin(f['num'][()], nums)
+
+        dat = dict()
+        for k in ['num', 'time'] + list(columns):
+            if k not in f:
+                dat[k] = np.array([])
+                continue
+            v = f[k][()][sel]
+            dat[k] = v.astype(np.float64 if v.dtype.kind == 'f' else np.int64)
+
+    return pd.DataFrame(dat)
+
+def read_star_track(fstore, ids, columns=None):
+    """
+    Read histories of star particles from the starpar store.
+
+    Rows of particles are located using the id index of the store, so that
+    only the requested columns are read (once) regardless of the number of
+    particles.
+
+    Parameters
+    ----------
+    fstore : str
+        Name of the HDF5 file created by update_starpar_store
+    ids : int or sequence of int
+        Particle ids. Ids not found in the store are ignored.
+    columns : list of str
+        Columns to read. Default is all columns. id, num, and time are always
+        read.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        Rows sorted by id and num.
+    """
+
+    import h5py
+
+    ids = np.atleast_1d(ids)
+    with h5py.File(fstore, 'r') as f:
+        if columns is None:
+            columns = [k for k in f.keys()
+                       if k not in _STORE_GROUPS + ('id', 'num', 'time')]
+
+        g = f['track']
+        ids_all = g['id'][()]
+        i = np.unique(np.searchsorted(ids_all, ids[np.isin(ids, ids_all)]))
+        start = g['start'][()][i]
+        count = g['count'][()][i]
+        # Row indices of each particle are contiguous in order
+        offset = np.repeat(start - np.cumsum(count) + count, count)
+        rows = g['order'][()][offset + np.arange(count.sum())]
+
+        dat = dict()
+        for k in ['id', 'num', 'time'] + [c for c in columns
+                                          if c not in ('id', 'num', 'time')]:
+            v = f[k][()][rows]
+            dat[k] = v.astype(np.float64 if v.dtype.kind == 'f' else np.int64)
+
+    return pd.DataFrame(dat)
+
+def read_star_index(fstore, ids=None):
+    """
+    Read birth and death info of star particles from the starpar store.
+
+    Parameters
+    ----------
+    fstore : str
+        Name of the HDF5 file created by update_starpar_store
+    ids : sequence of int
+        Particle ids to select. Default is all particles.
+
+    Returns
+    -------
+    df : pandas DataFrame
+        Indexed by id with columns nsnap (number of snapshots containing the
+        particle), num_birth, num_death, tbirth, tdeath. Birth is the first
+        snapshot containing the particle. Death is the first snapshot after
+        the last one containing the particle (-1 and NaN if the particle
+        exists in the last snapshot). Times are accurate to output cadence.
+    """
+
+    import h5py
+
+    with h5py.File(fstore, 'r') as f:
+        g = f['track']
+        dat = dict()
+        for k in ('id', 'count', 'num_birth', 'num_death', 'tbirth', 'tdeath'):
+            dat[k] = g[k][()]
+
+    df = pd.DataFrame(dat).rename(columns=dict(count='nsnap')).set_index('id')
+    if ids is not None:
+        df = df.loc[df.index.intersection(np.atleast_1d(ids))]
+
     return df
+
+def _write_track_index(f):
+    """Sort rows by (id, num) and write id index to group track.
+    """
+
+    snum = f['snapshot/num'][()]
+    stime = f['snapshot/time'][()]
+    if 'id' in f:
+        sid = f['id'][()]
+        num = f['num'][()]
+    else:
+        sid = np.array([], dtype=np.int32)
+        num = np.array([], dtype=np.int32)
+
+    order = np.lexsort((num, sid))
+    ids, start, count = np.unique(sid[order], return_index=True,
+                                  return_counts=True)
+    num_birth = num[order][start]
+    num_last = num[order][start + count - 1]
+    # Index of first snapshot after the last one containing the particle
+    isnap = np.searchsorted(snum, num_last, side='right')
+    dead = isnap < len(snum)
+    isnap = np.minimum(isnap, len(snum) - 1)
+    idx = dict(id=ids, order=order, start=start, count=count,
+               num_birth=num_birth,
+               num_death=np.where(dead, snum[isnap], -1),
+               tbirth=stime[np.searchsorted(snum, num_birth)],
+               tdeath=np.where(dead, stime[isnap], np.nan))
+
+    g = f.require_group('track')
+    for k, v in idx.items():
+        if k in g:
+            # Overwrite in place so that file does not grow on every update
+            g[k].resize((len(v),))
+            g[k][:] = v
+        else:
+            g.create_dataset(k, data=v, maxshape=(None,),
+                             chunks=(_STORE_CHUNK,),
+                             compression='gzip', shuffle=True)
+
+def _append_columns(group, cols):
+    """Append 1d arrays to (resizable) datasets in HDF5 group.
+    """
+
+    for k, v in cols.items():
+        if k not in group:
+            group.create_dataset(k, data=v, maxshape=(None,),
+                                 chunks=(_STORE_CHUNK,),
+                                 compression='gzip', shuffle=True)
+        else:
+            dset = group[k]
+            n = dset.shape[0]
+            dset.resize((n + len(v),))
+            dset[n:] = v
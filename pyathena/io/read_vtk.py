@@ -7,14 +7,28 @@ from __future__ import print_function
 import os
 import os.path as osp
 import glob, struct
+import warnings
+import pickle
 import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 import xarray as xr
 import astropy.constants as ac
 import astropy.units as au
 
 from ..util.units import Units
+from ..util.lru_cache import LRUCache
 
-def read_vtk(filename, id0_only=False):
+# Increase when the content of the header index file changes
+_INDEX_VERSION = 1
+# Grid info saved in the index file
+_INDEX_KEYS = ('le', 'dx', 'Nx', 'time', 'ncells', 'data_offset')
+
+# LRU cache of grid data shared by all AthenaDataSet objects. Change the memory
+# budget by setting grid_cache.maxbytes (0 disables caching).
+grid_cache = LRUCache(maxbytes=2*1024**3)
+
+def read_vtk(filename, id0_only=False, nthreads=1):
     """Convenience wrapper function to read Athena vtk output file
     using AthenaDataSet class.
 
@@ -25,17 +39,20 @@ def read_vtk(filename, id0_only=False):
     id0_only : bool
         Flag to enforce to read vtk file in id0 directory only.
         Default value is False.
+    nthreads : int
+        Number of threads used to read grids concurrently. Default value is 1.
 
     Returns
     -------
     ds : AthenaDataSet
     """
 
-    return AthenaDataSet(filename, id0_only=id0_only)
+    return AthenaDataSet(filename, id0_only=id0_only, nthreads=nthreads)
 
 class AthenaDataSet(object):
 
-    def __init__(self, filename, id0_only=False, units=Units(), dfi=None):
+    def __init__(self, filename, id0_only=False, units=Units(), dfi=None,
+                 nthreads=1, index_dir=None, cache=None):
         """Class to read athena vtk file.
 
         Parameters
@@ -49,6 +66,20 @@ class AthenaDataSet(object):
             pyathena Units object (used for reading derived fields)
         dfi : dict
             Dictionary containing derived fields info
+        nthreads : int
+            Number of threads used to read and copy grids concurrently. Each
+            thread writes to non-overlapping slices of the output array, so
+            the result is identical to the serial read. Default value is 1.
+        index_dir : str
+            If given, save grid and field map info parsed from the headers of
+            all vtk files to an index file in index_dir and read it (in a
+            single read) the next time the snapshot is opened. The index is
+            rebuilt if size or mtime of any vtk file changes. LoadSim uses
+            savdir/vtk_index. Default value is None (no index).
+        cache : LRUCache
+            Memory-budgeted cache of grid data keyed by (file, grid, field).
+            If None, use grid_cache shared by all AthenaDataSet objects.
+            Use cache.stats() and cache.clear() to inspect and free memory.
         """
 
         if not osp.exists(filename):
@@ -69,6 +100,10 @@ class AthenaDataSet(object):
         self.fnames = [filename]
         self.u = units
         self.dfi = dfi
+        self.nthreads = nthreads
+        if cache is None:
+            cache = grid_cache
+        self.cache = cache
         if dfi is not None:
             self.derived_field_list = list(dfi.keys())
         else:
@@ -89,20 +124,32 @@ class AthenaDataSet(object):
             from collections import OrderedDict
             self.fnames = list(OrderedDict.fromkeys(self.fnames))
 
-        self.grid = self._set_grid()
-        self.domain = self._set_domain()
-        self.set_region()
+        if index_dir is not None:
+            self._fidx = osp.join(index_dir, osp.basename(filename) + '.idx')
+        else:
+            self._fidx = None
+
+        self.grid = self._read_index()
+        if self.grid is None:
+            self.grid = self._set_grid()
+            self.domain = self._set_domain()
+
+            # Need separte field_map for different grids
+            if self.domain['all_grid_equal']:
+                field_map = _set_field_map(self.grid[0])
+                for g in self.grid:
+                    g['field_map'] = field_map
+            else:
+                for g in self.grid:
+                    g['field_map'] = _set_field_map(g)
 
-        # Need separte field_map for different grids
-        if self.domain['all_grid_equal']:
-            self._field_map = _set_field_map(self.grid[0])
-            for g in self.grid:
-                g['field_map'] = self._field_map
+            self._write_index()
         else:
-            for g in self.grid:
-                g['field_map'] = _set_field_map(g)
-            self._field_map = self.grid[0]['field_map']
+            self.domain = self._set_domain()
 
+        self._set_grid_index()
+        self.set_region()
+        self._field_map = self.grid[0]['field_map']
         self.field_list = list(self._field_map.keys())
 
 
@@ -140,6 +187,8 @@ class AthenaDataSet(object):
 
     def set_region(self, le=None, re=None):
         """Set region and find overlapping grids.
+
+        Region info is memoized for each pair of (le, re).
         """
 
         if le is None:
@@ -150,28 +199,24 @@ class AthenaDataSet(object):
         le = np.array(le)
         re = np.array(re)
 
+        key = (tuple(le.tolist()), tuple(re.tolist()))
+        if key in self._region_cache:
+            self.region = self._region_cache[key]
+            return
+
         if (re < le).any():
             raise ValueError('Check left/right edge.')
 
         # Find all overlapping grids and their edges
-        gle_all = []  # grid left edge
-        gre_all = []  # grid right edge
-        gidx = []     # grid indices that belongs to this region
-        #print(self.grid,len(self.grid))
-        for i, g in enumerate(self.grid):
-            if (g['re'] >= le).all() and (g['le'] <= re).all():
-                gidx.append(i)
-                gle_all.append(g['le'])
-                gre_all.append(g['re'])
-
-        gidx = np.array(gidx)
+        gidx = np.nonzero((self._grid_re >= le).all(axis=1) & \
+                          (self._grid_le <= re).all(axis=1))[0]
         if len(gidx) == 0:
             raise ValueError('Check left/right edges:', le, re, \
                              ' Domain left/right edges are ', \
                              self.domain['le'], self.domain['re'])
 
-        gle_all = np.array(gle_all)
-        gre_all = np.array(gre_all)
+        gle_all = self._grid_le[gidx]
+        gre_all = self._grid_re[gidx]
 
         # Find unique grid left/right edge coordinates
         gleu = [np.unique(gle_all[:, i]) for i in range(3)]
@@ -209,53 +254,75 @@ class AthenaDataSet(object):
                            gleu=gleu, greu=greu,\
                            gle=gle, gre=gre,
                            NGrid=NGrid, Nxg=Nxg, Nxr=Nxr)
+        self._region_cache[key] = self.region
+
+    def _set_grid_index(self):
+        """Store grid edges in contiguous arrays for vectorized search of
+        overlapping grids in set_region.
+        """
+
+        self._grid_le = np.array([g['le'] for g in self.grid])
+        self._grid_re = np.array([g['re'] for g in self.grid])
+        self._region_cache = dict()
 
     def get_slice(self, axis, field='density', pos='c', method='nearest'):
         """Read slice of fields.
 
+        Only the planes of cells needed for the slice are read from each grid
+        (strided rows for x/y slices), not the whole grid data.
+
         Parameters
         ----------
         axis : str
             Axis to slice along. 'x' or 'y' or 'z'
         field : (list of) str
             The name of the field(s) to be read.
-        pos : float or str
+        pos : float or str or sequence of floats
             Slice through If 'c' or 'center', get a slice through the domain
-            center. Default value is 'c'.
+            center. Default value is 'c'. If a sequence of floats is given,
+            slices at all positions are read in one pass and stacked along axis.
         method : str
-
+            Only 'nearest' is supported: slice through cells whose centers are
+            nearest to pos.
 
         Returns
         -------
         slc : xarray dataset
-            An xarray dataset containing slices.
+            An xarray dataset containing slices. As in get_field, other
+            singleton dimensions are squeezed if derived fields are read.
         """
 
         axis_idx = dict(x=0, y=1, z=2)
 
+        if method != 'nearest':
+            raise ValueError('Unsupported method: {0:s}'.format(str(method)))
+
         if pos is None:
             pos = 'c'
 
         field = np.atleast_1d(field)
         axis = np.atleast_1d(axis)
+        squeeze = bool(set(field) - set(self.field_list))
 
         for ax in axis:
-            le = np.copy(self.domain['le'])
-            re = np.copy(self.domain['re'])
-            if pos in ['c', 'center']:
-                pos = self.domain['center'][axis_idx[ax]]
-
-            # Let's make sure le < re always and truncation error does not cause
-            # problem, although performance can be slowed down a bit.
-            le[axis_idx[ax]] = pos - 0.5*self.domain['dx'][axis_idx[ax]]
-            re[axis_idx[ax]] = pos + 0.5*self.domain['dx'][axis_idx[ax]]
-            dat = self.get_field(field, le, re, as_xarray=True)
+            if isinstance(pos, str) and pos in ['c', 'center']:
+                pos_ = self.domain['center'][axis_idx[ax]]
+            else:
+                pos_ = pos
 
-            slc = dat.sel(method='nearest', **{ax:pos})
+            read_func = lambda f: self._get_plane(f, ax, np.atleast_1d(pos_))
+            slc = self._get_field_derived(field, read_func, as_xarray=True,
+                                          squeeze=False)
+            if np.ndim(pos_) == 0:
+                slc = slc.isel(**{ax:0})
+            if squeeze:
+                slc = slc.squeeze(dim=[d for d in slc.dims
+                                       if d != ax and slc.sizes[d] == 1])
 
         return slc
 
-    def get_field(self, field='density', le=None, re=None, as_xarray=True):
+    def get_field(self, field='density', le=None, re=None, as_xarray=True,
+                  lazy=False, blockwise=False):
         """Read 3d fields data.
 
         Parameters
@@ -269,6 +336,18 @@ class AthenaDataSet(object):
         as_xarray : bool
            If True, returns results as an xarray Dataset. If False, returns a
            dictionary containing numpy arrays. Default value is True.
+        lazy : bool
+           If True, fields are returned as dask arrays with one chunk per grid
+           (MPI block) and data are read only when computed. Derived fields
+           become nodes of the task graph, so that reductions (e.g.,
+           dat['nH'].sum(dim='z').compute()) are evaluated block by block.
+           Requires dask. Default value is False.
+        blockwise : bool
+           If True, read fields and calculate derived fields one layer of grids
+           (MPI blocks) along z at a time and copy only the requested fields
+           to the output, so that peak memory scales with the size of a layer
+           rather than the whole region. Ignored if lazy is True.
+           Default value is False.
 
         Returns
         -------
@@ -276,6 +355,68 @@ class AthenaDataSet(object):
             An xarray dataset containing fields.
         """
 
+        if blockwise and not lazy:
+            return self._get_field_blockwise(field, le, re, as_xarray)
+
+        read_func = lambda f: self._get_field(f, le, re, as_xarray, lazy)
+        return self._get_field_derived(field, read_func, as_xarray)
+
+    def _get_field_blockwise(self, field, le=None, re=None, as_xarray=True):
+        """Read fields (including derived fields) layer by layer of grids
+        along z and assemble the requested fields.
+        """
+
+        field = np.atleast_1d(field)
+        self.set_region(le=le, re=re)
+        region = self.region
+        x = self._get_region_cc_pos()
+        dz = self.domain['dx'][2]
+
+        arr = dict()
+        k = 0
+        for gle, gre in zip(region['gleu'][2], region['greu'][2]):
+            # Region containing a single layer of grids. Shift edges to the
+            # cell centers so that neighboring layers are not included.
+            le_ = np.array(region['le'], dtype=float)
+            re_ = np.array(region['re'], dtype=float)
+            le_[2] = gle + 0.5*dz
+            re_[2] = gre - 0.5*dz
+            read_func = lambda f: self._get_field(f, le_, re_, True, False)
+            dat = self._get_field_derived(field, read_func, as_xarray=True,
+                                          squeeze=False)
+            nz = dat.sizes['z']
+            for f, v in dat.data_vars.items():
+                if f not in arr:
+                    arr[f] = np.empty([len(x['z']), len(x['y']), len(x['x'])],
+                                      dtype=v.dtype)
+                arr[f][k:k+nz] = v.transpose('z', 'y', 'x').values
+            k += nz
+
+        # Restore region
+        self.set_region(le=le, re=re)
+
+        if not as_xarray:
+            if len(field) == 1:
+                return arr[field[0]]
+            else:
+                return arr
+
+        dat = xr.Dataset(dict([(f, (('z','y','x'), v)) for f, v in arr.items()]),
+                         coords=x, attrs=dict(self.domain))
+        if set(field) - set(self.field_list):
+            dat.attrs['dfi'] = self.dfi
+
+        return dat.squeeze()
+
+    def _get_field_derived(self, field, read_func, as_xarray=True, squeeze=True):
+        """Read fields using read_func and calculate derived fields.
+
+        Dependencies of a derived field (field_dep) may include other derived
+        fields. Derived fields are calculated in topological order so that
+        shared intermediates (e.g., T) are calculated only once, and fields
+        that are not requested are freed as soon as they are no longer needed.
+        """
+
         field = np.atleast_1d(field)
 
         # Derived field list
@@ -284,7 +425,7 @@ class AthenaDataSet(object):
         if not bool(dflist):
             # dflist is an empty set, we can read all fields directly from vtk
             # file
-            return self._get_field(field, le, re, as_xarray)
+            return read_func(field)
 
         # If we are here, need to read all union of all input fields and those
         # required to calculate derived fields
@@ -301,68 +442,87 @@ class AthenaDataSet(object):
         # Field names that are in the vtk file
         flist = set(field) - dflist
 
-        # Fields that need to be read to calculate derived field
-        flist_dep = set()
-        for f in dflist:
-            flist_dep = flist_dep | set(self.dfi[f]['field_dep'])
-
-        # Fields names to be dropped later
-        fdrop_list = flist_dep - flist
+        # Fields that need to be read and derived fields in order of evaluation
+        flist_dep, dforder = self._sort_derived_fields(dflist)
 
-        # Need to adjust names for vector fields
-        for f in list(fdrop_list):
-            if self._field_map[f]['nvar'] > 1:
-                for i in range(self._field_map[f]['nvar']):
-                    fdrop_list.add(f+str(i+1))
-                fdrop_list.remove(f)
+        # Number of derived fields that depend on each field
+        nuse = dict()
+        for f in dforder:
+            for f_ in self.dfi[f]['field_dep']:
+                nuse[f_] = nuse.get(f_, 0) + 1
 
-        field = list(flist_dep | flist)
-        dat = self._get_field(field, le, re, as_xarray)
+        dat = read_func(list(flist_dep | flist))
 
-        # Calculate derived fields
-        for f in dflist:
+        # Calculate derived fields and drop fields that are not requested
+        # right after their last use
+        for f in dforder:
             dat[f] = self.dfi[f]['func'](dat, self.u)
+            for f_ in self.dfi[f]['field_dep']:
+                nuse[f_] -= 1
+                if nuse[f_] == 0 and f_ not in field:
+                    # Need to adjust names for vector fields
+                    if as_xarray and f_ in self.field_list and \
+                       self._field_map[f_]['nvar'] > 1:
+                        for i in range(self._field_map[f_]['nvar']):
+                            del dat[f_ + str(i+1)]
+                    else:
+                        del dat[f_]
 
-        # Drop fields that are not requested
         if as_xarray:
-            dat = dat.drop(list(fdrop_list))
             dat.attrs['dfi'] = self.dfi
+
+        if squeeze:
+            return dat.squeeze()
         else:
-            for f in fdrop_list:
-                del dat[f]
+            return dat
 
-        return dat.squeeze()
+    def _sort_derived_fields(self, dflist):
+        """Sort derived fields and their (derived) dependencies in topological
+        order. Returns set of fields to be read and list of derived fields.
+        """
+
+        flist_dep = set()
+        dforder = []
+        state = dict()
+
+        def _visit(f):
+            if state.get(f) == 'done':
+                return
+            elif state.get(f) == 'visiting':
+                raise KeyError("Circular dependency of derived field:", f)
+
+            state[f] = 'visiting'
+            for f_ in sorted(self.dfi[f]['field_dep']):
+                if f_ in self.field_list:
+                    flist_dep.add(f_)
+                elif f_ in self.dfi:
+                    _visit(f_)
+                else:
+                    raise KeyError("Unrecognized field name(s):", [f_])
+
+            state[f] = 'done'
+            dforder.append(f)
+
+        for f in sorted(dflist):
+            _visit(f)
+
+        return flist_dep, dforder
 
-    def _get_field(self, field='density', le=None, re=None, as_xarray=True):
+    def _get_field(self, field='density', le=None, re=None, as_xarray=True,
+                   lazy=False):
 
         field = np.atleast_1d(field)
 
         # Create region
         self.set_region(le=le, re=re)
-        arr = self._get_array(field)
+        if lazy:
+            arr = self._get_array_lazy(field)
+        else:
+            arr = self._get_array(field)
 
         # Works only for 3d data
         if as_xarray:
-            # Cell center positions
-            x = dict()
-            for axis, le, re, dx in zip(('x', 'y', 'z'), \
-                    self.region['gle'], self.region['gre'], self.domain['dx']):
-                # May not result in correct number of elements due to truncation error
-                # x[axis] = np.arange(le + 0.5*dx, re + 0.5*dx, dx)
-                x[axis] = np.arange(le + 0.5*dx, re + 0.25*dx, dx)
-
-            dat = dict()
-            for k, v in arr.items():
-                if len(v.shape) > self.domain['ndim']:
-                    for i in range(v.shape[-1]):
-                        dat[k + str(i+1)] = (('z','y','x'), v[..., i])
-                else:
-                    dat[k] = (('z','y','x'), v)
-
-            attrs = dict()
-            for k, v in self.domain.items():
-                attrs[k] = v
-            return xr.Dataset(dat, coords=x, attrs=attrs)
+            return self._to_xarray(arr, self._get_region_cc_pos())
         else:
             if len(field) == 1:
                 return arr[field[0]]
@@ -370,6 +530,88 @@ class AthenaDataSet(object):
                 # Return a dictionary of numpy arrays
                 return arr
 
+    def _get_plane(self, field, axis, pos):
+        """Read planes of cells nearest to pos (sequence of floats) along axis
+        and return xarray dataset. Planes are stacked along axis.
+        """
+
+        i = dict(x=0, y=1, z=2)[axis]
+        dx = self.domain['dx']
+
+        # Find global index of planes and grids intersecting them
+        planes = []
+        for p in pos:
+            # One-cell-thick region through p. Make sure le < re always and
+            # truncation error does not cause problem
+            le = np.copy(self.domain['le'])
+            re = np.copy(self.domain['re'])
+            le[i] = p - 0.5*dx[i]
+            re[i] = p + 0.5*dx[i]
+            self.set_region(le=le, re=re)
+            x = self._get_region_cc_pos()
+            k = pd.Index(x[axis]).get_indexer([p], method='nearest')[0]
+            planes.append((self.region, x[axis][k],
+                           k + np.rint((self.region['gle'][i] - \
+                                        self.domain['le'][i])/dx[i]).astype(int)))
+
+        # Coordinates of output. Region spans the whole domain in other axes.
+        x[axis] = np.array([xk for _, xk, _ in planes])
+
+        arr = dict()
+        for f in field:
+            nvar = self._field_map[f]['nvar']
+            shape = [len(x_) for x_ in (x['z'], x['y'], x['x'])]
+            if nvar > 1:
+                shape.append(nvar)
+            arr[f] = np.empty(shape, dtype=self._field_map[f]['dtype'])
+
+        for n, (region, _, k) in enumerate(planes):
+            for ig in region['gidx']:
+                g = self.grid[ig]
+                # Index of the first cell of grid relative to domain left edge
+                il = (np.rint((g['le'] - self.domain['le'])/dx)).astype(int)
+                kk = k - il[i]
+                if kk < 0 or kk >= g['Nx'][i]:
+                    # Grid touches the slice region but does not contain plane
+                    continue
+
+                il = (np.rint((g['le'] - region['gle'])/dx)).astype(int)
+                iu = il + g['Nx']
+                slc = [slice(l, u) for l, u in zip(il[::-1], iu[::-1])]
+                slc[2-i] = n
+                for f in field:
+                    arr[f][tuple(slc)] = self._read_plane(g, f, i, kk)
+
+        return self._to_xarray(arr, x)
+
+    def _get_region_cc_pos(self):
+        """Cell center positions of current region.
+        """
+
+        x = dict()
+        for axis, le, re, dx in zip(('x', 'y', 'z'), \
+                self.region['gle'], self.region['gre'], self.domain['dx']):
+            # May not result in correct number of elements due to truncation error
+            # x[axis] = np.arange(le + 0.5*dx, re + 0.5*dx, dx)
+            x[axis] = np.arange(le + 0.5*dx, re + 0.25*dx, dx)
+
+        return x
+
+    def _to_xarray(self, arr, x):
+
+        dat = dict()
+        for k, v in arr.items():
+            if len(v.shape) > self.domain['ndim']:
+                for i in range(v.shape[-1]):
+                    dat[k + str(i+1)] = (('z','y','x'), v[..., i])
+            else:
+                dat[k] = (('z','y','x'), v)
+
+        attrs = dict()
+        for k, v in self.domain.items():
+            attrs[k] = v
+        return xr.Dataset(dat, coords=x, attrs=attrs)
+
     def _get_array(self, field):
 
         arr = dict()
@@ -379,7 +621,7 @@ class AthenaDataSet(object):
         # Read from individual grids and copy to data
         le = self.region['gle']
         dx = self.domain['dx']
-        for i in self.region['gidx']:
+        def _copy_grid(i):
             g = self.grid[i]
             il = (np.rint((g['le'] - le)/dx)).astype(int)
             iu = il + g['Nx']
@@ -388,42 +630,118 @@ class AthenaDataSet(object):
             for f in field:
                 arr[f][slc] = self._read_array(g, f)
 
+        gidx = self.region['gidx']
+        if self.nthreads > 1 and len(gidx) > 1:
+            with ThreadPoolExecutor(max_workers=self.nthreads) as executor:
+                # Consume iterator to propagate exceptions raised in threads
+                list(executor.map(_copy_grid, gidx))
+        else:
+            for i in gidx:
+                _copy_grid(i)
+
         return arr
 
-    def _read_array(self, grid, field):
+    def _get_array_lazy(self, field):
+        """Return dictionary of dask arrays of fields in current region.
+        Chunks are aligned with grids.
+        """
 
-        if field in grid['data']:
-            return grid['data'][field]
-        elif field in self.field_list:
-            fm = grid['field_map'][field]
-            if 'tarinfo' in grid:
-                fp = self.tarfile.extractfile(grid['tarinfo'])
-            else:
-                fp = open(grid['filename'], 'rb')
-            fp.seek(fm['offset'])
-            fp.readline() # skip header
-            if fm['read_table']:
-                fp.readline()
-            grid['data'][field] = np.asarray(
-                struct.unpack('>' + fm['ndata']*fm['dtype'],
-                              fp.read(fm['dsize'])))
-            fp.close()
+        try:
+            import dask.array as da
+        except ImportError:
+            raise ImportError('dask is required to read fields lazily.')
+
+        # Number of cells of grids along (z, y, x) (and vector components)
+        chunks = tuple([tuple(Nxg_) for Nxg_ in self.region['Nxg'][::-1]])
+        arr = dict()
+        for f in field:
+            fm = self._field_map[f]
+            chunks_ = chunks if fm['nvar'] == 1 else chunks + ((fm['nvar'],),)
+            name = 'vtk-{0:s}-{1:s}-{2:s}-{3:s}'.format(
+                osp.abspath(self.fnames[0]), f,
+                np.array2string(self.region['le']), np.array2string(self.region['re']))
+            arr[f] = da.from_array(_LazyField(self, f), chunks=chunks_, name=name,
+                                   meta=np.empty((0,)*len(chunks_), dtype=fm['dtype']))
+
+        return arr
+
+    def _read_array(self, grid, field, native=False):
+        """Read a field of a single grid.
+
+        The vtk file is memory-mapped and the returned array has the
+        (big-endian) dtype of the file. An in-memory copy is stored in
+        self.cache if it fits in the memory budget; otherwise a read-only
+        memory-mapped view is returned. Set native to True to get a
+        byte-swapped copy in native byte order.
+        """
 
+        if field not in self.field_list:
+            return None
+
+        fm = grid['field_map'][field]
+        fname, offset = self._get_data_offset(grid, fm)
+        key = (_file_id(fname), grid['filename'], field)
+        arr = self.cache.get(key)
+        if arr is None:
             if fm['nvar'] == 1:
-                shape = np.flipud(grid['Nx'])
+                shape = tuple(np.flipud(grid['Nx']))
             else:
                 shape = (*np.flipud(grid['Nx']), fm['nvar'])
 
-            grid['data'][field].shape = shape
+            arr = np.memmap(fname, dtype=np.dtype('>' + fm['dtype']), mode='r',
+                            offset=offset, shape=shape)
+            if arr.nbytes <= self.cache.maxbytes:
+                arr = np.array(arr)
+                self.cache.put(key, arr)
 
-            return grid['data'][field]
+        if native:
+            return arr.astype(arr.dtype.newbyteorder('='))
+        else:
+            return arr
 
+    def _read_plane(self, grid, field, axis, k):
+        """Read a plane (k-th cell along axis) of a field of a single grid.
+
+        Only the byte range spanned by the plane is memory-mapped; a z-plane is
+        contiguous and x/y-planes are strided views, so only the pages
+        containing the plane are read.
+        """
+
+        fm = grid['field_map'][field]
+        dtype = np.dtype('>' + fm['dtype'])
+        shape = list(np.flipud(grid['Nx']))
+        if fm['nvar'] > 1:
+            shape.append(fm['nvar'])
+
+        # Strides (in bytes) of the grid array in C order
+        strides = [dtype.itemsize*int(np.prod(shape[a+1:])) \
+                   for a in range(len(shape))]
+        a = 2 - axis
+        start = k*strides[a]
+        shape_plane = shape[:a] + shape[a+1:]
+        strides_plane = strides[:a] + strides[a+1:]
+        nbytes = dtype.itemsize + \
+            sum([(n - 1)*st for n, st in zip(shape_plane, strides_plane)])
+
+        fname, offset = self._get_data_offset(grid, fm)
+        mm = np.memmap(fname, dtype=np.uint8, mode='r',
+                       offset=offset + start, shape=(nbytes,))
+
+        return np.ndarray(shape_plane, dtype=dtype, buffer=mm,
+                          strides=strides_plane)
+
+    def _get_data_offset(self, grid, fm):
+        """Return file name and byte offset of the binary data of a field.
+        """
+
+        return grid['filename'], grid['data_offset'] + fm['data_offset']
 
     def _set_array(self, field):
 
         dtype = self._field_map[field]['dtype']
         nvar = self._field_map[field]['nvar']
-        Nxr = self.region['Nxr']
+        # Copy to avoid modifying (memoized) region info
+        Nxr = np.copy(self.region['Nxr'])
         if 'face_centered_B' in field:
             Nxr[int(field[-1])-1] += 1
         if nvar == 1:
@@ -483,13 +801,65 @@ class AthenaDataSet(object):
 
         return domain
 
+    def _get_index_stat(self):
+        """Return names (relative to dirname), sizes, and mtimes of vtk files
+        used to validate the index file.
+        """
+
+        fnames = [osp.relpath(f, self.dirname) for f in self.fnames]
+        st = [os.stat(f) for f in self.fnames]
+        size = np.array([st_.st_size for st_ in st])
+        mtime = np.array([st_.st_mtime_ns for st_ in st])
+
+        return fnames, size, mtime
+
+    def _read_index(self):
+        """Read grid info from the index file.
+
+        Returns None if the index file does not exist or is outdated.
+        """
+
+        idx = _load_index(self._fidx)
+        if idx is None:
+            return None
+
+        fnames, size, mtime = self._get_index_stat()
+        if sorted(idx['fnames']) != sorted(fnames):
+            return None
+
+        # Size and mtime in the order of files stored in index
+        order = dict((f, i) for i, f in enumerate(fnames))
+        order = [order[f] for f in idx['fnames']]
+        if not (np.array_equal(idx['size'], size[order]) and \
+                np.array_equal(idx['mtime'], mtime[order])):
+            return None
+
+        return _index_to_grid(idx, self.dirname)
+
+    def _write_index(self):
+        """Write grid info to the index file (atomically).
+        """
+
+        if self._fidx is None:
+            return
+
+        fnames, size, mtime = self._get_index_stat()
+        # Store file stat in the order of grid
+        order = dict((f, i) for i, f in enumerate(fnames))
+        order = [order[osp.relpath(g['filename'], self.dirname)] for g in self.grid]
+
+        idx = _grid_to_index(self.grid, self.dirname)
+        idx['size'] = size[order]
+        idx['mtime'] = mtime[order]
+
+        _dump_index(idx, self._fidx)
+
     def _set_grid(self):
         grid = []
         # Record filename and data_offset
         for i, fname in enumerate(self.fnames):
             file = open(fname, 'rb')
             g = dict()
-            g['data'] = dict()
             g['filename'] = fname
             g['read_field'] = None
             g['read_type'] = None
@@ -512,6 +882,150 @@ class AthenaDataSet(object):
 
 
 
+class _LazyField(object):
+    """Array-like object used to create dask array of a field in the current
+    region of AthenaDataSet. Grid data are read when sliced.
+    """
+
+    def __init__(self, ds, field):
+        self.ds = ds
+        self.field = field
+        self.gidx = ds.region['gidx']
+        self.gle = ds.region['gle']
+        fm = ds._field_map[field]
+        self.dtype = np.dtype(fm['dtype'])
+        self.shape = tuple(np.flipud(ds.region['Nxr']))
+        if fm['nvar'] > 1:
+            self.shape += (fm['nvar'],)
+        self.ndim = len(self.shape)
+        # Index ranges (z, y, x) of grids in the region, computed once so
+        # that grids overlapping a chunk are found with one comparison
+        dx = ds.domain['dx']
+        le = np.array([ds.grid[i]['le'] for i in self.gidx]).reshape(-1, 3)
+        Nx = np.array([ds.grid[i]['Nx'] for i in self.gidx]).reshape(-1, 3)
+        self.il = np.rint((le - self.gle)/dx).astype(int)[:, ::-1]
+        self.iu = self.il + Nx[:, ::-1]
+
+    def __getitem__(self, key):
+        # Range of (z, y, x) indices. Dask requests contiguous slices.
+        key = tuple(key) + (slice(None),)*(self.ndim - len(tuple(key)))
+        rng = [k.indices(n)[:2] for k, n in zip(key[:3], self.shape[:3])]
+        out = np.empty([u - l for l, u in rng] + list(self.shape[3:]),
+                       dtype=self.dtype)
+        rl = np.array([r[0] for r in rng])
+        ru = np.array([r[1] for r in rng])
+        overlap = np.all((self.il < ru) & (self.iu > rl), axis=1)
+        for n in np.nonzero(overlap)[0]:
+            g = self.ds.grid[self.gidx[n]]
+            il = self.il[n]
+            iu = self.iu[n]
+            lo = [max(l, r[0]) for l, r in zip(il, rng)]
+            hi = [min(u, r[1]) for u, r in zip(iu, rng)]
+            src = tuple([slice(l - l0, u - l0) for l, u, l0 in zip(lo, hi, il)])
+            dst = tuple([slice(l - r[0], u - r[0]) for l, u, r in zip(lo, hi, rng)])
+            out[dst] = self.ds._read_array(g, self.field)[src]
+
+        return out[(Ellipsis,) + key[3:]]
+
+
+def _file_id(fname):
+    """Path, size, and mtime of a file used in keys of grid_cache, so that
+    data of a file rewritten in place are not read from the cache.
+    """
+
+    st = os.stat(fname)
+
+    return (osp.abspath(fname), st.st_size, st.st_mtime_ns)
+
+
+def _load_index(fidx):
+    """Load index file. Returns None if it does not exist, cannot be read,
+    or has a different version.
+    """
+
+    if fidx is None or not osp.exists(fidx):
+        return None
+
+    try:
+        with open(fidx, 'rb') as fp:
+            idx = pickle.load(fp)
+    except Exception:
+        return None
+
+    if idx.get('version') != _INDEX_VERSION:
+        return None
+
+    return idx
+
+
+def _dump_index(idx, fidx):
+    """Write index file atomically. Failure (e.g., no write permission) only
+    gives a warning because the index is optional.
+    """
+
+    if fidx is None:
+        return
+
+    ftmp = '{0:s}.{1:d}.tmp'.format(fidx, os.getpid())
+    try:
+        os.makedirs(osp.dirname(fidx) or '.', exist_ok=True)
+        with open(ftmp, 'wb') as fp:
+            pickle.dump(idx, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(ftmp, fidx)
+    except OSError as e:
+        warnings.warn('Could not write vtk index {0:s}: {1:s}'.format(
+            fidx, str(e)))
+        if osp.exists(ftmp):
+            os.remove(ftmp)
+
+
+def _grid_to_index(grid, dirname, keys=_INDEX_KEYS):
+    """Pack grid info into a dictionary of arrays to be saved as index.
+    File names are stored relative to dirname (as they are if None).
+    """
+
+    idx = dict(version=_INDEX_VERSION)
+    if dirname is None:
+        idx['fnames'] = [g['filename'] for g in grid]
+    else:
+        idx['fnames'] = [osp.relpath(g['filename'], dirname) for g in grid]
+    for k in keys:
+        idx[k] = np.array([g[k] for g in grid])
+
+    # Save unique field maps only
+    idx['field_map'] = []
+    idx['field_map_id'] = np.empty(len(grid), dtype=int)
+    fm_id = dict()
+    for i, g in enumerate(grid):
+        k = id(g['field_map'])
+        if k not in fm_id:
+            fm_id[k] = len(idx['field_map'])
+            idx['field_map'].append(g['field_map'])
+        idx['field_map_id'][i] = fm_id[k]
+
+    return idx
+
+
+def _index_to_grid(idx, dirname, keys=_INDEX_KEYS):
+    """Construct list of grid dictionaries from index.
+    """
+
+    grid = []
+    for i, fname in enumerate(idx['fnames']):
+        g = dict()
+        if dirname is None:
+            g['filename'] = fname
+        else:
+            g['filename'] = osp.join(dirname, fname)
+        for k in keys:
+            g[k] = idx[k][i]
+        g['re'] = g['le'] + g['Nx']*g['dx']
+        g['field_map'] = idx['field_map'][idx['field_map_id'][i]]
+        grid.append(g)
+
+    return grid
+
+
 def _parse_filename(filename):
     """Break up a filename into its component
     to check the extension and extract the output number.
@@ -609,7 +1123,10 @@ def _set_field_map(grid):
         else:
             raise TypeError(sp[0] + ' is unknown type.')
 
+        # Beginning of binary data relative to grid['data_offset'].
+        # Header length may differ between grids (e.g., sign of ORIGIN).
         field_map[field]['offset'] = offset
+        field_map[field]['data_offset'] = fp.tell() - grid['data_offset']
         field_map[field]['ndata'] = field_map[field]['nvar']*grid['ncells']
         if field == 'face_centered_B1':
             field_map[field]['ndata'] = (Nx[0]+1)*Nx[1]*Nx[2]
@@ -0,0 +1,274 @@
+"""
+Convert athena vtk snapshot to a chunked, compressed HDF5 store and read it
+"""
+
+from __future__ import print_function
+
+import os
+import os.path as osp
+import json
+import numpy as np
+
+from .read_vtk import AthenaDataSet, grid_cache, _file_id
+from ..util.units import Units
+
+# Increase when the layout of the HDF5 store changes
+_H5_VERSION = 2
+
+def vtk_to_h5(ds, filename, fields=None, compression='gzip',
+              compression_opts=None, shuffle=True):
+    """Write fields of a vtk snapshot to a chunked, compressed HDF5 file.
+
+    Each field is stored as a dataset of the whole domain with shape
+    (Nz, Ny, Nx) or (Nz, Ny, Nx, nvar) in native byte order. Chunks are
+    aligned to the grid blocks of the simulation, so that reading a region
+    decompresses only the blocks it overlaps. Grid layout, domain info, and
+    the list of all fields of the snapshot (to tell whether the store is
+    complete) are stored as attributes. The file is written to a temporary file first
+    and renamed.
+
+    Parameters
+    ----------
+    ds : AthenaDataSet or AthenaDataSetTar
+        Snapshot to be converted.
+    filename : str
+        Name of the HDF5 file.
+    fields : list of str
+        Fields to convert. If None, convert all fields in ds.field_list.
+    compression : str
+        'gzip', 'lzf', or None (built-in HDF5 filters), or 'zstd' or 'blosc'
+        (blosc with zstd/lz4 requires hdf5plugin). Default value is 'gzip'.
+    compression_opts : int
+        Compression level. Default value is 4 for gzip and 5 for zstd/blosc.
+    shuffle : bool
+        Apply byte-shuffle filter before compression (improves compression
+        ratio of floating point data). Default value is True.
+
+    Returns
+    -------
+    filename : str
+        Name of the HDF5 file.
+    """
+
+    import h5py
+
+    if fields is None:
+        fields = ds.field_list
+
+    kwargs = _get_compression_kwargs(compression, compression_opts, shuffle)
+
+    domain = ds.domain
+    grid = ds.grid
+    # Chunk shape (z, y, x) is the size of the first grid, which is the same
+    # for all grids if domain['all_grid_equal'] is True.
+    chunks = tuple([int(n) for n in grid[0]['Nx'][::-1]])
+
+    ftmp = '{0:s}.{1:d}.tmp'.format(filename, os.getpid())
+    os.makedirs(osp.dirname(osp.abspath(filename)), exist_ok=True)
+    try:
+        with h5py.File(ftmp, 'w') as f:
+            f.attrs['version'] = _H5_VERSION
+            f.attrs['problem_id'] = ds.problem_id
+            f.attrs['num'] = ds.num
+            f.attrs['source'] = osp.abspath(ds.fnames[0])
+            f.attrs['field_list'] = json.dumps(list(ds.field_list))
+            for k, v in domain.items():
+                f.attrs[k] = v
+
+            g = f.create_group('grid')
+            for k in ('le', 'dx', 'Nx', 'time'):
+                g.create_dataset(k, data=np.array([g_[k] for g_ in grid]))
+
+            for field in fields:
+                fm = ds._field_map[field]
+                shape = tuple(domain['Nx'][::-1])
+                chunks_ = chunks
+                if fm['nvar'] > 1:
+                    shape += (fm['nvar'],)
+                    chunks_ += (fm['nvar'],)
+
+                dset = f.create_dataset(field, shape=shape,
+                                        dtype=np.dtype(fm['dtype']),
+                                        chunks=chunks_, **kwargs)
+                dset.attrs['nvar'] = fm['nvar']
+                dset.attrs['dtype'] = fm['dtype']
+                # Write grid by grid to keep memory usage small
+                for g_ in grid:
+                    dset[_get_grid_slice(g_, domain)] = \
+                        ds._read_array(g_, field, native=True)
+
+        os.replace(ftmp, filename)
+    finally:
+        if osp.exists(ftmp):
+            os.remove(ftmp)
+
+    return filename
+
+
+class AthenaDataSetH5(AthenaDataSet):
+
+    def __init__(self, filename, units=Units(), dfi=None, nthreads=1,
+                 cache=None):
+        """Class to read snapshot converted to HDF5 by vtk_to_h5.
+
+        Same get_field/get_slice interface as AthenaDataSet. Grid layout of
+        the original vtk snapshot is retained, and each grid is read as an
+        HDF5 hyperslab aligned to chunks. If the store was converted with a
+        subset of fields, field_list has those fields only and complete is
+        False. The file is kept open until close() is called (or the object
+        is deleted); can be used as a context manager.
+
+        Parameters
+        ----------
+        filename : string
+            Name of the HDF5 file to open
+        units : Units
+            pyathena Units object (used for reading derived fields)
+        dfi : dict
+            Dictionary containing derived fields info
+        nthreads : int
+            Number of threads used to read grids concurrently.
+            Default value is 1.
+        cache : LRUCache
+            Memory-budgeted cache of grid data. If None, use grid_cache shared
+            by all AthenaDataSet objects.
+        """
+
+        import h5py
+        try:
+            # Register blosc/zstd filters if available
+            import hdf5plugin
+        except ImportError:
+            pass
+
+        if not osp.exists(filename):
+            raise IOError(('File does not exist: {0:s}'.format(filename)))
+
+        self._h5 = h5py.File(filename, 'r')
+        attrs = self._h5.attrs
+        if attrs.get('version') != _H5_VERSION:
+            self.close()
+            raise IOError(('Unsupported HDF5 store version: {0:s}'.format(filename)))
+
+        self.dirname = osp.dirname(filename)
+        self.problem_id = str(attrs['problem_id'])
+        self.num = int(attrs['num'])
+        self.suffix = None
+        self.ext = 'h5'
+        self.mpi_mode = False
+        self.fnames = [filename]
+        self.u = units
+        self.dfi = dfi
+        self.nthreads = nthreads
+        if cache is None:
+            cache = grid_cache
+        self.cache = cache
+        if dfi is not None:
+            self.derived_field_list = list(dfi.keys())
+        else:
+            self.derived_field_list = None
+
+        self.source_field_list = json.loads(attrs['field_list'])
+        self._field_map = dict()
+        for field, dset in self._h5.items():
+            if field == 'grid':
+                continue
+            self._field_map[field] = dict(nvar=int(dset.attrs['nvar']),
+                                          dtype=str(dset.attrs['dtype']))
+
+        self.grid = []
+        g = self._h5['grid']
+        for le, dx, Nx, time in zip(g['le'][()], g['dx'][()], g['Nx'][()],
+                                    g['time'][()]):
+            self.grid.append(dict(filename=filename, le=le, dx=dx, Nx=Nx,
+                                  re=le + Nx*dx, time=time,
+                                  field_map=self._field_map))
+
+        self.domain = self._set_domain()
+        for g in self.grid:
+            g['slc'] = _get_grid_slice(g, self.domain)
+
+        self._set_grid_index()
+        self.set_region()
+        self.field_list = list(self._field_map.keys())
+        self.complete = set(self.source_field_list) <= set(self.field_list)
+
+    def close(self):
+        """Close the HDF5 file.
+        """
+
+        if getattr(self, '_h5', None) is not None:
+            self._h5.close()
+            self._h5 = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _read_array(self, grid, field, native=False):
+        """Read a field of a single grid (in native byte order).
+        """
+
+        if field not in self.field_list:
+            return None
+
+        key = (_file_id(self.fnames[0]),
+               tuple([s.start for s in grid['slc']]), field)
+        arr = self.cache.get(key)
+        if arr is None:
+            arr = self._h5[field][grid['slc']]
+            self.cache.put(key, arr)
+
+        return arr
+
+    def _read_plane(self, grid, field, axis, k):
+        """Read a plane (k-th cell along axis) of a field of a single grid.
+        """
+
+        slc = list(grid['slc'])
+        slc[2 - axis] = slc[2 - axis].start + k
+
+        return self._h5[field][tuple(slc)]
+
+
+def _get_grid_slice(grid, domain):
+    """Slice (z, y, x) of grid in the array of the whole domain.
+    """
+
+    il = (np.rint((grid['le'] - domain['le'])/domain['dx'])).astype(int)
+    iu = il + grid['Nx']
+
+    return tuple([slice(l, u) for l, u in zip(il[::-1], iu[::-1])])
+
+
+def _get_compression_kwargs(compression, compression_opts, shuffle):
+    """Keyword arguments for h5py create_dataset.
+    """
+
+    if compression in ('zstd', 'blosc'):
+        try:
+            import hdf5plugin
+        except ImportError:
+            raise ImportError('hdf5plugin is required for ' +
+                              '{0:s} compression.'.format(compression))
+
+        if compression_opts is None:
+            compression_opts = 5
+        cname = 'zstd' if compression == 'zstd' else 'lz4'
+        shuffle_ = hdf5plugin.Blosc.SHUFFLE if shuffle else \
+            hdf5plugin.Blosc.NOSHUFFLE
+        return dict(hdf5plugin.Blosc(cname=cname, clevel=compression_opts,
+                                     shuffle=shuffle_))
+    else:
+        if compression == 'gzip' and compression_opts is None:
+            compression_opts = 4
+        return dict(compression=compression, compression_opts=compression_opts,
+                    shuffle=shuffle and compression is not None)
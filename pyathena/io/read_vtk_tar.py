@@ -12,11 +12,16 @@ import xarray as xr
 import astropy.constants as ac
 import astropy.units as au
 import tarfile
-from .read_vtk import AthenaDataSet,_parse_filename,_vtk_parse_line
+from .read_vtk import AthenaDataSet,_parse_filename,_vtk_parse_line,grid_cache
+from .read_vtk import _load_index, _dump_index, _grid_to_index, _index_to_grid, \
+    _INDEX_KEYS
 
 from ..util.units import Units
 
-def read_vtk_tar(filename, id0_only=False):
+# Tar member offset and size are saved in the index in addition
+_INDEX_KEYS_TAR = _INDEX_KEYS + ('offset_data', 'size')
+
+def read_vtk_tar(filename, id0_only=False, nthreads=1):
     """Convenience wrapper function to read Athena vtk output file
     using AthenaDataSet class.
 
@@ -27,17 +32,20 @@ def read_vtk_tar(filename, id0_only=False):
     id0_only : bool
         Flag to enforce to read vtk file in id0 directory only.
         Default value is False.
+    nthreads : int
+        Number of threads used to read grids concurrently. Default value is 1.
 
     Returns
     -------
     ds : AthenaDataSet
     """
 
-    return AthenaDataSetTar(filename, id0_only=id0_only)
+    return AthenaDataSetTar(filename, id0_only=id0_only, nthreads=nthreads)
 
 class AthenaDataSetTar(AthenaDataSet):
 
-    def __init__(self, filename, id0_only=False, units=Units(), dfi=None):
+    def __init__(self, filename, id0_only=False, units=Units(), dfi=None,
+                 nthreads=1, index_dir=None, cache=None):
         """Class to read athena vtk file.
 
         Parameters
@@ -51,6 +59,19 @@ class AthenaDataSetTar(AthenaDataSet):
             pyathena Units object (used for reading derived fields)
         dfi : dict
             Dictionary containing derived fields info
+        nthreads : int
+            Number of threads used to read grids concurrently.
+            Default value is 1.
+        index_dir : str
+            If given, save offsets of tar members and grid and field map info
+            to an index file in index_dir and read it the next time the
+            snapshot is opened, so that the tar file does not need to be
+            scanned. The index is rebuilt if size or mtime of the tar file
+            changes. LoadSim uses savdir/vtk_index. Default value is None (no
+            index).
+        cache : LRUCache
+            Memory-budgeted cache of grid data. If None, use grid_cache shared
+            by all AthenaDataSet objects.
         """
 
         if not osp.exists(filename):
@@ -71,54 +92,71 @@ class AthenaDataSetTar(AthenaDataSet):
         self.fnames = [filename]
         self.u = units
         self.dfi = dfi
+        self.nthreads = nthreads
+        if cache is None:
+            cache = grid_cache
+        self.cache = cache
         if dfi is not None:
             self.derived_field_list = list(dfi.keys())
         else:
             self.derived_field_list = None
 
-        # open tar file
-        if ext == 'tar':
-            self.tarfile = tarfile.open(filename)
-            self.fnames = self.tarfile.getnames()[1:]
-            self.mpi_mode = len(self.fnames)>1
-        else:
+        if ext != 'tar':
             raise IOError(('[read_vtk_tar] Expected tarred file but provided:'
                            ' {0:s}'.format(filename)))
-        self.grid = self._set_grid()
-        self.domain = self._set_domain()
-        self.set_region()
+        self.ftar = filename
+
+        if index_dir is not None:
+            self._fidx = osp.join(index_dir, osp.basename(filename) + '.idx')
+        else:
+            self._fidx = None
 
-        # Need separte field_map for different grids
-        if self.domain['all_grid_equal']:
-            self._field_map = _set_field_map(self.grid[0],self.tarfile)
-            for g in self.grid:
-                g['field_map'] = self._field_map
+        self.grid = self._read_index()
+        if self.grid is None:
+            # Scan tar members once and parse headers using a single file handle
+            with tarfile.open(filename) as tf:
+                members = [m for m in tf.getmembers() if m.isfile()]
+            with open(filename, 'rb') as fp:
+                self.grid = self._set_grid(members, fp)
+                self.domain = self._set_domain()
+
+                # Need separte field_map for different grids
+                if self.domain['all_grid_equal']:
+                    field_map = _set_field_map(self.grid[0], fp)
+                    for g in self.grid:
+                        g['field_map'] = field_map
+                else:
+                    for g in self.grid:
+                        g['field_map'] = _set_field_map(g, fp)
+
+            self._write_index()
         else:
-            for g in self.grid:
-                g['field_map'] = _set_field_map(g,self.tarfile)
-            self._field_map = self.grid[0]['field_map']
+            self.domain = self._set_domain()
 
+        self.fnames = [g['filename'] for g in self.grid]
+        self.mpi_mode = len(self.fnames) > 1
+        self._set_grid_index()
+        self.set_region()
+        self._field_map = self.grid[0]['field_map']
         self.field_list = list(self._field_map.keys())
 
-    def _set_grid(self):
+    def _set_grid(self, members, fp):
         grid = []
-        members = self.tarfile.getmembers()
-        # Record filename and data_offset
-        for i, tarinfo in enumerate(members):
-            if tarinfo.isdir(): continue
-            file = self.tarfile.extractfile(tarinfo)
+        # Record member name, offset of member in tar, and data_offset
+        # (relative to the beginning of member)
+        for tarinfo in members:
             g = dict()
-            g['data'] = dict()
             g['filename'] = tarinfo.name[5:]
-            g['tarinfo'] = tarinfo
+            g['offset_data'] = tarinfo.offset_data
+            g['size'] = tarinfo.size
             g['read_field'] = None
             g['read_type'] = None
 
+            fp.seek(tarinfo.offset_data)
             while g['read_field'] is None:
-                g['data_offset'] = file.tell()
-                line = file.readline()
+                g['data_offset'] = fp.tell() - tarinfo.offset_data
+                line = fp.readline()
                 _vtk_parse_line(line, g)
-            file.close()
             g['Nx'] -= 1
             g['Nx'][g['Nx'] == 0] = 1
             g['dx'][g['Nx'] == 1] = 1.0
@@ -134,14 +172,50 @@ class AthenaDataSetTar(AthenaDataSet):
             ranklist.append(rank)
         return list(np.array(grid)[np.argsort(ranklist)])
 
+    def _read_index(self):
+        """Read grid info from the index file.
+
+        Returns None if the index file does not exist or is outdated.
+        """
+
+        idx = _load_index(self._fidx)
+        if idx is None:
+            return None
+
+        st = os.stat(self.ftar)
+        if idx.get('tar_size') != st.st_size or \
+           idx.get('tar_mtime') != st.st_mtime_ns:
+            return None
+
+        return _index_to_grid(idx, None, keys=_INDEX_KEYS_TAR)
+
+    def _write_index(self):
+        """Write grid info to the index file (atomically).
+        """
+
+        if self._fidx is None:
+            return
+
+        st = os.stat(self.ftar)
+        idx = _grid_to_index(self.grid, None, keys=_INDEX_KEYS_TAR)
+        idx['tar_size'] = st.st_size
+        idx['tar_mtime'] = st.st_mtime_ns
+        _dump_index(idx, self._fidx)
+
+    def _get_data_offset(self, grid, fm):
+        """Return tar file name and byte offset of the binary data of a field.
+        """
+
+        return self.ftar, grid['offset_data'] + \
+            grid['data_offset'] + fm['data_offset']
 
-def _set_field_map(grid,tf):
-    fp = tf.extractfile(grid['tarinfo'])
 
-    fp.seek(0, 2)
-    eof = fp.tell()
+def _set_field_map(grid, fp):
+    # Offsets are relative to the beginning of the tar member
+    base = grid['offset_data']
+    eof = grid['size']
     offset = grid['data_offset']
-    fp.seek(offset)
+    fp.seek(base + offset)
 
     field_map = dict()
     if 'Nx' in grid:
@@ -162,7 +236,10 @@ def _set_field_map(grid,tf):
         else:
             raise TypeError(sp[0] + ' is unknown type.')
 
+        # Beginning of binary data relative to grid['data_offset'].
+        # Header length may differ between grids (e.g., sign of ORIGIN).
         field_map[field]['offset'] = offset
+        field_map[field]['data_offset'] = fp.tell() - base - grid['data_offset']
         field_map[field]['ndata'] = field_map[field]['nvar']*grid['ncells']
         if field == 'face_centered_B1':
             field_map[field]['ndata'] = (Nx[0]+1)*Nx[1]*Nx[2]
@@ -181,11 +258,12 @@ def _set_field_map(grid,tf):
         field_map[field]['dtype'] = dtype
         field_map[field]['dsize'] = field_map[field]['ndata']*struct.calcsize(dtype)
         fp.seek(field_map[field]['dsize'], 1)
-        offset = fp.tell()
+        offset = fp.tell() - base
+        # Reading past the end of member is harmless; offset >= eof ends loop
         tmp = fp.readline()
         if len(tmp) > 1:
-            fp.seek(offset)
+            fp.seek(base + offset)
         else:
-            offset = fp.tell()
+            offset = fp.tell() - base
 
     return field_map
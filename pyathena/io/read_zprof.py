@@ -11,11 +11,20 @@ import numpy as np
 import pandas as pd
 import xarray as xr
 
+# Increase when the layout of the zprof store changes
+_ZPROF_STORE_VERSION = 1
+# Number of snapshots parsed at a time
+_ZPROF_BATCH = 64
+
 def read_zprof_all(dirname, problem_id, phase='whole', savdir=None,
-                   force_override=False):
+                   force_override=False, nprocs=1):
     """Function to read all zprof files in directory and make a Dataset object
     and write to a NetCDF file.
 
+    Profiles of all phases are consolidated into a single NetCDF file
+    (problem_id.zprof.nc) with dimensions (phase, z, time), which is updated
+    incrementally by update_zprof_store.
+
     Note: An xarray DataArray holds a single multi-dimensional variable and its
     coordinates, while a xarray Dataset holds multiple variables that
     potentially share the same coordinates.
@@ -34,6 +43,8 @@ def read_zprof_all(dirname, problem_id, phase='whole', savdir=None,
         Default value is dirname.
     force_override : bool
         Flag to force read of hst file even when netcdf exists
+    nprocs : int
+        Number of processes used to parse new zprof files. Default value is 1.
 
     Returns
     -------
@@ -41,68 +52,205 @@ def read_zprof_all(dirname, problem_id, phase='whole', savdir=None,
 
     """
 
-    # Find all files with "/dirname/problem_id.xxxx.phase.zprof"
-    fname_base = '{0:s}.????.{1:s}.zprof'.format(problem_id, phase)
+    fname_base = '{0:s}.????.*.zprof'.format(problem_id)
     fnames = sorted(glob.glob(osp.join(dirname, fname_base)))
 
-    fnetcdf = '{0:s}.{1:s}.zprof.nc'.format(problem_id, phase)
+    fnetcdf = '{0:s}.zprof.nc'.format(problem_id)
     if savdir is not None:
         fnetcdf = osp.join(savdir, fnetcdf)
     else:
         fnetcdf = osp.join(dirname, fnetcdf)
 
-    print(fnetcdf)
-
-    # Check if netcdf file exists and compare last modified times
-    mtime_max = np.array([osp.getmtime(fname) for fname in fnames]).max()
-    if not force_override and osp.exists(fnetcdf) and \
-        osp.getmtime(fnetcdf) > mtime_max:
-        da = xr.open_dataset(fnetcdf)
-        return da
-
-    # If here, need to create a new dataarray
-    time = []
-    df_all = []
-    for i, fname in enumerate(fnames):
-        # Read time
-        with open(fname, 'r') as f:
-            h = f.readline()
-            time.append(float(h[h.rfind('t=') + 2:]))
+    update_zprof_store(fnames, fnetcdf, force_override=force_override,
+                       nprocs=nprocs)
 
-        # read pickle if exists
-        df = read_zprof(fname, force_override=False)
-        if i == 0: # save z coordinates
-            z = (np.array(df['z'])).astype(float)
-        df.drop(columns='z', inplace=True)
-        df_all.append(df)
+    with xr.open_dataset(fnetcdf) as ds:
+        ds = ds.drop_vars(['num', 'mtime']).sel(phase=phase).\
+            drop_vars('phase').load()
+    ds.attrs = dict()
 
-        # For test
-        # if i > 10:
-        #     break
+    return ds
 
-    fields = np.array(df.columns)
+def update_zprof_store(fnames, fstore, force_override=False, nprocs=1):
+    """Append profiles of zprof files to a NetCDF file with dimensions
+    (phase, z, time).
+
+    Only snapshots not yet in the store are parsed, and all phases of a
+    snapshot are read together. Snapshots with missing phase files are
+    skipped until all phases are present. The store is rebuilt if a file in
+    the store was modified or a new snapshot precedes the last one in store.
+
+    Parameters
+    ----------
+    fnames : list of str
+        Names of zprof files (problem_id.xxxx.phase.zprof)
+    fstore : str
+        Name of the NetCDF file
+    force_override : bool
+        Rebuild the store from scratch. Default value is False.
+    nprocs : int
+        Number of processes used to parse zprof files. Default value is 1.
+
+    Returns
+    -------
+    fstore : str
+    """
 
-    # Combine all data
-    # Coordinates: time and z
-    time = (np.array(time)).astype(float)
-    fields = np.array(df.columns)
-    df_all = np.stack(df_all, axis=0)
-    data_vars = dict()
-    for i, f in enumerate(fields):
-        data_vars[f] = (('z', 'time'), df_all[...,i].T)
+    import netCDF4
 
-    ds = xr.Dataset(data_vars, coords=dict(z=z, time=time))
+    # Group files by snapshot number and phase
+    files = dict()
+    for f in fnames:
+        sp = osp.basename(f).split('.')
+        files.setdefault(int(sp[-3]), dict())[sp[-2]] = f
 
-    # Somehow overwriting using mode='w' doesn't work..
-    if osp.exists(fnetcdf):
-        os.remove(fnetcdf)
+    if len(files) == 0:
+        raise IOError('[update_zprof_store]: zprof files not found.')
+
+    phases = sorted(set([ph for d in files.values() for ph in d]),
+                    key=_zprof_phase_order)
+
+    rebuild = force_override or not osp.exists(fstore)
+    if not rebuild:
+        try:
+            with netCDF4.Dataset(fstore, 'r') as nc:
+                if nc.getncattr('version') != _ZPROF_STORE_VERSION or \
+                   list(nc['phase'][:]) != phases:
+                    rebuild = True
+                else:
+                    nums_old = np.array(nc['num'][:])
+                    mtime_old = np.array(nc['mtime'][:])
+        except (OSError, KeyError, AttributeError):
+            rebuild = True
+
+    if not rebuild:
+        for num, mt in zip(nums_old, mtime_old.T):
+            d = files.get(num, dict())
+            if len(d) != len(phases) or \
+               any([os.stat(d[ph]).st_mtime_ns != m for ph, m in zip(phases, mt)]):
+                rebuild = True
+                break
+
+    nums = sorted([num for num, d in files.items() if len(d) == len(phases)])
+    if not rebuild:
+        nums = [num for num in nums if num not in set(nums_old)]
+        if len(nums) > 0 and len(nums_old) > 0 and nums[0] < nums_old.max():
+            rebuild = True
+            nums = sorted([num for num, d in files.items()
+                           if len(d) == len(phases)])
+
+    if len(nums) == 0:
+        return fstore
+
+    if not rebuild:
+        # Variables and z coordinates must be the same as in store
+        time, vlist, dat = _read_zprof_arrays(files[nums[0]][phases[0]])
+        with netCDF4.Dataset(fstore, 'r') as nc:
+            if not np.array_equal(nc['z'][:], dat[:, vlist.index('z')]) or \
+               set(nc.variables) != set(vlist + ['phase', 'time', 'num', 'mtime']):
+                return update_zprof_store(fnames, fstore, force_override=True,
+                                          nprocs=nprocs)
+
+    if rebuild:
+        ftmp = '{0:s}.{1:d}.tmp'.format(fstore, os.getpid())
+        os.makedirs(osp.dirname(osp.abspath(fstore)), exist_ok=True)
+        fnc = ftmp
+    else:
+        ftmp = None
+        fnc = fstore
+
+    ex = None
+    if nprocs > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        ex = ProcessPoolExecutor(nprocs)
 
     try:
-        ds.to_netcdf(fnetcdf, mode='w')
-    except IOError:
-        pass
+        # Parse and write snapshots in batches to limit memory usage
+        for i in range(0, len(nums), _ZPROF_BATCH):
+            nums_ = nums[i:i + _ZPROF_BATCH]
+            fnames_ = [files[num][ph] for num in nums_ for ph in phases]
+            mtime = np.array([os.stat(f).st_mtime_ns for f in fnames_],
+                             dtype=np.int64).reshape(len(nums_), len(phases)).T
+            if ex is not None:
+                res = list(ex.map(_read_zprof_arrays, fnames_,
+                                  chunksize=max(1, len(fnames_)//(4*nprocs))))
+            else:
+                res = [_read_zprof_arrays(f) for f in fnames_]
+
+            time = np.array([r[0] for r in res[::len(phases)]])
+            vlist = res[0][1]
+            if any([r[1] != vlist for r in res]):
+                raise ValueError('[update_zprof_store]: zprof files have ' +
+                                 'different variables.')
+            # (phase, time, z, var)
+            dat = np.stack([r[2] for r in res]).reshape(
+                (len(nums_), len(phases)) + res[0][2].shape).swapaxes(0, 1)
+
+            if rebuild and i == 0:
+                with netCDF4.Dataset(fnc, 'w') as nc:
+                    _create_zprof(nc, phases, vlist, dat[0, 0, :, vlist.index('z')])
+            with netCDF4.Dataset(fnc, 'a') as nc:
+                _append_zprof(nc, nums_, time, mtime, vlist, dat)
+            del res, dat
+
+        if rebuild:
+            os.replace(ftmp, fstore)
+    finally:
+        if ex is not None:
+            ex.shutdown()
+        if ftmp is not None and osp.exists(ftmp):
+            os.remove(ftmp)
+
+    return fstore
+
+def _create_zprof(nc, phases, vlist, z):
+    nc.setncattr('version', _ZPROF_STORE_VERSION)
+    nc.createDimension('phase', len(phases))
+    nc.createDimension('z', len(z))
+    nc.createDimension('time', None)
+    v = nc.createVariable('phase', str, ('phase',))
+    v[:] = np.array(phases, dtype=object)
+    nc.createVariable('z', 'f8', ('z',))[:] = z
+    nc.createVariable('time', 'f8', ('time',))
+    nc.createVariable('num', 'i4', ('time',))
+    nc.createVariable('mtime', 'i8', ('phase', 'time'))
+    for v in vlist:
+        if v != 'z':
+            nc.createVariable(v, 'f8', ('phase', 'z', 'time'),
+                              chunksizes=(1, len(z), 64))
+
+def _append_zprof(nc, nums, time, mtime, vlist, dat):
+    n0 = nc.dimensions['time'].size
+    n1 = n0 + len(nums)
+    nc['time'][n0:n1] = time
+    nc['num'][n0:n1] = nums
+    nc['mtime'][:, n0:n1] = mtime
+    for i, v in enumerate(vlist):
+        if v != 'z':
+            nc[v][:, :, n0:n1] = dat[..., i].swapaxes(1, 2)
+
+def _read_zprof_arrays(filename):
+    """Read time, variable names, and data (z, var) of a zprof file
+    """
 
-    return ds
+    with open(filename, 'r') as f:
+        h = f.readline()
+        time = float(h[h.rfind('t=') + 2:])
+        vlist = f.readline().strip().split(',')
+
+    dat = np.loadtxt(filename, delimiter=',', comments='#', skiprows=2,
+                     ndmin=2)
+
+    return time, vlist, dat
+
+def _zprof_phase_order(phase):
+    # whole first, then phase1, phase2, ..., phase10, ...
+    if phase.startswith('phase') and phase[5:].isdigit():
+        return (1, int(phase[5:]), phase)
+    elif phase == 'whole':
+        return (0, 0, phase)
+    else:
+        return (2, 0, phase)
 
 def read_zprof(filename, force_override=False, verbose=False):
     """
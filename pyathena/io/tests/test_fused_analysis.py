@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from pyathena.load_sim import LoadSim
+from pyathena.io.read_vtk import AthenaDataSet
+
+from test_read_vtk import write_vtk
+from test_read_vtk_h5 import athinput
+
+class Sim(LoadSim):
+
+    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.uses_fields(['density'])
+    def read_mean(self, num, savdir=None, force_override=False):
+        ds = self.load_vtk(num)
+        return dict(d=ds.get_field('density')['density'].values.mean())
+
+    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.uses_fields(lambda s, kwargs: kwargs['fields'])
+    def read_max(self, num, fields=['density', 'pressure'], savdir=None,
+                 force_override=False):
+        ds = self.load_vtk(num)
+        dat = ds.get_field(fields)
+        return dict([(f, dat[f].values.max()) for f in fields])
+
+@pytest.fixture
+def sim(tmp_path, monkeypatch):
+    basedir = tmp_path / 'sim'
+    (basedir / 'vtk').mkdir(parents=True)
+    (basedir / 'athinput.test').write_text(athinput)
+    rng = np.random.default_rng(0)
+    d = dict()
+    for num in (0, 1, 2):
+        d[num] = dict(density=rng.uniform(1.0, 2.0, (4, 4, 4)).astype('f4'),
+                      pressure=rng.uniform(1.0, 2.0, (4, 4, 4)).astype('f4'))
+        write_vtk(str(basedir / 'vtk' / 'prob.{0:04d}.vtk'.format(num)),
+                  d[num], time=0.1*num)
+
+    # Count reads from vtk files
+    calls = []
+    get_field = AthenaDataSet.get_field
+    def counted(ds, field='density', *args, **kwargs):
+        calls.append((ds.num, list(np.atleast_1d(field))))
+        return get_field(ds, field, *args, **kwargs)
+    monkeypatch.setattr(AthenaDataSet, 'get_field', counted)
+
+    return Sim(str(basedir), savdir=str(tmp_path / 'sav')), d, calls
+
+def test_fields_read_once(sim):
+    s, d, calls = sim
+    done = s.run_fused(['read_mean', ('read_max', dict(fields=['pressure']))],
+                       nums=[0, 1, 2])
+    assert done == dict([(num, ['read_mean', 'read_max']) for num in (0, 1, 2)])
+    assert calls == [(num, ['density', 'pressure']) for num in (0, 1, 2)]
+
+    # Results are in the cache of each analysis
+    calls[:] = []
+    for num in (0, 1, 2):
+        assert np.isclose(s.read_mean(num)['d'], d[num]['density'].mean())
+        assert s.read_max(num, fields=['pressure']) == \
+            dict(pressure=d[num]['pressure'].max())
+    assert calls == []
+    assert len(os.listdir(os.path.join(s.savdir, 'mean'))) == 3
+    assert len(os.listdir(os.path.join(s.savdir, 'max'))) == 3
+    assert s.run_fused(['read_mean', ('read_max', dict(fields=['pressure']))],
+                       nums=[0, 1, 2]) == dict()
+
+    # Only analyses that are not cached are run
+    done = s.run_fused(['read_mean', 'read_max'], nums=[0, 2])
+    assert done == {0: ['read_max'], 2: ['read_max']}
+    assert calls == [(0, ['density', 'pressure']), (2, ['density', 'pressure'])]
+    assert s.read_max(2) == dict(density=d[2]['density'].max(),
+                                 pressure=d[2]['pressure'].max())
+    assert len(calls) == 2
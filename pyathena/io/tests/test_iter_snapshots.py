@@ -0,0 +1,85 @@
+import time
+import threading
+
+import numpy as np
+import pytest
+
+from pyathena.load_sim import LoadSim
+
+from test_read_vtk import write_vtk
+from test_read_vtk_h5 import athinput
+
+NUMS = list(range(6))
+
+@pytest.fixture
+def sim(tmp_path, monkeypatch):
+    basedir = tmp_path / 'sim'
+    (basedir / 'vtk').mkdir(parents=True)
+    (basedir / 'athinput.test').write_text(athinput)
+    for num in NUMS:
+        write_vtk(str(basedir / 'vtk' / 'prob.{0:04d}.vtk'.format(num)),
+                  dict(density=np.full((4, 4, 4), num, dtype='f4')),
+                  time=0.1*num)
+    s = LoadSim(str(basedir), savdir=str(tmp_path / 'sav'))
+
+    # Record snapshots read by the background thread
+    loaded = []
+    _load_vtk = LoadSim._load_vtk
+    def load(self, num=None, **kwargs):
+        assert threading.current_thread() is not threading.main_thread()
+        if num == 99:
+            raise IOError('cannot read snapshot')
+        loaded.append(num)
+        return _load_vtk(self, num=num, **kwargs)
+    monkeypatch.setattr(LoadSim, '_load_vtk', load)
+
+    return s, loaded
+
+def wait_for(cond, timeout=5.0):
+    t0 = time.time()
+    while not cond() and time.time() - t0 < timeout:
+        time.sleep(0.005)
+
+def test_order(sim):
+    s, loaded = sim
+    nums = [3, 0, 5, 1]
+    res = [(num, ds.num, float(dat['density'].values.mean()))
+           for num, ds, dat in s.iter_snapshots(nums, fields='density')]
+    assert res == [(num, num, num) for num in nums]
+    assert loaded == nums
+    assert s.ds.num == 1
+
+    # DataSet objects only
+    for num, ds, dat in s.iter_snapshots(nums[:2]):
+        assert ds.num == num and dat is None
+
+@pytest.mark.parametrize('prefetch, max_bytes, nahead', [
+    (1, None, 1), (3, None, 3), (3, 1, 1), (3, 10**6, 3)])
+def test_prefetch(sim, prefetch, max_bytes, nahead):
+    s, loaded = sim
+    for i, (num, ds, dat) in enumerate(
+            s.iter_snapshots(NUMS, fields='density', prefetch=prefetch,
+                             max_bytes=max_bytes)):
+        # Next snapshots are read while the current one is processed, but
+        # not more than nahead
+        n = min(i + 1 + nahead, len(NUMS))
+        wait_for(lambda: len(loaded) >= n)
+        time.sleep(0.02)
+        assert len(loaded) == n
+        assert num == NUMS[i]
+
+def test_exception(sim):
+    s, loaded = sim
+    res = []
+    with pytest.raises(IOError, match='cannot read snapshot'):
+        for num, ds, dat in s.iter_snapshots([0, 1, 99, 2], fields='density'):
+            res.append(num)
+    assert res == [0, 1]
+
+    # Reading stops when the consumer stops
+    loaded[:] = []
+    it = s.iter_snapshots(NUMS, fields='density')
+    next(it)
+    it.close()
+    time.sleep(0.05)
+    assert loaded in ([0], [0, 1])
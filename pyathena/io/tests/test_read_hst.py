@@ -0,0 +1,64 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('h5py')
+
+from pyathena.io.read_hst import read_hst, _get_hst_var
+
+def write_header(f, nvar):
+    f.write('# Athena history dump for level=0 domain=0 volume=1.000000e+00\n')
+    names = ['time', 'dt'] + ['v{0:d}'.format(i) for i in range(nvar - 2)]
+    f.write('#  ' + '  '.join(['[{0:d}]={1:s}'.format(i + 1, n)
+                               for i, n in enumerate(names)]) + '\n')
+    f.write('#\n')
+
+def write_rows(f, t0, n, nvar, rng):
+    a = rng.uniform(0.0, 1.0, (n, nvar))
+    a[:, 0] = t0 + 0.01*np.arange(n)
+    np.savetxt(f, a, fmt='%14.6e')
+
+def read_hst_ref(fname):
+    return pd.read_csv(fname, names=_get_hst_var(fname), skiprows=3,
+                       comment='#', sep=r'\s+', engine='python')
+
+def test_append_across_partial_line(tmp_path):
+    fname = str(tmp_path / 'prob.hst')
+    nvar = 5
+    rng = np.random.default_rng(0)
+    with open(fname, 'w') as f:
+        write_header(f, nvar)
+        write_rows(f, 0.0, 10, nvar, rng)
+    pd.testing.assert_frame_equal(read_hst(fname), read_hst_ref(fname))
+
+    # Last line is being written
+    with open(fname, 'a') as f:
+        f.write('  1.000000e+00  2.000000e-02')
+    hst = read_hst(fname)
+    assert len(hst) == 11
+    assert hst['time'].iloc[-1] == 1.0 and np.isnan(hst['v0'].iloc[-1])
+
+    # Line completed, followed by a restart header and new rows
+    with open(fname, 'a') as f:
+        f.write('  3.0e-01  4.0e-01  5.0e-01\n')
+        write_header(f, nvar)
+        write_rows(f, 1.01, 5, nvar, rng)
+    hst = read_hst(fname)
+    pd.testing.assert_frame_equal(hst, read_hst_ref(fname))
+    assert hst['v2'].iloc[10] == 0.5
+
+    # Cache gives the same result
+    pd.testing.assert_frame_equal(read_hst(fname), hst)
+
+def test_rewritten_file(tmp_path):
+    fname = str(tmp_path / 'prob.hst')
+    rng = np.random.default_rng(1)
+    with open(fname, 'w') as f:
+        write_header(f, 4)
+        write_rows(f, 0.0, 20, 4, rng)
+    read_hst(fname)
+
+    with open(fname, 'w') as f:
+        write_header(f, 4)
+        write_rows(f, 0.0, 30, 4, rng)
+    pd.testing.assert_frame_equal(read_hst(fname), read_hst_ref(fname))
@@ -0,0 +1,122 @@
+import os
+import struct
+import filecmp
+
+import numpy as np
+import pytest
+
+from pyathena.io.read_rst import RestartHandler, write_allfile, _calculate_grid
+
+def make_rst(dirname, N=(16, 16, 16), NG=(2, 2, 2), nscal=1, seed=0):
+    """Write a multi-rank restart dump with random MHD data and a few cells
+    of negative internal energy. Returns the name of the rank 0 file and
+    the data.
+    """
+
+    os.makedirs(dirname, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    par = ('<comment>\nproblem = test\n<job>\nproblem_id = test\n'
+           '<time>\ntime = 1.5\n<domain1>\nlevel = 0\n'
+           'Nx1 = {0:d}\nx1min = -8.0\nx1max = 8.0\n'
+           'Nx2 = {1:d}\nx2min = -8.0\nx2max = 8.0\n'
+           'Nx3 = {2:d}\nx3min = -8.0\nx3max = 8.0\n'
+           'NGrid_x1 = {3:d}\nNGrid_x2 = {4:d}\nNGrid_x3 = {5:d}\n'
+           '<problem>\neps_extinct = 1.0e-02\n'
+           '<configure>\nstar particles = none\n<par_end>\n').format(*(N + NG))
+    tblk = b'N_STEP\n' + struct.pack('<i', 10) + \
+        b'\nTIME\n' + struct.pack('<d', 1.5) + \
+        b'\nTIME_STEP\n' + struct.pack('<d', 0.01) + b'\n'
+
+    sh = N[::-1]
+    d = dict()
+    d['DENSITY'] = 1.0 + rng.uniform(0.0, 1.0, sh)
+    for i in (1, 2, 3):
+        d['{0:d}-MOMENTUM'.format(i)] = 0.1*rng.standard_normal(sh)
+    B1 = 0.1*rng.standard_normal((sh[0], sh[1], sh[2] + 1))
+    B2 = 0.1*rng.standard_normal((sh[0], sh[1] + 1, sh[2]))
+    B3 = 0.1*rng.standard_normal((sh[0] + 1, sh[1], sh[2]))
+    eint = 1.0 + rng.uniform(0.0, 1.0, sh)
+    for k, j, i in [(7, 7, 7), (8, 3, 7), (0, 8, 15), (15, 0, 0)]:
+        eint[k, j, i] = -0.01
+    d['ENERGY'] = eint + 0.5*(d['1-MOMENTUM']**2 + d['2-MOMENTUM']**2 +
+                              d['3-MOMENTUM']**2)/d['DENSITY'] + \
+        0.5*(0.5*(B1[:, :, :-1] + B1[:, :, 1:]))**2 + \
+        0.5*(0.5*(B2[:, :-1, :] + B2[:, 1:, :]))**2 + \
+        0.5*(0.5*(B3[:-1, :, :] + B3[1:, :, :]))**2
+    d['POTENTIAL'] = rng.standard_normal(sh)
+    d['1-FIELD'] = B1
+    d['2-FIELD'] = B2
+    d['3-FIELD'] = B3
+    for i in range(nscal):
+        d['SCALAR {0:d}'.format(i)] = rng.uniform(0.0, 1.0, sh)
+
+    grids, _ = _calculate_grid(np.array(N), np.array(N)//np.array(NG))
+    f0 = write_allfile(dict(par=par.encode(), time=tblk), d, grids, [],
+                       dname=dirname, id='test', itime=0, scalar=nscal)
+
+    return f0, d
+
+def assert_same_files(dir1, dir2):
+    fnames = sorted(os.listdir(dir1))
+    assert len(fnames) > 0 and fnames == sorted(os.listdir(dir2))
+    for f in fnames:
+        assert filecmp.cmp(os.path.join(dir1, f), os.path.join(dir2, f),
+                           shallow=False), f
+
+def test_read(tmp_path):
+    f0, d = make_rst(str(tmp_path / 'src'))
+    data = RestartHandler(f0).read()
+    for k in d:
+        assert np.array_equal(data[k], d[k]), k
+
+@pytest.mark.parametrize('level, cut, ngrid, nprocs', [
+    (0, None, np.array([8, 16, 4]), 1),
+    (0, (-4.0, 4.0), None, 2),
+    (1, None, None, 1),
+    (1, (-6.0, 8.0), np.array([4, 4, 2]), 2),
+    (-1, None, None, 2),
+    (-1, (-4.0, 4.0), np.array([16, 8, 8]), 1),
+])
+def test_write_streaming(tmp_path, level, cut, ngrid, nprocs):
+    """Streaming writer gives files identical to the in-memory path"""
+
+    f0, _ = make_rst(str(tmp_path / 'src'))
+    out_mem = str(tmp_path / 'mem')
+    out_str = str(tmp_path / 'str')
+
+    rh = RestartHandler(f0)
+    rh.read()
+    if cut is not None:
+        rh.cut_z(*cut)
+    if level == 1:
+        rh.degrade()
+    elif level == -1:
+        rh.refine()
+    if ngrid is not None or cut is not None or level != 0:
+        rh.reset_grids(ngrid)
+    rh.write(outdir=out_mem, pid='new')
+
+    rh = RestartHandler(f0)
+    rh.write_streaming(outdir=out_str, pid='new', level=level,
+                       zmin=None if cut is None else cut[0],
+                       zmax=None if cut is None else cut[1],
+                       ngrid=ngrid, nprocs=nprocs)
+
+    assert_same_files(out_mem, out_str)
+
+def test_refine_degrade(tmp_path):
+    """Degrading a refined dump gives back the cell-centered data"""
+
+    f0, d = make_rst(str(tmp_path / 'src'), nscal=3)
+    rh = RestartHandler(f0)
+    rh.read()
+    rh.refine()
+    for i in range(3):
+        name = 'SCALAR {0:d}'.format(i)
+        assert rh.data_target[name].shape == (32, 32, 32)
+        assert np.array_equal(rh.data_target[name][1::2, ::2, 1::2], d[name])
+    rh.degrade()
+    for k in ['DENSITY', '1-MOMENTUM', 'POTENTIAL', 'SCALAR 0', 'SCALAR 2']:
+        assert np.array_equal(rh.data_target[k], d[k]), k
+    for k in ['1-FIELD', '2-FIELD', '3-FIELD']:
+        assert np.allclose(rh.data_target[k], d[k], rtol=0.0, atol=1e-15), k
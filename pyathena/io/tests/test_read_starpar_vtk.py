@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+import pytest
+
+h5py = pytest.importorskip('h5py')
+
+from pyathena.io.read_starpar_vtk import update_starpar_store, \
+    read_starpar_store, read_star_track
+
+def write_starpar_vtk(fname, time, ids, mass):
+    """Write a minimal starpar vtk file (positions and velocities are zero).
+    """
+
+    n = len(ids)
+    with open(fname, 'wb') as f:
+        f.write(b'# vtk DataFile Version 2.0\n')
+        f.write('STAR PARTICLES at time= {0:e} level= 0 domain= 0\n'.\
+                format(time).encode())
+        f.write(b'BINARY\nDATASET UNSTRUCTURED_GRID\n')
+        f.write('POINTS {0:d} float\n'.format(n).encode())
+        f.write(np.zeros(3*n, dtype='>f4').tobytes())
+        f.write('POINT_DATA {0:d}\n'.format(n).encode())
+        f.write(b'SCALARS star_particle_id int\nLOOKUP_TABLE default\n')
+        f.write(np.asarray(ids, dtype='>i4').tobytes())
+        f.write(b'SCALARS star_particle_mass float\nLOOKUP_TABLE default\n')
+        f.write(np.asarray(mass, dtype='>f4').tobytes())
+        f.write(b'VECTORS star_particle_position float\n')
+        f.write(np.zeros(3*n, dtype='>f4').tobytes())
+        f.write(b'VECTORS star_particle_velocity float\n')
+        f.write(np.zeros(3*n, dtype='>f4').tobytes())
+
+def starpar_files(dirname, nums):
+    return [os.path.join(str(dirname), 'prob.{0:04d}.starpar.vtk'.format(num))
+            for num in nums]
+
+def test_append_zero_stars(tmp_path):
+    fstore = str(tmp_path / 'starpar.h5')
+    fnames = starpar_files(tmp_path, range(4))
+    write_starpar_vtk(fnames[0], 0.0, [1, 2], [1.0, 2.0])
+    write_starpar_vtk(fnames[1], 0.1, [1, 2, 3], [1.0, 2.0, 3.0])
+    update_starpar_store(fnames[:2], fstore)
+
+    # Appended snapshots have no particles
+    write_starpar_vtk(fnames[2], 0.2, [], [])
+    write_starpar_vtk(fnames[3], 0.3, [], [])
+    update_starpar_store(fnames, fstore)
+
+    df = read_starpar_store(fstore)
+    assert len(df) == 5
+    assert list(df['num']) == [0, 0, 1, 1, 1]
+    with h5py.File(fstore, 'r') as f:
+        assert list(f['snapshot/num'][()]) == [0, 1, 2, 3]
+        assert list(f['snapshot/nstars'][()]) == [2, 3, 0, 0]
+
+def test_store_chunks_independent_of_first_write(tmp_path):
+    fstore = str(tmp_path / 'starpar.h5')
+    fnames = starpar_files(tmp_path, range(2))
+    write_starpar_vtk(fnames[0], 0.0, [1], [1.0])
+    update_starpar_store(fnames[:1], fstore)
+    write_starpar_vtk(fnames[1], 0.1, np.arange(1000), np.ones(1000))
+    update_starpar_store(fnames, fstore)
+
+    with h5py.File(fstore, 'r') as f:
+        assert f['mass'].chunks[0] > 1
+        assert f['mass'].shape == (1001,)
+
+def test_track_index_after_append(tmp_path):
+    fstore = str(tmp_path / 'starpar.h5')
+    fnames = starpar_files(tmp_path, range(3))
+    write_starpar_vtk(fnames[0], 0.0, [5], [1.0])
+    update_starpar_store(fnames[:1], fstore)
+    write_starpar_vtk(fnames[1], 0.1, [5, 7], [1.5, 2.0])
+    write_starpar_vtk(fnames[2], 0.2, [7], [2.5])
+    update_starpar_store(fnames, fstore)
+
+    df = read_star_track(fstore, [5, 7])
+    assert list(df['id']) == [5, 5, 7, 7]
+    assert list(df['num']) == [0, 1, 1, 2]
+    assert np.allclose(df['mass'], [1.0, 1.5, 2.0, 2.5])
+    with h5py.File(fstore, 'r') as f:
+        assert f['track/order'].chunks[0] > 1
@@ -0,0 +1,191 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyathena.io.read_vtk import AthenaDataSet
+
+def write_vtk(fname, fields, time=0.0, origin=None):
+    """Write a single-grid vtk snapshot with unit cell size (centered at the
+    origin by default).
+    """
+
+    Nx = np.array(next(iter(fields.values())).shape[:3][::-1])
+    if origin is None:
+        origin = -0.5*Nx
+    with open(fname, 'wb') as f:
+        f.write(b'# vtk DataFile Version 2.0\n')
+        f.write('PRIMITIVE vars at time= {0:e}, level= 0, domain= 0\n'.\
+                format(time).encode())
+        f.write(b'BINARY\nDATASET STRUCTURED_POINTS\n')
+        f.write('DIMENSIONS {0:d} {1:d} {2:d}\n'.format(*(Nx + 1)).encode())
+        f.write('ORIGIN {0:e} {1:e} {2:e}\n'.format(*origin).encode())
+        f.write(b'SPACING 1 1 1\n')
+        f.write('CELL_DATA {0:d}\n'.format(int(np.prod(Nx))).encode())
+        for name, arr in fields.items():
+            if arr.ndim == 4:
+                f.write('VECTORS {0:s} float\n'.format(name).encode())
+            else:
+                f.write('SCALARS {0:s} float\nLOOKUP_TABLE default\n'.\
+                        format(name).encode())
+            f.write(arr.astype('>f4').tobytes())
+            f.write(b'\n')
+
+def write_vtk_mpi(basedir, fields, ngrid, time=0.0):
+    """Write a vtk snapshot split into ngrid (x, y, z) grids, one per rank
+    (basedir/id0/prob.0000.vtk, basedir/id1/prob-id1.0000.vtk, ...).
+    Returns the name of the rank 0 file.
+    """
+
+    Nx = np.array(next(iter(fields.values())).shape[:3][::-1])
+    Nxg = Nx//np.array(ngrid)
+    rank = 0
+    for k in range(ngrid[2]):
+        for j in range(ngrid[1]):
+            for i in range(ngrid[0]):
+                il = np.array([i, j, k])*Nxg
+                slc = tuple([slice(l, l + n) for l, n in zip(il[::-1], Nxg[::-1])])
+                dirname = os.path.join(basedir, 'id{0:d}'.format(rank))
+                os.makedirs(dirname, exist_ok=True)
+                if rank == 0:
+                    fname = os.path.join(dirname, 'prob.0000.vtk')
+                else:
+                    fname = os.path.join(dirname,
+                                         'prob-id{0:d}.0000.vtk'.format(rank))
+                write_vtk(fname, dict([(k_, v[slc]) for k_, v in fields.items()]),
+                          time=time, origin=il - 0.5*Nx)
+                rank += 1
+
+    return os.path.join(basedir, 'id0', 'prob.0000.vtk')
+
+def get_fields(shape=(8, 12, 16), seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(density=rng.uniform(1.0, 2.0, shape).astype('f4'),
+                velocity=rng.standard_normal(shape + (3,)).astype('f4'))
+
+def test_cache_after_rewrite(tmp_path):
+    fvtk = str(tmp_path / 'prob.0000.vtk')
+    rng = np.random.default_rng(0)
+    d1 = rng.uniform(1.0, 2.0, (4, 4, 4))
+    d2 = rng.uniform(1.0, 2.0, (4, 4, 4))
+    write_vtk(fvtk, dict(density=d1))
+    os.utime(fvtk, ns=(10**18, 10**18))
+    ds = AthenaDataSet(fvtk, index_dir=str(tmp_path))
+    assert np.allclose(ds.get_field('density')['density'], d1)
+
+    # Same file name and size, new content
+    write_vtk(fvtk, dict(density=d2))
+    os.utime(fvtk, ns=(2*10**18, 2*10**18))
+    ds = AthenaDataSet(fvtk, index_dir=str(tmp_path))
+    assert np.allclose(ds.get_field('density')['density'], d2)
+
+def test_slice_shape(tmp_path):
+    fvtk = str(tmp_path / 'prob.0000.vtk')
+    d = np.random.default_rng(0).uniform(1.0, 2.0, (1, 4, 6)).astype('f4')
+    write_vtk(fvtk, dict(density=d))
+    dfi = dict(rho2=dict(field_dep=['density'],
+                         func=lambda dat, u: dat['density']**2))
+    ds = AthenaDataSet(fvtk, dfi=dfi, index_dir=str(tmp_path))
+
+    # Singleton z is kept for fields in the file and squeezed if derived
+    # fields are read (same as slicing the output of get_field)
+    slc = ds.get_slice('x', 'density', pos=0.5)
+    assert slc['density'].dims == ('z', 'y')
+    assert np.array_equal(slc['density'].values, d[:, :, 3])
+    slc = ds.get_slice('x', ['density', 'rho2'], pos=0.5)
+    assert slc['rho2'].dims == ('y',)
+    assert np.allclose(slc['rho2'].values, d[0, :, 3]**2)
+    assert float(slc['x']) == 0.5
+
+    with pytest.raises(ValueError):
+        ds.get_slice('x', 'density', method='linear')
+
+def test_index_location(tmp_path):
+    (tmp_path / 'data').mkdir()
+    fvtk = str(tmp_path / 'data' / 'prob.0000.vtk')
+    write_vtk(fvtk, dict(density=np.ones((4, 4, 4))))
+
+    # No index is written next to the data unless index_dir is given
+    AthenaDataSet(fvtk)
+    assert os.listdir(str(tmp_path / 'data')) == ['prob.0000.vtk']
+
+    ds = AthenaDataSet(fvtk, index_dir=str(tmp_path / 'index'))
+    assert os.listdir(str(tmp_path / 'index')) == ['prob.0000.vtk.idx']
+    ds = AthenaDataSet(fvtk, index_dir=str(tmp_path / 'index'))
+    assert np.all(ds.get_field('density')['density'] == 1.0)
+
+def test_lazy_multigrid(tmp_path):
+    pytest.importorskip('dask')
+    d = get_fields()
+    fvtk = write_vtk_mpi(str(tmp_path), d, (4, 3, 2))
+    ds = AthenaDataSet(fvtk)
+    assert len(ds.grid) == 24
+
+    dat = ds.get_field(['density', 'velocity'], lazy=True)
+    assert np.array_equal(dat['density'].compute().values, d['density'])
+    assert np.array_equal(dat['velocity2'].compute().values,
+                          d['velocity'][..., 1])
+    # Region not aligned with grids (extended to grid boundaries)
+    kwargs = dict(le=(-5.0, -3.0, -2.0), re=(3.0, 5.0, 3.0))
+    dat = ds.get_field('density', lazy=True, **kwargs).compute()
+    ref = ds.get_field('density', **kwargs)
+    assert np.array_equal(dat['density'].values, d['density'][:, :, :12])
+    assert dat.identical(ref)
+
+@pytest.fixture
+def mpi_vtk(tmp_path):
+    """Snapshot split into 4x3x2 grids of 4^3 cells (id0, id1, ...)"""
+    d = get_fields()
+    return write_vtk_mpi(str(tmp_path), d, (4, 3, 2)), d
+
+@pytest.mark.parametrize('nthreads', [1, 4])
+def test_multigrid_read(mpi_vtk, nthreads):
+    fvtk, d = mpi_vtk
+    ds = AthenaDataSet(fvtk, nthreads=nthreads)
+    assert len(ds.fnames) == 24
+    dat = ds.get_field(['density', 'velocity'])
+    assert np.array_equal(dat['density'].values, d['density'])
+    for i in range(3):
+        assert np.array_equal(dat['velocity{0:d}'.format(i + 1)].values,
+                              d['velocity'][..., i])
+
+    # Region covering 2x1x1 grids
+    le, re = (-3.5, -1.5, 0.5), (3.5, 1.5, 3.5)
+    ds.set_region(le=le, re=re)
+    assert len(ds.region['gidx']) == 2
+    assert list(ds.region['Nxr']) == [8, 4, 4]
+    dat = ds.get_field('density', le=le, re=re)
+    assert np.array_equal(dat['density'].values, d['density'][4:8, 4:8, 4:12])
+    assert np.array_equal(dat['x'].values, np.arange(-3.5, 4.0))
+
+    # Same result with serial read
+    ref = AthenaDataSet(fvtk).get_field('density', le=le, re=re)
+    assert dat.identical(ref)
+
+@pytest.mark.parametrize('nthreads', [1, 4])
+def test_multigrid_slice(mpi_vtk, nthreads):
+    fvtk, d = mpi_vtk
+    ds = AthenaDataSet(fvtk, nthreads=nthreads)
+    slc = ds.get_slice('x', 'density', pos=0.3)
+    assert np.array_equal(slc['density'].values, d['density'][:, :, 8])
+    slc = ds.get_slice('y', 'density', pos=-2.2)
+    assert np.array_equal(slc['density'].values, d['density'][:, 3, :])
+    slc = ds.get_slice('z', ['density', 'velocity'], pos=1.9)
+    assert np.array_equal(slc['density'].values, d['density'][5])
+    assert np.array_equal(slc['velocity3'].values, d['velocity'][5, ..., 2])
+
+    # Multiple planes in different grids
+    slc = ds.get_slice('z', 'density', pos=[-3.5, 0.5, 3.5])
+    assert slc['density'].dims == ('z', 'y', 'x')
+    assert np.array_equal(slc['density'].values, d['density'][[0, 4, 7]])
+
+def test_multigrid_blockwise(mpi_vtk):
+    fvtk, d = mpi_vtk
+    dfi = dict(rho2=dict(field_dep=['density'],
+                         func=lambda dat, u: dat['density']**2))
+    ds = AthenaDataSet(fvtk, dfi=dfi)
+    for kwargs in (dict(), dict(le=(-5.0, -3.0, -2.0), re=(3.0, 5.0, 3.0))):
+        dat = ds.get_field(['density', 'rho2'], blockwise=True, **kwargs)
+        ref = ds.get_field(['density', 'rho2'], **kwargs)
+        assert dat.identical(ref)
+    assert np.allclose(dat['rho2'].values, d['density'][:, :, :12]**2)
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from pyathena.load_sim import LoadSim
+
+from test_read_vtk import write_vtk
+
+athinput = """<comment>
+problem = test
+<job>
+problem_id = prob
+maxout = 1
+<output1>
+out_fmt = vtk
+out = prim
+dt = 0.1
+<domain1>
+Nx1 = 4
+x1min = -2
+x1max = 2
+Nx2 = 4
+x2min = -2
+x2max = 2
+Nx3 = 4
+x3min = -2
+x3max = 2
+<configure>
+gas = hydro
+cooling = OFF
+new_cooling = OFF
+config_date = 2020-01-01
+<problem>
+gamma = 1.6667
+<par_end>
+"""
+
+@pytest.fixture
+def sim(tmp_path):
+    basedir = tmp_path / 'sim'
+    (basedir / 'vtk').mkdir(parents=True)
+    (basedir / 'athinput.test').write_text(athinput)
+    rng = np.random.default_rng(0)
+    for num in (0, 12345):
+        write_vtk(str(basedir / 'vtk' / 'prob.{0:04d}.vtk'.format(num)),
+                  dict(density=rng.uniform(1.0, 2.0, (4, 4, 4)),
+                       pressure=rng.uniform(1.0, 2.0, (4, 4, 4))),
+                  time=0.1*num)
+
+    return LoadSim(str(basedir), savdir=str(tmp_path / 'sav'))
+
+def test_partial_store_not_used(sim):
+    d = sim.load_vtk(0).get_field(['density', 'pressure'])
+    fh5 = sim.convert_vtk_h5(0, fields=['density'])
+    assert os.path.basename(fh5) == 'prob.0000.h5'
+
+    # Store has density only; pressure must still be readable
+    ds = sim.load_vtk(0)
+    assert ds.ext != 'h5'
+    dd = ds.get_field(['density', 'pressure'])
+    assert np.array_equal(dd['pressure'], d['pressure'])
+
+    # Converting all fields replaces the partial store, which is then used
+    assert sim.convert_vtk_h5(0) == fh5
+    ds = sim.load_vtk(0)
+    assert ds.ext == 'h5' and ds.complete
+    dd = ds.get_field(['density', 'pressure'])
+    assert np.array_equal(dd['pressure'], d['pressure'])
+    ds.close()
+
+def test_store_name_uses_num(sim):
+    fh5 = sim.convert_vtk_h5(12345)
+    assert os.path.basename(fh5) == 'prob.12345.h5'
+    with sim.load_vtk(12345) as ds:
+        assert ds.ext == 'h5' and ds.num == 12345
@@ -0,0 +1,69 @@
+import os
+import tarfile
+
+import numpy as np
+import pytest
+
+from pyathena.io import read_vtk_tar
+from pyathena.io.read_vtk_tar import AthenaDataSetTar
+
+from test_read_vtk import write_vtk_mpi, get_fields
+
+def write_tar(dirname, d, mtime_ns):
+    """Write a snapshot split into 2x3x2 grids and tar it the way athena
+    does (dirname/vtk/prob.0000.tar with members 0000/prob[-idN].0000.vtk).
+    """
+
+    write_vtk_mpi(os.path.join(dirname, 'src'), d, (2, 3, 2))
+    os.makedirs(os.path.join(dirname, 'vtk'), exist_ok=True)
+    ftar = os.path.join(dirname, 'vtk', 'prob.0000.tar')
+    with tarfile.open(ftar, 'w') as tf:
+        tf.add(os.path.join(dirname, 'src', 'id0'), arcname='0000',
+               recursive=False)
+        for rank in range(12):
+            fname = 'prob.0000.vtk' if rank == 0 else \
+                'prob-id{0:d}.0000.vtk'.format(rank)
+            tf.add(os.path.join(dirname, 'src', 'id{0:d}'.format(rank), fname),
+                   arcname='0000/' + fname)
+    os.utime(ftar, ns=(mtime_ns, mtime_ns))
+
+    return ftar
+
+def assert_same_data(ds, d):
+    dat = ds.get_field(['density', 'velocity'])
+    assert np.array_equal(dat['density'].values, d['density'])
+    assert np.array_equal(dat['velocity2'].values, d['velocity'][..., 1])
+
+def test_index(tmp_path, monkeypatch):
+    d = get_fields()
+    ftar = write_tar(str(tmp_path), d, 10**18)
+    index_dir = str(tmp_path / 'index')
+    ds = AthenaDataSetTar(ftar, index_dir=index_dir)
+    assert os.listdir(index_dir) == ['prob.0000.tar.idx']
+    assert len(ds.grid) == 12 and ds.mpi_mode
+    assert_same_data(ds, d)
+
+    # Tar file is not scanned when the index is read
+    def fail(*args, **kwargs):
+        raise AssertionError('tar file scanned')
+    with monkeypatch.context() as m:
+        m.setattr(read_vtk_tar.tarfile, 'open', fail)
+        ds_idx = AthenaDataSetTar(ftar, index_dir=index_dir)
+    assert ds_idx.fnames == ds.fnames
+    assert ds_idx.domain.keys() == ds.domain.keys()
+    for k in ('le', 're', 'dx', 'Nx'):
+        assert np.array_equal(ds_idx.domain[k], ds.domain[k])
+    assert_same_data(ds_idx, d)
+
+    # Rewritten tar file (same size) is scanned again
+    d2 = get_fields(seed=1)
+    write_tar(str(tmp_path), d2, 2*10**18)
+    with monkeypatch.context() as m:
+        m.setattr(read_vtk_tar.tarfile, 'open', fail)
+        with pytest.raises(AssertionError):
+            AthenaDataSetTar(ftar, index_dir=index_dir)
+    ds = AthenaDataSetTar(ftar, index_dir=index_dir)
+    assert_same_data(ds, d2)
+    with monkeypatch.context() as m:
+        m.setattr(read_vtk_tar.tarfile, 'open', fail)
+        assert_same_data(AthenaDataSetTar(ftar, index_dir=index_dir), d2)
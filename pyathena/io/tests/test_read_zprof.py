@@ -0,0 +1,67 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('netCDF4')
+
+from pyathena.io.read_zprof import read_zprof_all
+
+PHASES = ['whole', 'phase1', 'phase2']
+NAMES = ['A', 'd', 'P']
+
+def write_zprof(dirname, num, seed=0, nz=8, phases=PHASES):
+    """Write zprof files of all phases of a snapshot. Returns data of each
+    phase (z, vars).
+    """
+
+    rng = np.random.default_rng(seed + num)
+    dat = dict()
+    for ph in phases:
+        a = rng.uniform(0.0, 1.0, (nz, len(NAMES) + 1))
+        a[:, 0] = np.linspace(-1.0, 1.0, nz)
+        fname = os.path.join(dirname, 'prob.{0:04d}.{1:s}.zprof'.format(num, ph))
+        with open(fname, 'w') as f:
+            f.write('# Athena vertical profile at t={0:e}\n'.format(0.5*num))
+            f.write(','.join(['z'] + NAMES) + '\n')
+            np.savetxt(f, a, fmt='%.17e', delimiter=',')
+        dat[ph] = a
+
+    return dat
+
+def assert_zprof_equal(ds, dat, nums, phase):
+    assert list(ds['time'].values) == [0.5*num for num in nums]
+    for i, num in enumerate(nums):
+        a = dat[num][phase]
+        assert np.array_equal(ds['z'].values, a[:, 0])
+        for j, v in enumerate(NAMES):
+            assert np.array_equal(ds[v].values[:, i], a[:, j + 1])
+
+def test_incremental_update(tmp_path):
+    dirname = str(tmp_path / 'zprof')
+    savdir = str(tmp_path / 'sav')
+    os.makedirs(dirname)
+    os.makedirs(savdir)
+    dat = dict([(num, write_zprof(dirname, num)) for num in range(3)])
+    ds = read_zprof_all(dirname, 'prob', phase='phase1', savdir=savdir)
+    assert_zprof_equal(ds, dat, [0, 1, 2], 'phase1')
+
+    # Appended snapshots (parsed in parallel); num 4 is incomplete and
+    # skipped until all phases exist
+    dat[3] = write_zprof(dirname, 3)
+    write_zprof(dirname, 4, phases=PHASES[:2])
+    ds = read_zprof_all(dirname, 'prob', phase='whole', savdir=savdir,
+                        nprocs=2)
+    assert_zprof_equal(ds, dat, [0, 1, 2, 3], 'whole')
+
+    dat[4] = write_zprof(dirname, 4)
+    ds = read_zprof_all(dirname, 'prob', phase='phase2', savdir=savdir)
+    assert_zprof_equal(ds, dat, [0, 1, 2, 3, 4], 'phase2')
+
+    # Snapshot rewritten in place
+    dat[1] = write_zprof(dirname, 1, seed=10)
+    fname = os.path.join(dirname, 'prob.0001.whole.zprof')
+    st = os.stat(fname)
+    os.utime(fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    ds = read_zprof_all(dirname, 'prob', phase='whole', savdir=savdir)
+    assert_zprof_equal(ds, dat, [0, 1, 2, 3, 4], 'whole')
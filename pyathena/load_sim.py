@@ -2,7 +2,7 @@ from __future__ import print_function
 
 import os
 import sys
-import glob, re
+import re
 import getpass
 import warnings
 import logging
@@ -11,20 +11,25 @@ import functools
 import numpy as np
 import pandas as pd
 import xarray as xr
-import pickle
-import yt
 import tarfile
 import shutil
+import threading
+import queue
 
-from .classic.vtk_reader import AthenaDataSet as AthenaDataSetClassic
 from .io.read_vtk import AthenaDataSet
 from .io.read_vtk_tar import AthenaDataSetTar
+from .io.read_vtk_h5 import AthenaDataSetH5, vtk_to_h5
 from .io.read_rst import read_rst
-from .io.read_starpar_vtk import read_starpar_vtk
+from .io.read_starpar_vtk import read_starpar_vtk, update_starpar_store, \
+    read_starpar_store, read_star_track, read_star_index
 from .io.read_zprof import read_zprof_all
 from .io.read_athinput import read_athinput
 from .util.units import Units
-from .fields.fields import DerivedFields
+from .util.manifest import get_manifest
+from .util.analysis_cache import cached_analysis, cache_key
+from .util.fused_analysis import uses_fields, get_fields, FusedDataSet
+from .util.task_scheduler import run_tasks
+from .util.map_reduce import map_reduce, map_reduce_incremental
 from .plt_tools.make_movie import make_movie
 
 class LoadSim(object):
@@ -108,6 +113,7 @@ class LoadSim(object):
         self.basename = osp.basename(self.basedir)
 
         self.load_method = load_method
+        self.nthreads = 1
         self.logger = self._get_logger(verbose=verbose)
 
         if savdir is None:
@@ -150,9 +156,11 @@ class LoadSim(object):
                 self.u = units
                 pass
 
+        from .fields.fields import DerivedFields
         self.dfi = DerivedFields(self.par).dfi
 
-    def load_vtk(self, num=None, ivtk=None, id0=True, load_method=None):
+    def load_vtk(self, num=None, ivtk=None, id0=True, load_method=None,
+                 nthreads=None):
         """Function to read Athena vtk file using pythena or yt and
         return DataSet object.
 
@@ -166,6 +174,13 @@ class LoadSim(object):
            Read vtk file in /basedir/id0. Default value is True.
         load_method : str
            'pyathena', 'pyathena_classic' or 'yt'
+        nthreads : int
+           Number of threads used by pyathena to read grids of a (multi-rank)
+           vtk snapshot concurrently. Overrides self.nthreads (default 1).
+
+        If load_method is 'pyathena' and a HDF5 store created by convert_vtk_h5
+        exists, is newer than the vtk file, and has all fields, the store is
+        read instead.
 
         Returns
         -------
@@ -179,75 +194,531 @@ class LoadSim(object):
         if load_method is not None:
             self.load_method = load_method
 
-        if not self.files['vtk_id0']:
-            id0 = False
-            
-        if id0:
-            kind = ['vtk_id0', 'vtk', 'vtk_tar']
-        else:
-            if self.files['vtk']:
-                kind = ['vtk', 'vtk_tar', 'vtk_id0']
-            else:
-                kind = ['vtk_tar', 'vtk', 'vtk_id0']
+        # Override nthreads
+        if nthreads is not None:
+            self.nthreads = nthreads
 
-        self.fvtk = self._get_fvtk(kind[0], num, ivtk)
-        if self.fvtk is None or not osp.exists(self.fvtk):
-            if id0:
-                self.logger.info('[load_vtk]: Vtk file does not exist. ' + \
-                                 'Try joined/tarred vtk')
-            else:
-                self.logger.info('[load_vtk]: Vtk file does not exist. ' + \
-                                 'Try vtk in id0')
+        # Snapshot being processed by run_fused
+        fused = getattr(self, '_fused', None)
+        if fused is not None and fused[0] == num and ivtk is None and \
+           self.load_method == 'pyathena':
+            self.ds = fused[1]
+            self.domain = self.ds.domain
+            return self.ds
 
-            # Check if joined vtk (or vtk in id0) exists
-            self.fvtk = self._get_fvtk(kind[1], num, ivtk)
-            if self.fvtk is None or not osp.exists(self.fvtk):
-                self.logger.info('[load_vtk]: Vtk file does not exist.')
+        self.fvtk, ds = self._load_vtk(num, ivtk, id0)
+        if ds is not None:
+            self.ds = ds
+            if self.load_method != 'yt':
+                self.domain = ds.domain
 
-            # Check if joined vtk (or vtk in id0) exists
-            self.fvtk = self._get_fvtk(kind[2], num, ivtk)
-            if self.fvtk is None or not osp.exists(self.fvtk):
-                self.logger.error('[load_vtk]: Vtk file does not exist.')
+        return self.ds
+
+    def _load_vtk(self, num=None, ivtk=None, id0=True):
+        """Find vtk file and create DataSet object without modifying
+        attributes (fvtk, ds, domain). Returns (fvtk, ds).
+        """
 
-        if self.fvtk.endswith('vtk'):
+        ds = None
+        fvtk = self._find_fvtk(num, ivtk, id0)
+
+        # Use converted HDF5 store if it is up to date and complete
+        if self.load_method == 'pyathena' and fvtk is not None:
+            fh5 = self._get_fvtk_h5(fvtk)
+            if osp.exists(fh5) and (not osp.exists(fvtk) or \
+                                    osp.getmtime(fh5) >= osp.getmtime(fvtk)):
+                try:
+                    ds = AthenaDataSetH5(fh5, units=self.u, dfi=self.dfi,
+                                         nthreads=self.nthreads)
+                except (IOError, OSError) as e:
+                    self.logger.warning('[load_vtk_h5]: Could not read ' + \
+                                        '{0:s}: {1:s}'.format(fh5, str(e)))
+                if ds is not None and not ds.complete and osp.exists(fvtk):
+                    self.logger.info('[load_vtk_h5]: {0:s} '.format(fh5) + \
+                                     'does not have all fields. Read vtk.')
+                    ds.close()
+                    ds = None
+                if ds is not None:
+                    self.logger.info('[load_vtk_h5]: {0:s}. Time: {1:f}'.format(\
+                        osp.basename(fh5), ds.domain['time']))
+                    return fvtk, ds
+
+        if fvtk.endswith('vtk'):
             if self.load_method == 'pyathena':
-                self.ds = AthenaDataSet(self.fvtk, units=self.u, dfi=self.dfi)
-                self.domain = self.ds.domain
+                ds = AthenaDataSet(fvtk, units=self.u, dfi=self.dfi,
+                                   nthreads=self.nthreads,
+                                   index_dir=osp.join(self.savdir, 'vtk_index'))
                 self.logger.info('[load_vtk]: {0:s}. Time: {1:f}'.format(\
-                    osp.basename(self.fvtk), self.ds.domain['time']))
+                    osp.basename(fvtk), ds.domain['time']))
 
             elif self.load_method == 'pyathena_classic':
-                self.ds = AthenaDataSetClassic(self.fvtk)
-                self.domain = self.ds.domain
+                from .classic.vtk_reader import AthenaDataSet as AthenaDataSetClassic
+                ds = AthenaDataSetClassic(fvtk)
                 self.logger.info('[load_vtk]: {0:s}. Time: {1:f}'.format(\
-                    osp.basename(self.fvtk), self.ds.domain['time']))
+                    osp.basename(fvtk), ds.domain['time']))
 
             elif self.load_method == 'yt':
                 if hasattr(self, 'u'):
                     units_override = self.u.units_override
                 else:
                     units_override = None
-                self.ds = yt.load(self.fvtk, units_override=units_override)
+                import yt
+                ds = yt.load(fvtk, units_override=units_override)
             else:
                 self.logger.error('load_method "{0:s}" not recognized.'.format(
                     self.load_method) + ' Use either "yt", "pyathena", "pyathena_classic".')
-        elif self.fvtk.endswith('tar'):
+        elif fvtk.endswith('tar'):
             if self.load_method == 'pyathena':
-                self.ds = AthenaDataSetTar(self.fvtk, units=self.u, dfi=self.dfi)
-                self.domain = self.ds.domain
+                ds = AthenaDataSetTar(fvtk, units=self.u, dfi=self.dfi,
+                                      nthreads=self.nthreads,
+                                      index_dir=osp.join(self.savdir, 'vtk_index'))
                 self.logger.info('[load_vtk_tar]: {0:s}. Time: {1:f}'.format(\
-                    osp.basename(self.fvtk), self.ds.domain['time']))
+                    osp.basename(fvtk), ds.domain['time']))
             elif self.load_method == 'yt':
                 if hasattr(self, 'u'):
                     units_override = self.u.units_override
                 else:
                     units_override = None
-                self.ds = yt.load(self.fvtk, units_override=units_override)
+                import yt
+                ds = yt.load(fvtk, units_override=units_override)
             else:
                 self.logger.error('load_method "{0:s}" not recognized.'.format(
                     self.load_method) + ' Use either "yt" or "pyathena".')
 
-        return self.ds
+        return fvtk, ds
+
+    def _find_fvtk(self, num=None, ivtk=None, id0=True):
+        """Find vtk file (in id0, joined, or tarred) of a snapshot.
+        """
+
+        if not self.files['vtk_id0']:
+            id0 = False
+
+        if id0:
+            kind = ['vtk_id0', 'vtk', 'vtk_tar']
+        else:
+            if self.files['vtk']:
+                kind = ['vtk', 'vtk_tar', 'vtk_id0']
+            else:
+                kind = ['vtk_tar', 'vtk', 'vtk_id0']
+
+        fvtk = self._get_fvtk(kind[0], num, ivtk)
+        if fvtk is None or not osp.exists(fvtk):
+            if id0:
+                self.logger.info('[load_vtk]: Vtk file does not exist. ' + \
+                                 'Try joined/tarred vtk')
+            else:
+                self.logger.info('[load_vtk]: Vtk file does not exist. ' + \
+                                 'Try vtk in id0')
+
+            # Check if joined vtk (or vtk in id0) exists
+            fvtk = self._get_fvtk(kind[1], num, ivtk)
+            if fvtk is None or not osp.exists(fvtk):
+                self.logger.info('[load_vtk]: Vtk file does not exist.')
+
+            # Check if joined vtk (or vtk in id0) exists
+            fvtk = self._get_fvtk(kind[2], num, ivtk)
+            if fvtk is None or not osp.exists(fvtk):
+                self.logger.error('[load_vtk]: Vtk file does not exist.')
+
+        return fvtk
+
+    def convert_vtk_h5(self, num=None, ivtk=None, fields=None, id0=True,
+                       force_override=False, **kwargs):
+        """Convert vtk snapshot to a chunked, compressed HDF5 store, which is
+        used by load_vtk thereafter.
+
+        Parameters
+        ----------
+        num : int
+           Snapshot number
+        ivtk : int
+           Read i-th file in the vtk file list. Overrides num if both are given.
+        fields : list of str
+           Fields to convert. Default is all fields. A store with a subset of
+           fields is not used by load_vtk (unless the vtk file is removed)
+           but can be read with pyathena.io.read_vtk_h5.AthenaDataSetH5.
+        id0 : bool
+           Convert vtk files in /basedir/id0 (if exist). Default value is True.
+        force_override : bool
+           Convert even if the store is up to date and has the requested
+           fields. Default value is False.
+        kwargs : dict
+           Keyword arguments passed to vtk_to_h5 (e.g., compression).
+
+        Returns
+        -------
+        fh5 : str
+           Name of the HDF5 file (savdir/vtk_h5/problem_id.xxxx.h5)
+        """
+
+        if num is None and ivtk is None:
+            raise ValueError('Specify either num or ivtk')
+
+        fvtk = self._find_fvtk(num, ivtk, id0)
+        fh5 = self._get_fvtk_h5(fvtk)
+        if not force_override and osp.exists(fh5) and \
+           osp.getmtime(fh5) >= osp.getmtime(fvtk):
+            try:
+                with AthenaDataSetH5(fh5) as ds:
+                    if fields is None:
+                        uptodate = ds.complete
+                    else:
+                        uptodate = set(fields) <= set(ds.field_list)
+            except (IOError, OSError):
+                uptodate = False
+            if uptodate:
+                self.logger.info('[convert_vtk_h5]: {0:s} is up to date.'.format(fh5))
+                return fh5
+
+        if fvtk.endswith('tar'):
+            ds = AthenaDataSetTar(fvtk, units=self.u, dfi=self.dfi,
+                                  nthreads=self.nthreads,
+                                  index_dir=osp.join(self.savdir, 'vtk_index'))
+        else:
+            ds = AthenaDataSet(fvtk, units=self.u, dfi=self.dfi,
+                               nthreads=self.nthreads,
+                               index_dir=osp.join(self.savdir, 'vtk_index'))
+
+        vtk_to_h5(ds, fh5, fields=fields, **kwargs)
+        self.logger.info('[convert_vtk_h5]: {0:s} -> {1:s}'.format(
+            osp.basename(fvtk), fh5))
+
+        return fh5
+
+    def _get_fvtk_h5(self, fvtk):
+        """Get path of HDF5 store converted from vtk (or tar) file fvtk
+        """
+
+        num = int(re.search(r'\.(\d+)\.(vtk|tar)$', fvtk).group(1))
+
+        return osp.join(self.savdir, 'vtk_h5',
+                        '{0:s}.{1:04d}.h5'.format(self.problem_id, num))
+
+    def iter_snapshots(self, nums=None, fields=None, prefetch=1,
+                       max_bytes=None, **kwargs):
+        """Iterate over vtk snapshots while a background thread reads the next
+        snapshots, so that reading overlaps with computation.
+
+        Parameters
+        ----------
+        nums : list of int
+           Snapshot numbers. Default value is self.nums.
+        fields : (list of) str
+           Fields to be read by ds.get_field (including derived fields).
+           If None, only DataSet objects are created and data is None.
+        prefetch : int
+           Maximum number of snapshots read ahead (>= 1). Default value is 1.
+        max_bytes : int
+           Do not read ahead when prefetched data already use more than
+           max_bytes bytes. Default value is None (limited only by prefetch).
+        kwargs : dict
+           Keyword arguments passed to ds.get_field (e.g., le, re).
+
+        Yields
+        ------
+        (num, ds, data) : tuple
+           Snapshot number, DataSet object, and output of ds.get_field.
+
+        Examples
+        --------
+        >>> for num, ds, dd in s.iter_snapshots(s.nums, ['nH', 'T'], prefetch=2):
+        ...     H, xe, ye = np.histogram2d(dd['nH'].data.flatten(),
+        ...                                dd['T'].data.flatten())
+        """
+
+        if nums is None:
+            nums = self.nums
+
+        nums = list(nums)
+        prefetch = max(1, prefetch)
+        q = queue.Queue()
+        cond = threading.Condition()
+        state = dict(npending=0, nbytes=0, stop=False)
+
+        def _can_read():
+            return state['stop'] or state['npending'] == 0 or \
+                (state['npending'] < prefetch and \
+                 (max_bytes is None or state['nbytes'] < max_bytes))
+
+        def _worker():
+            for num in nums:
+                with cond:
+                    cond.wait_for(_can_read)
+                    if state['stop']:
+                        return
+                try:
+                    _, ds = self._load_vtk(num=num)
+                    if fields is not None:
+                        data = ds.get_field(fields, **kwargs)
+                    else:
+                        data = None
+                    item = (num, ds, data, _nbytes(data), None)
+                except Exception as e:
+                    item = (num, None, None, 0, e)
+
+                with cond:
+                    state['npending'] += 1
+                    state['nbytes'] += item[3]
+                q.put(item)
+
+        t = threading.Thread(target=_worker, daemon=True)
+        t.start()
+        try:
+            for _ in nums:
+                num, ds, data, nbytes, err = q.get()
+                with cond:
+                    state['npending'] -= 1
+                    state['nbytes'] -= nbytes
+                    cond.notify_all()
+                if err is not None:
+                    raise err
+
+                self.ds = ds
+                self.domain = ds.domain
+                yield num, ds, data
+        finally:
+            with cond:
+                state['stop'] = True
+                cond.notify_all()
+
+    def run_fused(self, analyses, nums=None, prefetch=1, force_override=False):
+        """Run several analysis methods on each snapshot, reading the union of
+        their fields only once.
+
+        Analyses declare fields they read with ds.get_field using
+        LoadSim.Decorators.uses_fields. For each snapshot, analyses whose
+        results are already cached (see LoadSim.Decorators.check_pickle) are
+        skipped. Fields of the remaining analyses are read with a single
+        get_field call (snapshots are read ahead by iter_snapshots), and
+        load_vtk(num) in the analyses returns a FusedDataSet that serves
+        get_field from the data already read. Results are saved to the cache
+        of each analysis as usual and are not returned.
+
+        Parameters
+        ----------
+        analyses : list of str or (str, dict)
+           Names of analysis methods taking snapshot number as the first
+           argument (e.g., 'read_prj'), optionally with keyword arguments
+           (e.g., ('read_prj', dict(savdir=savdir_pkl))).
+        nums : list of int
+           Snapshot numbers. Default value is self.nums.
+        prefetch : int
+           Maximum number of snapshots read ahead. Default value is 1.
+        force_override : bool
+           Flag to run all analyses even if results are cached.
+
+        Returns
+        -------
+        done : dict
+           Names of analyses that were run for each snapshot number.
+
+        Examples
+        --------
+        >>> s.run_fused(['read_slc', 'read_prj', 'read_pdf2d'], nums=s.nums)
+        """
+
+        if nums is None:
+            nums = self.nums
+
+        analyses = [(a, dict()) if isinstance(a, str) else (a[0], dict(a[1]))
+                    for a in analyses]
+
+        todo = dict()
+        fields = []
+        for num in nums:
+            for name, kwargs in analyses:
+                func = getattr(self, name)
+                if not force_override and hasattr(func, 'is_cached') and \
+                   func.is_cached(self, num, **kwargs):
+                    continue
+                todo.setdefault(num, []).append((name, kwargs))
+                for f in get_fields(self, func, num, kwargs):
+                    if f not in fields:
+                        fields.append(f)
+
+        if not todo:
+            return dict()
+
+        self.logger.info('[run_fused]: nums: {0:s} fields: {1:s}'.format(
+            ' '.join([str(num) for num in todo]), ' '.join(fields)))
+
+        done = dict()
+        for num, ds, data in self.iter_snapshots(list(todo), fields=fields or None,
+                                                 prefetch=prefetch):
+            self._fused = (num, FusedDataSet(ds, data))
+            try:
+                for name, kwargs in todo[num]:
+                    if force_override:
+                        kwargs = dict(kwargs, force_override=True)
+                    getattr(self, name)(num, **kwargs)
+            finally:
+                # Do not keep preloaded data
+                self._fused = None
+                self.ds = ds
+            done[num] = [name for name, _ in todo[num]]
+
+        return done
+
+    def run_tasks(self, method, nums=None, nretry=1, comm=None, nprocs=1,
+                  force_override=False, return_results=False, verbose=True,
+                  **kwargs):
+        """Run a method for snapshots handed out dynamically to MPI ranks (or
+        processes). See pyathena.util.task_scheduler.run_tasks.
+
+        Snapshots whose results are already cached are skipped if the method
+        is decorated with LoadSim.Decorators.check_pickle.
+
+        Parameters
+        ----------
+        method : str or function
+           Name of method (e.g., 'read_prj') or function called as
+           method(self, num, **kwargs).
+        nums : list of int
+           Snapshot numbers. Default value is self.nums.
+        nretry : int
+           Number of times a failed snapshot is retried. Default value is 1.
+        comm : MPI communicator
+           If None, MPI.COMM_WORLD is used if mpi4py.MPI has been imported.
+        nprocs : int
+           Number of processes used when not running with MPI.
+        force_override : bool
+           Passed to the method (if True) and do not skip cached snapshots.
+        return_results : bool
+           Include return values of method in records.
+        verbose : bool
+           Print summary of tasks (number, time, failures) on rank 0.
+        kwargs : dict
+           Keyword arguments passed to the method.
+
+        Returns
+        -------
+        records : list of dict
+           Status and time of each snapshot.
+
+        Examples
+        --------
+        >>> from mpi4py import MPI
+        >>> s.run_tasks('plt_snapshot', s.nums[::-1], comm=MPI.COMM_WORLD,
+        ...             savefig=True)
+        """
+
+        if nums is None:
+            nums = self.nums
+
+        if isinstance(method, str):
+            func = getattr(self, method)
+        else:
+            func = functools.partial(method, self)
+
+        if force_override:
+            kwargs['force_override'] = True
+
+        skip = None
+        if not force_override and hasattr(func, 'is_cached'):
+            skip = lambda num: func.is_cached(self, num, **kwargs)
+
+        return run_tasks(lambda num: func(num, **kwargs), nums, skip=skip,
+                         nretry=nretry, comm=comm, nprocs=nprocs,
+                         return_results=return_results, verbose=verbose)
+
+    def map(self, method, nums=None, reduce=None, backend='process',
+            nworkers=1, comm=None, incremental=False, verbose=False,
+            **kwargs):
+        """Run a per-snapshot method in parallel and return results (or
+        reduction of results) in the order of nums.
+        See pyathena.util.map_reduce.map_reduce.
+
+        Snapshots whose results are cached (method decorated with
+        LoadSim.Decorators.check_pickle) are read in the calling process, and
+        only the others are sent to workers. Workers save results to the cache
+        as usual.
+
+        Parameters
+        ----------
+        method : str or function
+           Name of method (e.g., 'read_virial') or function called as
+           method(self, num, **kwargs).
+        nums : list of int
+           Snapshot numbers. Default value is self.nums.
+        reduce : str or function
+           None (list of results), 'records' (DataFrame from dicts of scalars),
+           'concat' (concatenate DataFrames), 'sum', 'hist' (sum histograms),
+           or reduce(acc, r) returning updated acc (acc is None for first
+           snapshot).
+        backend : str
+           'process', 'thread', 'mpi', or 'serial'. Default value is 'process'.
+        nworkers : int
+           Number of processes or threads. Default value is 1 (serial). If
+           None, number of available cores (1 if running with more than one
+           MPI rank). Memory use grows with nworkers since each worker reads
+           its own snapshots.
+        comm : MPI communicator
+           Used for 'mpi' backend. If None, MPI.COMM_WORLD.
+        incremental : bool
+           Keep the state of reduction in savdir/map (or kwargs['savdir'])
+           and run the method only for snapshots added or replaced since the
+           last call; contributions of removed or replaced snapshots are
+           dropped. The method must be decorated with
+           LoadSim.Decorators.check_pickle.
+           See pyathena.util.map_reduce.map_reduce_incremental.
+        verbose : bool
+           Print snapshot numbers as their results arrive.
+        kwargs : dict
+           Keyword arguments passed to the method.
+
+        Examples
+        --------
+        >>> df = s.map('read_virial', reduce='records', nworkers=16)
+        >>> h = s.map('read_hist2d', reduce='hist', backend='mpi')
+        >>> h = s.map('read_pdf2d', reduce='hist', incremental=True)
+        """
+
+        if nums is None:
+            nums = self.nums
+
+        if isinstance(method, str):
+            func = getattr(self, method)
+        else:
+            func = functools.partial(method, self)
+
+        local = None
+        if not kwargs.get('force_override', False) and \
+           hasattr(func, 'is_cached'):
+            local = lambda num: func.is_cached(self, num, **kwargs)
+
+        if not incremental:
+            return map_reduce(lambda num: func(num, **kwargs), nums,
+                              reduce=reduce, backend=backend, nworkers=nworkers,
+                              comm=comm, local=local, verbose=verbose)
+
+        if not hasattr(func, 'get_key'):
+            raise ValueError('incremental map requires method decorated with '
+                             'LoadSim.Decorators.check_pickle')
+
+        # State file depends on method, arguments, and reduction
+        tag = reduce if reduce is None or isinstance(reduce, str) else \
+            '{0:s}.{1:s}'.format(reduce.__module__, reduce.__qualname__)
+        key = cache_key(func.__qualname__, kwargs, tag, [])
+        savdir = kwargs.get('savdir')
+        if savdir is None:
+            savdir = osp.join(self.savdir, 'map')
+        fname = osp.join(savdir, '{0:s}.{1:s}.h5'.format(func.__name__, key[:16]))
+
+        save = True
+        if backend == 'mpi':
+            if comm is None:
+                from mpi4py import MPI
+                comm = MPI.COMM_WORLD
+            save = comm.rank == 0
+
+        return map_reduce_incremental(
+            lambda num: func(num, **kwargs), nums, fname,
+            lambda num: func.get_key(self, num, **kwargs),
+            reduce=reduce, save=save,
+            force_override=kwargs.get('force_override', False),
+            verbose=verbose, backend=backend, nworkers=nworkers, comm=comm,
+            local=local)
 
     def load_starpar_vtk(self, num=None, ivtk=None, force_override=False,
                          verbose=False):
@@ -283,6 +754,88 @@ class LoadSim(object):
 
         return self.sp
 
+    def read_starpar_vtk_all(self, columns=None, nums=None,
+                             force_override=False):
+        """Read particle data of all starpar_vtk files as a single DataFrame.
+
+        Particle data are collected in a columnar HDF5 store
+        (savdir/starpar_vtk/problem_id.starpar.h5), which is updated
+        incrementally when new starpar_vtk files appear.
+
+        Parameters
+        ----------
+        columns : list of str
+           Columns to read (e.g., ['id', 'mass', 'x1']). Default is all.
+        nums : sequence of int
+           Snapshot numbers to select. Default is all.
+        force_override : bool
+           Flag to rebuild the store from scratch
+
+        Returns
+        -------
+        sp : Pandas DataFrame object
+           One row per particle per snapshot with columns num, time, ...
+        """
+
+        fstore = self._update_starpar_store(force_override=force_override)
+
+        return read_starpar_store(fstore, columns=columns, nums=nums)
+
+    def get_star_track(self, ids, fields=None, force_override=False):
+        """Read histories of star particles across all starpar_vtk files.
+
+        Uses the id index of the starpar store (see read_starpar_vtk_all), so
+        that starpar_vtk files are not scanned again.
+
+        Parameters
+        ----------
+        ids : int or sequence of int
+           Particle ids. Ids not found are ignored.
+        fields : list of str
+           Columns to read (e.g., ['mass', 'x1', 'x2', 'x3']). Default is all.
+        force_override : bool
+           Flag to rebuild the store from scratch
+
+        Returns
+        -------
+        track : Pandas DataFrame object
+           Rows sorted by id and num with columns id, num, time, ...
+        """
+
+        fstore = self._update_starpar_store(force_override=force_override)
+
+        return read_star_track(fstore, ids, columns=fields)
+
+    def get_star_index(self, ids=None, force_override=False):
+        """Read birth and death snapshot numbers and times of star particles.
+
+        Parameters
+        ----------
+        ids : sequence of int
+           Particle ids to select. Default is all particles.
+        force_override : bool
+           Flag to rebuild the store from scratch
+
+        Returns
+        -------
+        idx : Pandas DataFrame object
+           Indexed by id with columns nsnap, num_birth, num_death, tbirth,
+           tdeath (see pyathena.io.read_starpar_vtk.read_star_index)
+        """
+
+        fstore = self._update_starpar_store(force_override=force_override)
+
+        return read_star_index(fstore, ids=ids)
+
+    def _update_starpar_store(self, force_override=False):
+        fstore = osp.join(self.savdir, 'starpar_vtk',
+                          '{0:s}.starpar.h5'.format(self.problem_id))
+        update_starpar_store(self.files['starpar_vtk'], fstore,
+                             force_override=force_override)
+        self.logger.info('[update_starpar_store]: {0:s}'.format(fstore))
+
+        return fstore
+
     def load_rst(self, num=None, irst=None, verbose=False):
         if num is None and ivtk is None:
             raise ValueError('Specify either num or irst')
@@ -301,6 +854,7 @@ class LoadSim(object):
     def create_tar_all(self,remove_original=False,kind='vtk'):
         for num in self.nums_id0:
             self.move_to_tardir(num=num, kind=kind)
+        self._get_manifest()
         raw_tardirs = self._find_match([(kind,"????")])
         for num in [int(f[-4:]) for f in raw_tardirs]:
             self.create_tar(num=num, remove_original=remove_original, kind=kind)
@@ -439,7 +993,9 @@ class LoadSim(object):
         return domain
 
     def _find_match(self, patterns):
-            glob_match = lambda p: sorted(glob.glob(osp.join(self.basedir, *p)))
+            # Patterns are matched against directory listings cached in the
+            # manifest shared by all LoadSim objects with the same basedir
+            glob_match = lambda p: self._manifest.glob(*p)
             for p in patterns:
                 f = glob_match(p)
                 if f:
@@ -447,6 +1003,16 @@ class LoadSim(object):
 
             return f
 
+    def _get_manifest(self):
+        """Get manifest of basedir (directory listings modified since the last
+        scan are forgotten).
+        """
+
+        self._manifest = get_manifest(self.basedir,
+            fcache=osp.join(self.savdir, 'manifest', 'manifest.p'))
+
+        return self._manifest
+
     def _find_files(self):
         """Function to find all output files under basedir and create "files" dictionary.
 
@@ -464,6 +1030,7 @@ class LoadSim(object):
         if not osp.isdir(self.basedir):
             raise IOError('basedir {0:s} does not exist.'.format(self.basedir))
 
+        self._get_manifest()
         self.files = dict()
 
         athinput_patterns = [('stdout.txt',),
@@ -625,7 +1192,7 @@ class LoadSim(object):
                     self.nums = self.nums_tar
 
             # Check (joined) vtk file size
-            sizes = [os.stat(f).st_size for f in self.files['vtk']]
+            sizes = [self._manifest.getsize(f) for f in self.files['vtk']]
             if len(set(sizes)) > 1:
                 size = max(set(sizes), key=sizes.count)
                 flist = [(i, s // 1024**2) for i, s in enumerate(sizes) if s != size]
@@ -634,7 +1201,7 @@ class LoadSim(object):
                    self.logger.debug('vtk num:', f[0], 'size [MB]:', f[1])
 
             # Check (tarred) vtk file size
-            sizes = [os.stat(f).st_size for f in self.files['vtk_tar']]
+            sizes = [self._manifest.getsize(f) for f in self.files['vtk_tar']]
             if len(set(sizes)) > 1:
                 size = max(set(sizes), key=sizes.count)
                 flist = [(i, s // 1024**2) for i, s in enumerate(sizes) if s != size]
@@ -725,8 +1292,11 @@ class LoadSim(object):
                     self.logger.warning(
                         'rst files not found in {0:s}.'.format(self.basedir))
 
+        self._manifest.save()
+
     def find_files_vtk2d(self):
 
+        self._get_manifest()
         self.logger.info('Find 2d vtk: {0:s}'.format(' '.join(self._fmt_vtk2d_not_found)))
         for fmt in self._fmt_vtk2d_not_found:
             fmt = fmt.split('.')[0]
@@ -740,6 +1310,8 @@ class LoadSim(object):
             else:
                 self.logger.info('{0:s} files not found '.format(fmt))
 
+        self._manifest.save()
+
 
     def _get_fvtk(self, kind, num=None, ivtk=None):
         """Get vtk file path
@@ -819,60 +1391,14 @@ class LoadSim(object):
 
         """
 
-        # JKIM: I'm sure there is a better way to achieve this, but this works
-        # anyway..
-        def check_pickle(read_func):
-            @functools.wraps(read_func)
-            def wrapper(cls, *args, **kwargs):
+        # Results are saved to content-addressed HDF5 files (keyed by method,
+        # arguments, code, and source snapshot) with an in-memory LRU tier.
+        # See pyathena.util.analysis_cache.cached_analysis
+        check_pickle = cached_analysis
 
-                # Convert positional args to keyword args
-                from inspect import getcallargs
-                call_args = getcallargs(read_func, cls, *args, **kwargs)
-                call_args.pop('self')
-                kwargs = call_args
-
-                try:
-                    prefix = kwargs['prefix']
-                except KeyError:
-                    prefix = '_'.join(read_func.__name__.split('_')[1:])
-
-                if kwargs['savdir'] is not None:
-                    savdir = kwargs['savdir']
-                else:
-                    savdir = osp.join(cls.savdir, prefix)
-
-                force_override = kwargs['force_override']
-
-                # Create savdir if it doesn't exist
-                try:
-                    if not osp.exists(savdir):
-                        force_override = True
-                        os.makedirs(savdir)
-                except FileExistsError:
-                    print('Directory exists: {0:s}'.format(savdir))
-                except PermissionError as e:
-                    print('Permission Error: ', e)
-
-                if 'num' in kwargs:
-                    fpkl = osp.join(savdir, '{0:s}_{1:04d}.p'.format(prefix, kwargs['num']))
-                else:
-                    fpkl = osp.join(savdir, '{0:s}.p'.format(prefix))
-
-                if not force_override and osp.exists(fpkl):
-                    cls.logger.info('Read from existing pickle: {0:s}'.format(fpkl))
-                    res = pickle.load(open(fpkl, 'rb'))
-                    return res
-                else:
-                    cls.logger.info('[check_pickle]: Read original dump.')
-                    # If we are here, force_override is True or history file is updated.
-                    res = read_func(cls, **kwargs)
-                    try:
-                        pickle.dump(res, open(fpkl, 'wb'))
-                    except (IOError, PermissionError) as e:
-                        cls.logger.warning('Could not pickle to {0:s}.'.format(fpkl))
-                    return res
-
-            return wrapper
+        # Declare fields read by an analysis method (used by run_fused).
+        # See pyathena.util.fused_analysis.uses_fields
+        uses_fields = uses_fields
 
         def check_pickle_hst(read_hst):
 
@@ -982,6 +1508,18 @@ class LoadSim(object):
             return wrapper
 
 
+def _nbytes(data):
+    """Size in bytes of data returned by get_field.
+    """
+
+    if data is None:
+        return 0
+    elif isinstance(data, dict):
+        return sum([_nbytes(v) for v in data.values()])
+    else:
+        return int(getattr(data, 'nbytes', 0))
+
+
 # Would be useful to have something like this for each problem
 class LoadSimAll(object):
     """Class to load multiple simulations
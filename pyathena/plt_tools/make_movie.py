@@ -1,7 +1,6 @@
 import io, sys
 import subprocess
 import base64
-from IPython.display import HTML
 
 def make_movie(fname_glob, fname_out, fps_in=15, fps_out=15):
     """(wrapper) function to create an mp4 movie from files matching a glob
@@ -60,6 +59,8 @@ def make_movie(fname_glob, fname_out, fps_in=15, fps_out=15):
 
 def display_movie(filename):
 
+    from IPython.display import HTML
+
     video = io.open(filename, 'r+b').read()
     encoded = base64.b64encode(video)
     return HTML(data='''<video alt="test" controls>
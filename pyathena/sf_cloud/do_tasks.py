@@ -10,7 +10,7 @@ import matplotlib.pyplot as plt
 import pprint
 
 import pyathena as pa
-from ..util.split_container import split_container
+from ..util.task_scheduler import run_tasks
 from ..plt_tools.make_movie import make_movie
 from .load_sim_sf_cloud import load_all_alphabeta
 
@@ -75,15 +75,8 @@ if __name__ == '__main__':
         
         if COMM.rank == 0:
             print('basedir, nums', s.basedir, nums)
-            nums = split_container(nums, COMM.size)
-        else:
-            nums = None
 
-        mynums = COMM.scatter(nums, root=0)
-        print('[rank, mynums]:', COMM.rank, mynums)
-
-        time0 = time.time()
-        for num in mynums:
+        def process(num):
             print(num, end=' ')
             
             # print('read_virial', end=' ')
@@ -147,7 +140,11 @@ if __name__ == '__main__':
             # print('plt_snapshot_2panel')
             fig = s.plt_snapshot_2panel(num, name=name)
             plt.close(fig)
-            
+
+        time0 = time.time()
+        # Snapshots are handed out one at a time to whichever rank is free
+        run_tasks(process, nums, comm=COMM)
+
         # # Make movies
         # if COMM.rank == 0:
         #     fin = osp.join(s.basedir, 'snapshots/*.png')
@@ -12,7 +12,7 @@ import matplotlib.pyplot as plt
 import pprint
 
 import pyathena as pa
-from ..util.split_container import split_container
+from ..util.task_scheduler import run_tasks
 
 from .load_sim_sf_cloud import load_all_alphabeta
 
@@ -91,19 +91,16 @@ if __name__ == '__main__':
     
     if COMM.rank == 0:
         print('nums', nums)
-        nums = split_container(nums, COMM.size)
-    else:
-        nums = None
 
-    mynums = COMM.scatter(nums, root=0)
-    print('[rank, mynums]:', COMM.rank, mynums)
-
-    time0 = time.time()
-    for num in mynums:
+    def process(num):
         print(num, end=' ')
         fig = sa.comp_snapshot(models, num, labels=labels, prefix=prefix, savefig=True)
         plt.close(fig)
-        
+
+    time0 = time.time()
+    # Snapshots are handed out one at a time to whichever rank is free
+    run_tasks(process, nums, comm=COMM)
+
     COMM.barrier()
     if COMM.rank == 0:
         print('')
@@ -81,7 +81,7 @@ class LoadSimSFCloud(LoadSim, Hst, StarPar, SliceProj, PDF,
                             self.par['problem']['rcloud'],
                             alpha_vir=self.par['problem']['alpha_vir'])
     
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='hst')
     def get_summary(self, as_dict=False, prefix='summary', savdir=None, force_override=False):
         """
         Return key simulation results such as SFE, t_SF, t_dest,H2, etc.
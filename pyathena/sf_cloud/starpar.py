@@ -1,38 +1,22 @@
 # starpar.py
 
 import numpy as np
-import pandas as pd
 
 from ..load_sim import LoadSim
 from ..util.mass_to_lum import mass_to_lum
 
 class StarPar():
 
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar_all(self, prefix='starpar_all',
-                         savdir=None, force_override=False):
-        rr = dict()
-        for num in self.nums_starpar:
-            print(num, end=' ')
-            r = self.read_starpar(num=num, force_override=force_override)
-            if r is None:
-                continue
-            
-            if not rr: # Create keys
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
-                    
-        rr = pd.DataFrame(rr)
+                         savdir=None, force_override=False, nworkers=1):
+        rr = self.map('read_starpar', self.nums_starpar, reduce='records',
+                      verbose=True, force_override=force_override,
+                      nworkers=nworkers)
         
         return rr
     
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar(self, num, savdir=None, force_override=False):
 
         sp = self.load_starpar_vtk(num)
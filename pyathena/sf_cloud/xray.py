@@ -1,6 +1,5 @@
 # xray.py
 
-import pandas as pd
 
 from ..fields.xray_emissivity import get_xray_emissivity
 from ..load_sim import LoadSim
@@ -9,27 +8,14 @@ class Xray:
     
     @LoadSim.Decorators.check_pickle
     def read_xray_all(self, nums=None, prefix='xray_all',
-                      savdir=None, force_override=False):
-        rr = dict()
+                      savdir=None, force_override=False, nworkers=1):
         if nums is None:
             nums = self.nums
 
         
-        print('num:', end=' ')
-        for i,num in enumerate(nums):
-            print(num, end=' ')
-            r = self.read_xray(num=num, savdir=savdir, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
-
-        rr = pd.DataFrame(rr)
+        rr = self.map('read_xray', nums, reduce='records', incremental=True,
+                      verbose=True, savdir=savdir,
+                      nworkers=nworkers)
         return rr
     
     @LoadSim.Decorators.check_pickle
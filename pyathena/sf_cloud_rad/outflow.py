@@ -2,7 +2,6 @@
 
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import astropy.units as au
 import astropy.constants as ac
 
@@ -12,25 +11,13 @@ class Outflow:
 
     @LoadSim.Decorators.check_pickle
     def read_outflow_all(self, nums=None, prefix='outflow_all',
-                         savdir=None, force_override=False):
-        rr = dict()
+                         savdir=None, force_override=False, nworkers=1):
         if nums is None:
             nums = self.nums
 
-        for i,num in enumerate(nums):
-            print(i, end=' ')
-            r = self.read_outflow(num=num, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
-
-        rr = pd.DataFrame(rr)
+        rr = self.map('read_outflow', nums, reduce='records', incremental=True,
+                      verbose=True,
+                      nworkers=nworkers)
 
         def integ(x, tck, constant=0.0):
             x = np.atleast_1d(x)
@@ -55,6 +55,7 @@ class SliceProj:
         return res
 
     @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.uses_fields(lambda s, kwargs: kwargs['fields'])
     def read_prj(self, num, axes=['x', 'y', 'z'],
                  fields=['density', 'xHI', 'xH2', 'xHII', 'nesq'],
                  prefix='prj',
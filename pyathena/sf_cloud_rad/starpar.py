@@ -8,7 +8,7 @@ from ..util.mass_to_lum import mass_to_lum
 
 class StarPar():
 
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar_all(self, prefix='starpar_all',
                          savdir=None, force_override=False):
         rr = dict()
@@ -28,7 +28,7 @@ class StarPar():
         rr = pd.DataFrame(rr)
         return rr
     
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar(self, num, savdir=None, force_override=False):
 
         sp = self.load_starpar_vtk(num)
@@ -4,7 +4,6 @@ import matplotlib.pyplot as plt
 import numpy as np
 import yt
 import yt.units as yu
-import pandas as pd
 import astropy.units as au
 import astropy.constants as ac
 
@@ -34,9 +33,8 @@ class Virial2:
 
     @LoadSim.Decorators.check_pickle
     def read_virial2_all(self, nums=None, prefix='virial2_all',
-                        savdir=None, force_override=False):
+                        savdir=None, force_override=False, nworkers=1):
 
-        rr = dict()
         if nums is None:
             nummax = self.get_num_max_virial2()
             nums = range(0,nummax)
@@ -48,21 +46,11 @@ class Virial2:
         #    (self.par['problem']['muB'] == 2.0):
         #     return None
 
-        for i,num in enumerate(nums):
-            print(num, end=' ')
-            r = self.read_virial2(num=num, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
+        rr = self.map('read_virial2', nums, reduce='records', incremental=True,
+                      verbose=True,
+                      nworkers=nworkers)
 
         fac = 1.26    # Rcl = R50*fac, fac = 2^1/3 for a uniform sphere
-        rr = pd.DataFrame(rr)
 
         # # Kinetic energy calculated with velocity relative to the mean velocity
         # rr['T_kin_neu_cl_alt'] = (0.5*rr['Mgas_neu_cl'].values*au.M_sun*(
@@ -9,7 +9,7 @@ from mpi4py import MPI
 import matplotlib.pyplot as plt
 
 import pyathena as pa
-from ..util.split_container import split_container
+from ..util.task_scheduler import run_tasks
 from ..plt_tools.make_movie import make_movie
 
 if __name__ == '__main__':
@@ -41,17 +41,10 @@ if __name__ == '__main__':
     # nums = s.nums[500:550]
     # nums = s.nums[550:571]
 
-    time0 = time.time()
     if COMM.rank == 0:
         print('basedir, nums', s.basedir, nums)
-        nums = split_container(nums, COMM.size)
-    else:
-        nums = None
-
-    mynums = COMM.scatter(nums, root=0)
-    print('[rank, mynums]:', COMM.rank, mynums)
 
-    for num in mynums:
+    def process(num):
         print(num, end=' ')
         # res = s.read_EM_pdf(num, force_override=True)
         #res = s.read_phot_dust_U_pdf(num, force_override=True)
@@ -60,7 +53,11 @@ if __name__ == '__main__':
         print('Unreachable objects:', n)
         print('Remaining Garbage:', end=' ')
         pprint.pprint(gc.garbage)
-        
+
+    time0 = time.time()
+    # Snapshots are handed out one at a time to whichever rank is free
+    run_tasks(process, nums, comm=COMM)
+
     # if COMM.rank == 0:
     #     fin = osp.join(s.basedir, 'snapshots2/*.png')
     #     fout = osp.join(s.basedir, 'movies/{0:s}_snapshots2.mp4'.format(s.basename))
@@ -9,10 +9,9 @@ import matplotlib.pyplot as plt
 import pprint
 import argparse
 import sys
-import pickle
 
 import pyathena as pa
-from pyathena.util.split_container import split_container
+from pyathena.util.task_scheduler import run_tasks
 from pyathena.plt_tools.make_movie import make_movie
 
 if __name__ == '__main__':
@@ -38,33 +37,29 @@ if __name__ == '__main__':
 
     if COMM.rank == 0:
         print('basedir, nums', s.basedir, nums)
-        nums = split_container(nums, COMM.size)
-    else:
-        nums = None
 
-    mynums = COMM.scatter(nums, root=0)
-    print('[rank, mynums]:', COMM.rank, mynums)
-
-    time0 = time.time()
-    for num in mynums:
+    def process(num):
         print(num, end=' ')
-
-        try:
-            fig = s.plt_snapshot(num, savdir_pkl=savdir_pkl, savdir=savdir, force_override=True)
-            plt.close(fig)
-            fig = s.plt_pdf2d_all(num, plt_zprof=False, savdir_pkl=savdir_pkl, savdir=savdir)
-            plt.close(fig)
-        except (EOFError, KeyError, pickle.UnpicklingError):
-            fig = s.plt_snapshot(num, savdir_pkl=savdir_pkl, savdir=savdir, force_override=True)
-            plt.close(fig)
-            fig = s.plt_pdf2d_all(num, plt_zprof=False, savdir_pkl=savdir_pkl, savdir=savdir, force_override=True)
-            plt.close(fig)
+        # Read fields of snapshot once and save slices, projections, and
+        # pdfs to cache, which are read by the plotting functions below
+        s.run_fused([('read_slc', dict(savdir=savdir_pkl)),
+                     ('read_prj', dict(savdir=savdir_pkl)),
+                     ('read_pdf2d', dict(savdir=savdir_pkl))], nums=[num])
+        fig = s.plt_snapshot(num, savdir_pkl=savdir_pkl, savdir=savdir)
+        plt.close(fig)
+        fig = s.plt_pdf2d_all(num, plt_zprof=False, savdir_pkl=savdir_pkl, savdir=savdir)
+        plt.close(fig)
 
         n = gc.collect()
         print('Unreachable objects:', n, end=' ')
         print('Remaining Garbage:', end=' ')
         pprint.pprint(gc.garbage)
 
+    time0 = time.time()
+    # Snapshots are handed out one at a time to whichever rank is free
+    # (late snapshots with many star particles take longer)
+    run_tasks(process, nums[::-1], comm=COMM)
+
     # Make movies
     COMM.barrier()
 
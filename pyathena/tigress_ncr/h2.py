@@ -1,7 +1,6 @@
 
 import numpy as np
 import astropy.units as au
-import pandas as pd
 
 from ..load_sim import LoadSim
 
@@ -11,27 +10,15 @@ class H2:
 
     @LoadSim.Decorators.check_pickle
     def read_H2eq_all(self, nums=None, prefix='H2eq_all',
-                      savdir=None, force_override=False):
-        rr = dict()
+                      savdir=None, force_override=False, nworkers=1):
         if nums is None:
             nums = self.nums
 
         self.logger.info('H2eq_all: {0:s} nums:'.format(self.basename), nums, end=' ')
 
-        for i,num in enumerate(nums):
-            print(num, end=' ')
-            r = self.read_H2eq(num=num, savdir=savdir, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
-
-        rr = pd.DataFrame(rr)
+        rr = self.map('read_H2eq', nums, reduce='records', incremental=True,
+                      verbose=True, savdir=savdir,
+                      nworkers=nworkers)
         
         return rr
 
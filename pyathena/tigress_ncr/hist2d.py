@@ -23,7 +23,7 @@ class Hist2d:
     def read_hist2d_all(self, nums=None, hist2d_kwargs=dict(),
                         savdir=None,
                         prefix='hist2d_all',
-                        force_override=False):
+                        force_override=False, nworkers=1):
         """Function to calculate sum of hist2d output from multiple snapshots
 
         Parameters
@@ -39,34 +39,18 @@ class Hist2d:
         force_override : bool
             Recalculate histograms. Do not read from pickle file even if it
             exists.
+        nworkers : int
+            Number of processes used to compute histograms of snapshots.
+            Default value is 1 (serial).
         """
 
         if nums is None:
             nums = self.nums
 
-        rr = dict()
         print('[read_hist2d_all]:', end=' ')
-        for i,num in enumerate(nums):
-            print(num, end=' ')
-            r = self.read_hist2d(num, **hist2d_kwargs)
-            if i == 0:
-                for k in r.keys():
-                    if k == 'time_code':
-                        rr[k] = []
-                    else:
-                        rr[k] = dict()
-                        rr[k]['x'] = r[k]['x']
-                        rr[k]['y'] = r[k]['y']
-                        rr[k]['H'] = np.zeros_like(r[k]['H'])
-
-            for k in r.keys():
-                if k == 'time_code':
-                    rr[k].append(r[k])
-                else:
-                    rr[k]['H'] += r[k]['H']
-
-
-        print('')
+        rr = self.map('read_hist2d', nums, reduce='hist', incremental=True,
+                      verbose=True, **hist2d_kwargs,
+                      nworkers=nworkers)
 
         return rr
 
@@ -37,45 +37,25 @@ bins_def=dict(
 class PDF:
 
     @LoadSim.Decorators.check_pickle
-    def read_pdf2d_avg(self, nums=None, savdir=None, force_override=False):
+    def read_pdf2d_avg(self, nums=None, savdir=None, force_override=False,
+                       nworkers=1):
         """Take sum of all pdf2d
         """
 
         if nums is None:
             nums = self.nums
 
-        rr = dict()
         print('[read_pdf2d_avg]:', end=' ')
-        for i,num in enumerate(nums):
-            print(num, end=' ')
-            r = self.read_pdf2d(num, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    if k == 'time_code':
-                        rr[k] = []
-                    else:
-                        rr[k] = dict()
-                        rr[k]['xe'] = r[k]['xe']
-                        rr[k]['ye'] = r[k]['ye']
-                        rr[k]['H'] = np.zeros_like(r[k]['H'])
-                        rr[k]['Hw'] = np.zeros_like(r[k]['Hw'])
-
-            for k in r.keys():
-                if k == 'time_code':
-                    rr[k].append(r[k])
-                else:
-                    rr[k]['H'] += r[k]['H']
-                    rr[k]['Hw'] += r[k]['Hw']
+        rr = self.map('read_pdf2d', nums, reduce='hist', incremental=True,
+                      verbose=True, force_override=False,
+                      nworkers=nworkers)
 
         return rr    
 
-    @LoadSim.Decorators.check_pickle
-    def read_pdf2d(self, num,
-                   bin_fields=None,
-                   weight_fields=None,
-                   bins=None, prefix='pdf2d',
-                   savdir=None, force_override=False):
-        
+    def _get_pdf2d_fields(self, bin_fields=None, weight_fields=None):
+        """Return bin fields, weight fields, and all fields read by read_pdf2d
+        """
+
         bin_fields_def = [['nH', 'pok'], ['nH', 'pok'], ['nH', 'pok'], ['nH', 'pok'],
                           ['nH', 'T']]
         weight_fields_def = ['nH', '2nH2', 'nHI', 'nHII',
@@ -101,11 +81,26 @@ class PDF:
             bin_fields = bin_fields_def
             weight_fields = weight_fields_def
 
-        ds = self.load_vtk(num=num)
-        res = dict()
         fields = np.unique(np.append(np.unique(bin_fields),
                                      np.unique(weight_fields +
                                                ['xHI','xH2','xHII'])))
+
+        return bin_fields, weight_fields, fields
+
+    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.uses_fields(lambda s, kwargs: s._get_pdf2d_fields(
+        kwargs['bin_fields'], kwargs['weight_fields'])[2])
+    def read_pdf2d(self, num,
+                   bin_fields=None,
+                   weight_fields=None,
+                   bins=None, prefix='pdf2d',
+                   savdir=None, force_override=False):
+        
+        bin_fields, weight_fields, fields = \
+            self._get_pdf2d_fields(bin_fields, weight_fields)
+
+        ds = self.load_vtk(num=num)
+        res = dict()
         dd = ds.get_field(fields)
         dd = dd.stack(xyz=['x','y','z']).dropna(dim='xyz')
         for bf,wf in zip(bin_fields,weight_fields):
@@ -86,15 +86,19 @@ class SliceProj:
             for f in fields:
                 res[ax][f] = dat[f].data
 
-        for zpos,zlab in zip([-1000,-500,500,1000],['zn10','zn05','zp05','zp10']):
-            dat = ds.get_slice('z', fields, pos=zpos, method='nearest')
+        # Read all z-slices in one pass
+        zpos = [-1000,-500,500,1000]
+        zlabs = ['zn10','zn05','zp05','zp10']
+        dat = ds.get_slice('z', fields, pos=zpos, method='nearest')
+        for i,zlab in enumerate(zlabs):
             res[zlab] = dict()
             for f in fields:
-                res[zlab][f] = dat[f].data
+                res[zlab][f] = dat[f].isel(z=i).data
 
         return res
 
     @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.uses_fields(['nH', 'nH2', 'nesq'])
     def read_prj(self, num, axes=['x', 'y', 'z'], prefix='prj',
                  savdir=None, force_override=False):
 
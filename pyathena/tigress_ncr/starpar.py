@@ -1,7 +1,6 @@
 # starpar.py
 
 import numpy as np
-import pandas as pd
 import xarray as xr
 import astropy.units as au
 import astropy.constants as ac
@@ -14,29 +13,17 @@ from ..util.mass_to_lum import mass_to_lum
 
 class StarPar():
 
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar_all(self, prefix='starpar_all',
-                         savdir=None, force_override=False):
+                         savdir=None, force_override=False, nworkers=1):
         """Function to read all post-processed starpar dump
         """
-        rr = dict()
-        for i in self.nums_starpar:
-            print(i, end=' ')
-            r = self.read_starpar(num=i, force_override=False)
-            if i == 0:
-                for k in r.keys():
-                    rr[k] = []
-
-            for k in r.keys():
-                try:
-                    rr[k].append(r[k].value.item())
-                except:
-                    rr[k].append(r[k])
-
-        rr = pd.DataFrame(rr)
+        rr = self.map('read_starpar', self.nums_starpar, reduce='records',
+                      verbose=True,
+                      nworkers=nworkers)
         return rr
     
-    @LoadSim.Decorators.check_pickle
+    @LoadSim.Decorators.check_pickle(source='starpar_vtk')
     def read_starpar(self, num, savdir=None, force_override=False):
         """Function to read post-processed starpar dump
         """
@@ -0,0 +1,454 @@
+"""
+Content-addressed cache of analysis results (HDF5 store and in-memory tier)
+"""
+
+from __future__ import print_function
+
+import os
+import os.path as osp
+import glob
+import copy
+import json
+import pickle
+import hashlib
+import functools
+import inspect
+import numpy as np
+
+from .lru_cache import LRUCache
+
+# Increase when the layout of cache files (or the way keys are computed)
+# changes
+_CACHE_VERSION = 1
+# Arrays smaller than this are not chunked/compressed
+_MIN_COMPRESS_BYTES = 1024
+# Number of most recent cache files kept for a method and num (e.g., with
+# different arguments); older ones are removed when a new file is saved
+_KEEP_FILES = 4
+# Arguments that do not affect the result
+_IGNORED_ARGS = ('self', 'savdir', 'force_override', 'nworkers')
+
+# In-memory tier shared by all LoadSim objects
+analysis_cache = LRUCache(maxbytes=512*1024**2)
+
+def cached_analysis(read_func=None, version=None, source='vtk'):
+    """Decorator to cache the result of an analysis method of LoadSim.
+
+    The result is saved to savdir/prefix_XXXX.KEY.h5 (or savdir/prefix.KEY.h5
+    if the method has no num argument), where KEY is a hash of
+    - module and qualified name of the method
+    - values of its arguments (except for savdir, force_override, and
+      nworkers)
+    - source code of the method and version tag
+    - size and mtime of the source files (see source)
+    so that a change in any of these gives a new cache file instead of stale
+    results. Only the _KEEP_FILES most recent files of a method and num are
+    kept. Files are written atomically (temporary file and rename). Nested
+    dicts of numpy arrays and scalars are stored as compressed HDF5 datasets;
+    other objects (DataFrame, Dataset, lists, ...) are pickled into a
+    compressed byte dataset. Results are also kept in analysis_cache (LRU
+    cache in memory); callers receive copies, so that modifying a result does
+    not modify the cached one.
+
+    The decorated method may take prefix, savdir, and force_override
+    arguments, which have the same meaning as in LoadSim.Decorators.check_pickle.
+    By default, prefix is the method name without the first word (e.g.,
+    'pdf2d' for read_pdf2d) and savdir is LoadSim.savdir/prefix.
+    The decorated method has is_cached(self, *args, **kwargs) attribute, which
+    returns True if the result of the call is cached, and get_key(self, *args,
+    **kwargs), which returns the cache key of the call.
+
+    Parameters
+    ----------
+    read_func : function
+        Method to be decorated. Given when used without arguments.
+    version : str or int
+        Tag to be increased when the result changes for reasons not visible in
+        the source code of the method (e.g., a function it calls).
+    source : str or function
+        Kind of files the result depends on: 'vtk' (default) or
+        'starpar_vtk' for the snapshot of num (or snapshots of nums, default
+        all, if the method has no num argument), 'hst' for the history file,
+        or None if the result depends on arguments only. Or function
+        source(self, kwargs) returning list of files.
+
+    Examples
+    --------
+    >>> @cached_analysis
+    ... def read_pdf(self, num, bins=None, prefix='pdf', savdir=None,
+    ...              force_override=False):
+    ...     ...
+
+    >>> @cached_analysis(version=2)
+    ... def read_outflow(self, num, prefix='outflow', savdir=None,
+    ...                  force_override=False):
+    ...     ...
+
+    >>> @cached_analysis(source='starpar_vtk')
+    ... def read_starpar(self, num, savdir=None, force_override=False):
+    ...     ...
+    """
+
+    if read_func is None:
+        return functools.partial(cached_analysis, version=version,
+                                 source=source)
+
+    qualname = '{0:s}.{1:s}'.format(read_func.__module__, read_func.__qualname__)
+    # Hash of source code is computed when the method is first called
+    code_hash = []
+
+    def _get_key(cls, args, kwargs):
+        """Return keyword args, cache key, and cache file name of a call.
+        """
+
+        # Convert positional args to keyword args
+        call_args = inspect.getcallargs(read_func, cls, *args, **kwargs)
+        call_args.pop('self', None)
+        kwargs = call_args
+
+        try:
+            prefix = kwargs['prefix']
+        except KeyError:
+            prefix = '_'.join(read_func.__name__.split('_')[1:])
+
+        if kwargs.get('savdir') is not None:
+            savdir = kwargs['savdir']
+        else:
+            savdir = osp.join(cls.savdir, prefix)
+
+        if not code_hash:
+            code_hash.append(_get_code_hash(read_func))
+        if callable(source):
+            fsrc = source(cls, kwargs)
+        else:
+            fsrc = _get_sources(cls, source, kwargs)
+
+        key = cache_key(qualname, kwargs, (code_hash[0], version),
+                        _stat_sources(fsrc))
+        if 'num' in kwargs and kwargs['num'] is not None:
+            fname = '{0:s}_{1:04d}.{2:s}.h5'.format(prefix, int(kwargs['num']),
+                                                    key[:16])
+        else:
+            fname = '{0:s}.{1:s}.h5'.format(prefix, key[:16])
+
+        return kwargs, key, osp.join(savdir, fname)
+
+    def is_cached(cls, *args, **kwargs):
+        """Return True if result of the call is in memory or on disk.
+        """
+
+        _, key, fname = _get_key(cls, args, kwargs)
+
+        return key in analysis_cache or _check_file(fname, key)
+
+    def get_key(cls, *args, **kwargs):
+        """Return cache key of the call.
+        """
+
+        return _get_key(cls, args, kwargs)[1]
+
+    @functools.wraps(read_func)
+    def wrapper(cls, *args, **kwargs):
+
+        kwargs, key, fname = _get_key(cls, args, kwargs)
+        force_override = kwargs.get('force_override', False)
+
+        if not force_override:
+            res = analysis_cache.get(key)
+            if res is not None:
+                cls.logger.info('[{0:s}]: Read from memory.'.format(
+                    read_func.__name__))
+                return _copy_result(res[0])
+
+            res = load_result(fname, key)
+            if res is not None:
+                cls.logger.info('[{0:s}]: Read from {1:s}'.format(
+                    read_func.__name__, fname))
+                analysis_cache.put(key, res)
+                return _copy_result(res[0])
+
+        cls.logger.info('[{0:s}]: Read original dump.'.format(read_func.__name__))
+        res = read_func(cls, **kwargs)
+        try:
+            save_result(fname, res, key, qualname)
+            _remove_old_files(fname, qualname)
+        except (IOError, OSError) as e:
+            cls.logger.warning('Could not save to {0:s}: {1:s}'.format(fname, str(e)))
+
+        analysis_cache.put(key, (res,))
+        return _copy_result(res)
+
+    wrapper.is_cached = is_cached
+    wrapper.get_key = get_key
+
+    return wrapper
+
+
+def cache_key(qualname, args, version, sources):
+    """Hash (hex digest) of function name, normalized arguments, code version,
+    and (size, mtime) of source files.
+    """
+
+    h = hashlib.sha1()
+    for obj in (_CACHE_VERSION, qualname, version, sources):
+        h.update(_normalize(obj).encode())
+    for k in sorted(args.keys()):
+        if k in _IGNORED_ARGS:
+            continue
+        h.update(k.encode())
+        h.update(_normalize(args[k]).encode())
+
+    return h.hexdigest()
+
+
+def save_result(fname, res, key='', qualname=''):
+    """Save analysis result to HDF5 file (atomically).
+    """
+
+    import h5py
+
+    os.makedirs(osp.dirname(osp.abspath(fname)), exist_ok=True)
+    ftmp = '{0:s}.{1:d}.tmp'.format(fname, os.getpid())
+    try:
+        with h5py.File(ftmp, 'w') as f:
+            f.attrs['version'] = _CACHE_VERSION
+            f.attrs['key'] = key
+            f.attrs['qualname'] = qualname
+            _write_obj(f, 'result', res)
+        os.replace(ftmp, fname)
+    finally:
+        if osp.exists(ftmp):
+            os.remove(ftmp)
+
+
+def load_result(fname, key=None):
+    """Load analysis result saved by save_result.
+
+    Returns tuple (result,) or None if the file does not exist, is corrupt,
+    or was saved with a different key.
+    """
+
+    import h5py
+
+    if not osp.exists(fname):
+        return None
+    try:
+        with h5py.File(fname, 'r') as f:
+            if f.attrs.get('version') != _CACHE_VERSION or \
+               (key is not None and f.attrs.get('key') != key):
+                return None
+            return (_read_obj(f['result']),)
+    except Exception:
+        return None
+
+
+def _remove_old_files(fname, qualname, keep=_KEEP_FILES):
+    """Remove cache files of the same method and num as fname (same name
+    except for key) but the keep most recent ones.
+    """
+
+    import h5py
+
+    prefix = osp.basename(fname).rsplit('.', 2)[0]
+    pattern = osp.join(glob.escape(osp.dirname(fname)),
+                       glob.escape(prefix) + '.' + '[0-9a-f]'*16 + '.h5')
+    fnames = []
+    for f in glob.glob(pattern):
+        if osp.samefile(f, fname):
+            continue
+        try:
+            with h5py.File(f, 'r') as h:
+                if h.attrs.get('qualname') != qualname:
+                    continue
+            fnames.append((os.stat(f).st_mtime_ns, f))
+        except Exception:
+            continue
+
+    for _, f in sorted(fnames, reverse=True)[keep - 1:]:
+        try:
+            os.remove(f)
+        except OSError:
+            pass
+
+
+def _check_file(fname, key):
+    """True if cache file exists and was saved with key (data are not read).
+    """
+
+    import h5py
+
+    if not osp.exists(fname):
+        return False
+    try:
+        with h5py.File(fname, 'r') as f:
+            return f.attrs.get('version') == _CACHE_VERSION and \
+                f.attrs.get('key') == key and 'result' in f
+    except Exception:
+        return False
+
+
+def _get_code_hash(func):
+    try:
+        src = inspect.getsource(func)
+    except (IOError, OSError, TypeError):
+        code = func.__code__
+        src = code.co_code + repr(code.co_consts).encode()
+    if isinstance(src, str):
+        src = src.encode()
+
+    return hashlib.sha1(src).hexdigest()
+
+
+def _get_sources(cls, kind, kwargs):
+    """Source files of analysis of given kind. Files that do not exist (yet)
+    are included so that the key changes when they appear.
+    """
+
+    if kind is None:
+        return []
+    elif kind == 'hst':
+        return [cls.files.get('hst')]
+    elif kind == 'vtk':
+        kinds = ('vtk_id0', 'vtk', 'vtk_tar')
+        nums = getattr(cls, 'nums', None)
+    elif kind == 'starpar_vtk':
+        kinds = ('starpar_vtk',)
+        nums = getattr(cls, 'nums_starpar', None)
+    else:
+        raise ValueError('Unknown source: {0:s}'.format(str(kind)))
+
+    if kwargs.get('num') is not None:
+        nums = [kwargs['num']]
+    elif kwargs.get('nums') is not None:
+        nums = kwargs['nums']
+
+    kinds = [k for k in kinds if cls.files.get(k)]
+    fsrc = []
+    for num in (nums if nums is not None else []):
+        fnames = [cls._get_fvtk(k, int(num)) for k in kinds]
+        fnames = [f for f in fnames if f is not None]
+        exists = [f for f in fnames if osp.exists(f)]
+        fsrc.append(exists[0] if exists else (fnames[0] if fnames else None))
+
+    return fsrc
+
+
+def _stat_sources(fnames):
+    st = []
+    for f in fnames:
+        try:
+            s = os.stat(f)
+            st.append((osp.abspath(f), s.st_size, s.st_mtime_ns))
+        except (TypeError, OSError):
+            st.append((f, None, None))
+
+    return st
+
+
+def _normalize(obj):
+    """Deterministic string representation of argument values.
+    """
+
+    if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+        return repr(obj)
+    elif isinstance(obj, np.ndarray):
+        a = np.ascontiguousarray(obj)
+        s = 'ndarray({0:s},{1:s},{2:s})'.format(
+            a.dtype.str, repr(a.shape), hashlib.sha1(a.tobytes()).hexdigest()
+            if a.dtype.kind != 'O' else _normalize(a.tolist()))
+        unit = getattr(obj, 'unit', None)
+        return s if unit is None else s + str(unit)
+    elif isinstance(obj, np.generic):
+        return repr(obj.item())
+    elif isinstance(obj, dict):
+        items = sorted([(_normalize(k), _normalize(v)) for k, v in obj.items()])
+        return '{' + ','.join(['{0:s}:{1:s}'.format(k, v) for k, v in items]) + '}'
+    elif isinstance(obj, (list, tuple)):
+        return '{0:s}[{1:s}]'.format(type(obj).__name__,
+                                     ','.join([_normalize(v) for v in obj]))
+    elif isinstance(obj, (set, frozenset)):
+        return 'set[' + ','.join(sorted([_normalize(v) for v in obj])) + ']'
+    elif callable(obj) and hasattr(obj, '__qualname__'):
+        return '{0:s}.{1:s}'.format(getattr(obj, '__module__', '') or '',
+                                    obj.__qualname__)
+    else:
+        r = repr(obj)
+        if ' at 0x' not in r:
+            return r
+        # Default repr contains the memory address; use the state instead
+        try:
+            getstate = getattr(obj, '__getstate__', None)
+            state = getstate() if getstate is not None else vars(obj)
+        except (TypeError, AttributeError):
+            state = None
+        if state is None:
+            raise TypeError('Cannot compute cache key for argument '
+                            '{0:s}'.format(r))
+        return '{0:s}.{1:s}({2:s})'.format(type(obj).__module__,
+                                           type(obj).__qualname__,
+                                           _normalize(state))
+
+
+def _write_obj(group, name, obj):
+    if type(obj) is dict and \
+       all([isinstance(k, str) and k and '/' not in k and k != '.' for k in obj]):
+        g = group.create_group(name)
+        g.attrs['kind'] = 'dict'
+        # HDF5 sorts member names; keep insertion order
+        g.attrs['keys'] = json.dumps(list(obj.keys()))
+        for k, v in obj.items():
+            _write_obj(g, k, v)
+    elif type(obj) is np.ndarray and obj.dtype.kind in 'biufc':
+        if obj.ndim > 0 and obj.nbytes >= _MIN_COMPRESS_BYTES:
+            d = group.create_dataset(name, data=obj, compression='gzip',
+                                     compression_opts=4, shuffle=True)
+        else:
+            d = group.create_dataset(name, data=obj)
+        d.attrs['kind'] = 'ndarray'
+    elif isinstance(obj, np.generic) and obj.dtype.kind in 'biufc':
+        d = group.create_dataset(name, data=obj)
+        d.attrs['kind'] = 'npscalar'
+    elif type(obj) in (bool, float, complex) or \
+         (type(obj) is int and -2**63 <= obj < 2**63):
+        d = group.create_dataset(name, data=obj)
+        d.attrs['kind'] = type(obj).__name__
+    elif type(obj) is str:
+        d = group.create_dataset(name, data=obj)
+        d.attrs['kind'] = 'str'
+    elif obj is None:
+        d = group.create_dataset(name, data=0)
+        d.attrs['kind'] = 'none'
+    else:
+        buf = np.frombuffer(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL),
+                            dtype=np.uint8)
+        d = group.create_dataset(name, data=buf, compression='gzip',
+                                 compression_opts=4)
+        d.attrs['kind'] = 'pickle'
+
+
+def _read_obj(d):
+    kind = d.attrs['kind']
+    if kind == 'dict':
+        return {k: _read_obj(d[k]) for k in json.loads(d.attrs['keys'])}
+    elif kind == 'ndarray':
+        return d[()]
+    elif kind == 'npscalar':
+        return d[()]
+    elif kind in ('bool', 'int', 'float', 'complex'):
+        return dict(bool=bool, int=int, float=float, complex=complex)[kind](d[()])
+    elif kind == 'str':
+        return d.asstr()[()]
+    elif kind == 'none':
+        return None
+    elif kind == 'pickle':
+        return pickle.loads(d[()].tobytes())
+    else:
+        raise ValueError('Unknown kind {0:s}'.format(kind))
+
+
+def _copy_result(obj):
+    """Copy of result so that callers can modify it without modifying cached
+    one.
+    """
+
+    return copy.deepcopy(obj)
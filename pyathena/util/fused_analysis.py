@@ -0,0 +1,113 @@
+"""
+Run several analyses of a snapshot reading fields only once
+"""
+
+from __future__ import print_function
+
+import inspect
+import numpy as np
+
+def uses_fields(fields):
+    """Decorator to declare 3d fields that an analysis method of LoadSim reads
+    with ds.get_field, so that LoadSim.run_fused can read the union of fields
+    of all analyses once per snapshot.
+
+    Parameters
+    ----------
+    fields : list of str or function
+        Field names (including derived fields), or fields(self, kwargs) that
+        returns field names given keyword arguments of the call (including
+        default values).
+
+    Examples
+    --------
+    >>> @LoadSim.Decorators.check_pickle
+    ... @LoadSim.Decorators.uses_fields(['nH', 'nH2', 'nesq'])
+    ... def read_prj(self, num, prefix='prj', savdir=None, force_override=False):
+    ...     ds = self.load_vtk(num)
+    ...     dat = ds.get_field(['nH', 'nH2', 'nesq'])
+    """
+
+    def decorator(func):
+        func.fused_fields = fields
+        return func
+
+    return decorator
+
+
+def get_fields(cls, method, num, kwargs):
+    """Fields declared by uses_fields for a call of method (bound method of
+    cls). Returns empty list if fields are not declared.
+    """
+
+    fields = getattr(method, 'fused_fields', None)
+    if fields is None:
+        return []
+
+    if callable(fields):
+        func = inspect.unwrap(method.__func__)
+        call_args = inspect.getcallargs(func, cls, num, **kwargs)
+        call_args.pop('self', None)
+        fields = fields(cls, call_args)
+
+    return [str(f) for f in np.atleast_1d(fields)]
+
+
+class FusedDataSet(object):
+    """DataSet whose fields (over the whole domain) have been read already.
+
+    get_field returns subsets of preloaded data (no copy) if all requested
+    fields have been read. Otherwise, and for all other methods and
+    attributes, the call is passed to the underlying DataSet object.
+    Analyses should not modify arrays returned by get_field in place.
+    """
+
+    def __init__(self, ds, data):
+        """
+        Parameters
+        ----------
+        ds : AthenaDataSet
+            DataSet of a snapshot
+        data : xarray.Dataset
+            Output of ds.get_field(fields) over the whole domain
+        """
+
+        self._ds = ds
+        self._data = data
+
+    def get_field(self, field='density', le=None, re=None, as_xarray=True,
+                  lazy=False, blockwise=False):
+        if le is None and re is None and as_xarray and not lazy:
+            names = self._get_names(np.atleast_1d(field))
+            if names is not None:
+                return self._data[names]
+
+        return self._ds.get_field(field, le=le, re=re, as_xarray=as_xarray,
+                                  lazy=lazy, blockwise=blockwise)
+
+    def _get_names(self, field):
+        """Names of variables in preloaded data for field (vector fields are
+        split into components). None if any of field is not preloaded.
+        """
+
+        if self._data is None:
+            return None
+
+        names = []
+        for f in field:
+            if f in self._data.data_vars:
+                names.append(f)
+            elif f in self._ds.field_list and \
+                 self._ds._field_map[f]['nvar'] > 1:
+                comp = [f + str(i + 1) for i in
+                        range(self._ds._field_map[f]['nvar'])]
+                if not all([c in self._data.data_vars for c in comp]):
+                    return None
+                names += comp
+            else:
+                return None
+
+        return names
+
+    def __getattr__(self, name):
+        return getattr(self._ds, name)
@@ -0,0 +1,122 @@
+from __future__ import print_function
+
+import sys
+import threading
+from collections import OrderedDict
+
+class LRUCache(object):
+    """Least-recently-used cache with a memory budget in bytes.
+
+    Size of an item is taken from its nbytes attribute (numpy arrays) or
+    sys.getsizeof, summed over items of dicts, lists, and tuples. When the
+    total size exceeds maxbytes, least recently used items are evicted. Items
+    larger than maxbytes are not stored. Thread-safe.
+    """
+
+    def __init__(self, maxbytes=2*1024**3):
+        """
+        Parameters
+        ----------
+        maxbytes : int
+            Memory budget in bytes. If 0, nothing is cached.
+            Default value is 2 GiB.
+        """
+
+        self._maxbytes = maxbytes
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def maxbytes(self):
+        return self._maxbytes
+
+    @maxbytes.setter
+    def maxbytes(self, maxbytes):
+        with self._lock:
+            self._maxbytes = maxbytes
+            self._evict()
+
+    def get(self, key, default=None):
+        """Return cached item (and mark it as most recently used) or default.
+        """
+
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store item and evict least recently used items if necessary.
+        """
+
+        size = _sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.nbytes -= _sizeof(self._data.pop(key))
+            if size > self._maxbytes:
+                return
+
+            self._data[key] = value
+            self.nbytes += size
+            self._evict()
+
+    def clear(self):
+        """Remove all items. Statistics are not reset.
+        """
+
+        with self._lock:
+            self._data.clear()
+            self.nbytes = 0
+
+    def stats(self):
+        """Return dictionary of cache statistics.
+        """
+
+        with self._lock:
+            return dict(hits=self.hits, misses=self.misses,
+                        evictions=self.evictions, count=len(self._data),
+                        nbytes=self.nbytes, maxbytes=self._maxbytes)
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def __repr__(self):
+        return '{0:s}({1:s})'.format(self.__class__.__name__,
+            ', '.join(['{0:s}={1:d}'.format(k, v) for k, v in self.stats().items()]))
+
+    def _evict(self):
+        while self.nbytes > self._maxbytes and self._data:
+            _, value = self._data.popitem(last=False)
+            self.nbytes -= _sizeof(value)
+            self.evictions += 1
+
+
+def _sizeof(value):
+    if isinstance(value, (dict, list, tuple)):
+        items = value.values() if isinstance(value, dict) else value
+        return sys.getsizeof(value) + sum([_sizeof(v) for v in items])
+    try:
+        return int(value.nbytes)
+    except AttributeError:
+        return sys.getsizeof(value)
@@ -0,0 +1,212 @@
+from __future__ import print_function
+
+import os
+import os.path as osp
+import pickle
+import threading
+import time
+from fnmatch import fnmatchcase
+
+# Increase when the layout of the pickled manifest changes
+_MANIFEST_VERSION = 1
+# Directory listings modified within this many seconds of the scan are
+# considered unstable (mtime resolution) and listed again next time
+_MTIME_SLACK = 2.0
+
+# Manifests shared by all LoadSim objects with the same basedir
+_manifests = dict()
+_lock = threading.Lock()
+
+def get_manifest(basedir, fcache=None):
+    """Return Manifest of basedir shared by all callers.
+
+    Parameters
+    ----------
+    basedir : str
+        Directory of simulation outputs
+    fcache : str
+        Name of pickle file that Manifest.save writes directory listings to,
+        so that they can be reused in a new session. It should not be placed
+        directly in basedir (writing it would modify basedir). If None,
+        listings are kept in memory only.
+
+    Returns
+    -------
+    m : Manifest
+    """
+
+    basedir = osp.abspath(basedir)
+    with _lock:
+        m = _manifests.get(basedir)
+        if m is None:
+            m = Manifest(basedir, fcache=fcache)
+            _manifests[basedir] = m
+        elif fcache is not None and m.fcache is None:
+            m.fcache = fcache
+
+    m.refresh()
+    return m
+
+class Manifest(object):
+    """Cached listings of directories under basedir.
+
+    Each directory is listed at most once with os.scandir, when a pattern
+    first needs it, and listed again only when its mtime changes. glob()
+    matches shell-style patterns against the cached listings with the same
+    result as sorted(glob.glob(...)).
+    """
+
+    def __init__(self, basedir, fcache=None):
+        """
+        Parameters
+        ----------
+        basedir : str
+            Directory of simulation outputs
+        fcache : str
+            Name of pickle file to save directory listings to.
+        """
+
+        self.basedir = osp.abspath(basedir)
+        self.fcache = fcache
+        # relative dir -> dict(mtime=, names=sorted list, dirs=set, size=dict)
+        self._dirs = dict()
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._load()
+
+    def refresh(self):
+        """Forget listings of directories that were modified or removed.
+        """
+
+        with self._lock:
+            for d in list(self._dirs.keys()):
+                try:
+                    mtime = os.stat(self._abspath(d)).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime is None or mtime != self._dirs[d]['mtime']:
+                    del self._dirs[d]
+                    self._dirty = True
+
+    def glob(self, *parts):
+        """Return sorted paths matching pattern components under basedir.
+
+        Parameters
+        ----------
+        *parts : str
+            Pattern components, e.g., ('vtk', 'id0', '*.????.vtk')
+
+        Returns
+        -------
+        matches : list of str
+        """
+
+        with self._lock:
+            rel = ['']
+            for i, p in enumerate(parts):
+                last = i == len(parts) - 1
+                rel_ = []
+                for d in rel:
+                    listing = self._listdir(d)
+                    if listing is None:
+                        continue
+                    for name in _match(listing['names'], p):
+                        if last or name in listing['dirs']:
+                            rel_.append(osp.join(d, name))
+                rel = rel_
+
+        return sorted([osp.join(self.basedir, r) for r in rel])
+
+    def getsize(self, path):
+        """Size of file in bytes (cached until its directory is modified).
+        """
+
+        d, name = osp.split(osp.relpath(path, self.basedir))
+        with self._lock:
+            listing = self._listdir(d)
+            if listing is None:
+                return os.stat(path).st_size
+            size = listing['size'].get(name)
+            if size is None:
+                size = os.stat(path).st_size
+                listing['size'][name] = size
+                self._dirty = True
+
+        return size
+
+    def _listdir(self, d):
+        listing = self._dirs.get(d)
+        if listing is not None:
+            return listing
+
+        t0 = time.time()
+        names = []
+        dirs = set()
+        try:
+            with os.scandir(self._abspath(d)) as it:
+                for e in it:
+                    names.append(e.name)
+                    try:
+                        if e.is_dir():
+                            dirs.add(e.name)
+                    except OSError:
+                        pass
+            mtime = os.stat(self._abspath(d)).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+
+        if mtime > (t0 - _MTIME_SLACK)*1e9:
+            # May be modified again within mtime resolution; do not trust
+            mtime = -1
+
+        listing = dict(mtime=mtime, names=sorted(names), dirs=dirs, size=dict())
+        self._dirs[d] = listing
+        self._dirty = True
+
+        return listing
+
+    def _abspath(self, d):
+        return osp.join(self.basedir, d) if d else self.basedir
+
+    def _load(self):
+        if self.fcache is None or not osp.exists(self.fcache):
+            return
+        try:
+            with open(self.fcache, 'rb') as fp:
+                c = pickle.load(fp)
+            if c.get('version') == _MANIFEST_VERSION and \
+               c.get('basedir') == self.basedir:
+                self._dirs = c['dirs']
+        except Exception:
+            pass
+
+    def save(self):
+        """Write listings to fcache (atomically) if they changed.
+        """
+
+        if self.fcache is None or not self._dirty:
+            return
+
+        ftmp = '{0:s}.{1:d}.tmp'.format(self.fcache, os.getpid())
+        try:
+            os.makedirs(osp.dirname(self.fcache), exist_ok=True)
+            with open(ftmp, 'wb') as fp:
+                pickle.dump(dict(version=_MANIFEST_VERSION, basedir=self.basedir,
+                                 dirs=self._dirs), fp)
+            os.replace(ftmp, self.fcache)
+            self._dirty = False
+        except (IOError, OSError):
+            if osp.exists(ftmp):
+                os.remove(ftmp)
+
+
+def _match(names, pattern):
+    """Names matching pattern with glob semantics (hidden names are matched
+    only by patterns starting with '.')"""
+
+    if not any(c in pattern for c in '*?['):
+        return [pattern] if pattern in names else []
+
+    hidden = pattern.startswith('.')
+    return [n for n in names if (hidden or not n.startswith('.'))
+            and fnmatchcase(n, pattern)]
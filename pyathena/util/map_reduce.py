@@ -0,0 +1,413 @@
+"""
+Parallel map of per-snapshot analyses with ordered streaming reduction
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+from .task_scheduler import run_tasks
+
+def map_reduce(func, tasks, reduce=None, backend='process', nworkers=1,
+               comm=None, local=None, verbose=False):
+    """Apply func to all tasks in parallel and reduce results in the order of
+    tasks as they arrive.
+
+    Parameters
+    ----------
+    func : function
+        Function called with a task (e.g., snapshot number) as its only
+        argument.
+    tasks : sequence
+        Tasks. Must be the same on all ranks if backend is 'mpi'.
+    reduce : str or function
+        If None, return list of results. Otherwise, reduce(acc, r) returns
+        updated acc given the result r of next task (acc is None for the first
+        task), or name of built-in reduction: 'records' (dicts of scalars to
+        DataFrame), 'concat' (concatenate DataFrames), 'sum' (sum of numbers
+        or arrays, also in dicts), or 'hist' (sum of histograms, see
+        sum_hist).
+    backend : str
+        'process' (fork based multiprocessing pool), 'thread', 'mpi' (tasks
+        are handed out dynamically to ranks of comm and results are gathered
+        on all ranks; see task_scheduler.run_tasks), or 'serial'.
+    nworkers : int
+        Number of processes or threads. Default value is 1 (tasks are run
+        serially). If None, number of available cores (1 if running with more
+        than one MPI rank). Each process reads its own snapshots and has its
+        own grid_cache, so memory use grows with nworkers. Processes are
+        forked, so avoid the 'process' backend while other threads (e.g., of
+        iter_snapshots) are running.
+    comm : MPI communicator
+        Used for 'mpi' backend. If None, MPI.COMM_WORLD.
+    local : function
+        local(task) returns True if the task should be run in the calling
+        process rather than sent to a worker (e.g., the result is cached and
+        cheap to read).
+    verbose : bool
+        Print tasks as their results arrive.
+
+    Returns
+    -------
+    List of results or reduced result.
+
+    Examples
+    --------
+    >>> r = map_reduce(lambda num: s.read_hist2d(num), s.nums, reduce='hist',
+    ...                nworkers=8)
+    """
+
+    tasks = list(tasks)
+    reduce, finalize = _get_reduce(reduce)
+
+    acc = None
+    results = []
+    for task, r in zip(tasks, imap(func, tasks, backend=backend,
+                                   nworkers=nworkers, comm=comm, local=local)):
+        if verbose:
+            print(task, end=' ', flush=True)
+        if reduce is None:
+            results.append(r)
+        else:
+            acc = reduce(acc, r)
+
+    if verbose:
+        print('')
+
+    return results if reduce is None else finalize(acc)
+
+
+def map_reduce_incremental(func, tasks, fname, get_key, reduce=None,
+                           save=True, force_override=False, verbose=False,
+                           **kwargs):
+    """Incremental version of map_reduce that keeps the state of reduction in
+    a file and applies only tasks that were added or changed since the last
+    call.
+
+    Each task has a key (e.g., cache key of per-snapshot result, which changes
+    when the snapshot is replaced). For 'sum' and 'hist', the state is the
+    running sum and keys of included tasks. New tasks are added to the sum
+    only if the tasks of the previous call are the leading tasks with
+    unchanged keys (e.g., snapshots appended while a simulation is running);
+    otherwise, the sum is recomputed over all tasks (cheap if func reads
+    cached results, see local), so that the result is always identical to
+    that of map_reduce. For other reductions, per-task results are kept in
+    the state and reduced in the order of tasks.
+
+    Parameters
+    ----------
+    func : function
+        Function called with a task as its only argument.
+    tasks : sequence
+        Tasks.
+    fname : str
+        File (HDF5) in which the state is saved.
+    get_key : function
+        get_key(task) returns a string identifying the result of task.
+    reduce : str or function
+        See map_reduce.
+    save : bool
+        Save updated state to fname. Default value is True.
+    force_override : bool
+        Ignore saved state and run all tasks. Default value is False.
+    verbose : bool
+        Print tasks as their results arrive.
+    kwargs : dict
+        Passed to imap (backend, nworkers, comm, local). With 'mpi' backend,
+        comm must be given; the state is read on rank 0 and broadcast.
+
+    Returns
+    -------
+    List of results or reduced result (same as map_reduce).
+    """
+
+    from .analysis_cache import save_result, load_result
+
+    tasks = list(tasks)
+    if len(tasks) == 0:
+        return map_reduce(func, tasks, reduce=reduce)
+
+    keys = [get_key(task) for task in tasks]
+    tag = reduce if reduce is None or isinstance(reduce, str) else \
+        '{0:s}.{1:s}'.format(reduce.__module__, reduce.__qualname__)
+    summed = reduce in ('sum', 'hist')
+    # Top-level scalars of histograms (e.g., time_code) are kept per task
+    split = _split_scalars if reduce == 'hist' else (lambda r: (r, dict()))
+
+    # With MPI, all ranks must agree on the state (and tasks to run)
+    comm = kwargs.get('comm') if kwargs.get('backend') == 'mpi' else None
+    state = None
+    if comm is None or comm.rank == 0:
+        state = None if force_override else load_result(fname)
+        state = state[0] if state is not None else None
+    if comm is not None:
+        state = comm.bcast(state, root=0)
+    if state is None or state.get('reduce') != tag:
+        state = dict(reduce=tag, tasks=[], keys=[], acc=None, parts=[])
+
+    old = dict(zip(state['tasks'], state['keys']))
+    parts = dict(zip(state['tasks'], state['parts']))
+    new = [task for task, key in zip(tasks, keys) if old.get(task) != key]
+    changed = len(new) > 0 or list(state['tasks']) != tasks
+
+    acc = state['acc']
+    if summed:
+        reduce_ = _reducers[reduce][0]
+        nold = len(state['tasks'])
+        if list(state['tasks']) != tasks[:nold] or \
+           list(state['keys']) != keys[:nold]:
+            # Contributions cannot be removed without loss of precision;
+            # start over
+            acc = None
+            parts = dict()
+            new = tasks
+
+    if verbose and changed:
+        print('[map_reduce_incremental] {0:d} of {1:d} tasks to run:'.format(
+            len(new), len(tasks)), end=' ')
+    elif verbose:
+        print('[map_reduce_incremental] state is up to date.')
+
+    for task, r in zip(new, imap(func, new, **kwargs)):
+        if verbose:
+            print(task, end=' ', flush=True)
+        if summed:
+            if r is None:
+                parts[task] = None
+                continue
+            r, parts[task] = split(r)
+            acc = reduce_(acc, r)
+        else:
+            parts[task] = r
+
+    if verbose and changed:
+        print('')
+
+    if save and changed:
+        state = dict(reduce=tag, tasks=tasks, keys=keys, acc=acc,
+                     parts=[parts[task] for task in tasks])
+        try:
+            save_result(fname, state)
+        except (IOError, OSError) as e:
+            print('[map_reduce_incremental] Could not save to {0:s}: {1:s}'.\
+                  format(fname, str(e)))
+
+    if summed:
+        res = _copy(acc)
+        # Per-task scalars as lists in the order of tasks
+        parts = [parts[task] for task in tasks if parts[task] is not None]
+        if res is not None and parts:
+            for k in parts[0].keys():
+                res[k] = [p[k] for p in parts]
+        return res
+
+    if reduce is None:
+        return [parts[task] for task in tasks]
+
+    reduce_, finalize = _get_reduce(reduce)
+    acc = None
+    for task in tasks:
+        acc = reduce_(acc, parts[task])
+
+    return finalize(acc)
+
+
+def imap(func, tasks, backend='process', nworkers=1, comm=None, local=None):
+    """Generator of func(task) for all tasks in the order of tasks, computed
+    in parallel. See map_reduce for parameters.
+    """
+
+    tasks = list(tasks)
+    if backend not in ('process', 'thread', 'mpi', 'serial'):
+        raise ValueError('Unknown backend: {0:s}'.format(str(backend)))
+
+    if backend == 'mpi':
+        if comm is None:
+            from mpi4py import MPI
+            comm = MPI.COMM_WORLD
+        records = run_tasks(func, tasks, comm=comm, nretry=0,
+                            return_results=True, verbose=False)
+        failed = [rec for rec in records if rec['status'] == 'failed']
+        if failed:
+            raise RuntimeError('map failed for {0:d} tasks: '.format(len(failed)) +
+                               ', '.join(['{0!r} ({1:s})'.format(
+                                   rec['task'], rec['error']) for rec in failed]))
+        for rec in records:
+            yield rec['result']
+        return
+
+    if backend == 'serial':
+        nworkers = 1
+    elif nworkers is None:
+        nworkers = get_nworkers()
+
+    is_local = [local is not None and local(task) for task in tasks]
+    remote = [task for task, l in zip(tasks, is_local) if not l]
+    nworkers = min(nworkers, len(remote))
+    if nworkers <= 1:
+        for task in tasks:
+            yield func(task)
+        return
+
+    if backend == 'thread':
+        with ThreadPoolExecutor(nworkers) as executor:
+            it = executor.map(func, remote)
+            for task, l in zip(tasks, is_local):
+                yield func(task) if l else next(it)
+    else:
+        global _pool_func
+        _pool_func = func
+        try:
+            ctx = multiprocessing.get_context('fork')
+            with ctx.Pool(nworkers) as pool:
+                # imap returns results in order; chunksize=1 so that next task
+                # goes to the first free process
+                it = pool.imap(_pool_worker, remote, chunksize=1)
+                for task, l in zip(tasks, is_local):
+                    yield func(task) if l else next(it)
+        finally:
+            _pool_func = None
+
+
+def get_nworkers():
+    """Number of available cores, or 1 if running with more than one MPI
+    rank.
+    """
+
+    if 'mpi4py.MPI' in sys.modules and \
+       sys.modules['mpi4py.MPI'].COMM_WORLD.size > 1:
+        return 1
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Function run by pool workers (set before fork, so that it is not pickled)
+_pool_func = None
+
+def _pool_worker(task):
+    return _pool_func(task)
+
+
+def append_records(acc, r):
+    """Append dict of scalars (e.g., output of read_virial) to dict of lists.
+    Astropy quantities are converted to values. None is skipped.
+    """
+
+    if r is None:
+        return acc
+    if acc is None:
+        acc = dict([(k, []) for k in r.keys()])
+
+    for k in r.keys():
+        try:
+            acc[k].append(r[k].value.item())
+        except (AttributeError, ValueError):
+            acc[k].append(r[k])
+
+    return acc
+
+
+def concat(acc, r):
+    """Collect DataFrames (concatenated by finalize step of map_reduce)"""
+
+    if acc is None:
+        acc = []
+    acc.append(r)
+
+    return acc
+
+
+def add(acc, r):
+    """Sum of numbers or arrays, or dicts (nested) of numbers or arrays"""
+
+    if acc is None:
+        return _copy(r)
+    if isinstance(r, dict):
+        for k in r.keys():
+            acc[k] = add(acc.get(k), r[k])
+        return acc
+
+    return acc + r
+
+
+def sum_hist(acc, r, keys=('H', 'Hw')):
+    """Sum histograms (e.g., output of read_hist2d or read_pdf2d).
+
+    r is a dict of histograms, each of which is a dict with bin edges and
+    counts. Counts (keys) are summed while other entries (bin edges) are taken
+    from the first snapshot. Top-level scalars (e.g., time_code) are collected
+    into lists.
+    """
+
+    if acc is None:
+        acc = dict()
+        for k, v in r.items():
+            if isinstance(v, dict):
+                acc[k] = dict([(kk, np.array(vv, copy=True) if kk in keys else vv)
+                               for kk, vv in v.items()])
+            else:
+                acc[k] = [v]
+        return acc
+
+    for k, v in r.items():
+        if isinstance(v, dict):
+            for kk in keys:
+                if kk in v:
+                    acc[k][kk] += v[kk]
+        else:
+            acc[k].append(v)
+
+    return acc
+
+
+def _split_scalars(r):
+    """Split dict of histograms into histograms and top-level scalars"""
+
+    hist = dict([(k, v) for k, v in r.items() if isinstance(v, dict)])
+    scalars = dict([(k, v) for k, v in r.items() if not isinstance(v, dict)])
+
+    return hist, scalars
+
+
+def _copy(r):
+    if isinstance(r, dict):
+        return dict([(k, _copy(v)) for k, v in r.items()])
+    elif isinstance(r, np.ndarray):
+        return r.copy()
+    else:
+        return r
+
+
+def _records_final(acc):
+    return pd.DataFrame(acc if acc is not None else dict())
+
+
+def _concat_final(acc):
+    if acc is None:
+        return None
+    return pd.concat(acc)
+
+
+# name -> (reduce, finalize)
+_reducers = dict(
+    records=(append_records, _records_final),
+    concat=(concat, _concat_final),
+    sum=(add, lambda acc: acc),
+    hist=(sum_hist, lambda acc: acc),
+)
+
+def _get_reduce(reduce):
+    if reduce is None or callable(reduce):
+        return reduce, (lambda acc: acc)
+    try:
+        return _reducers[reduce]
+    except KeyError:
+        raise ValueError('Unknown reduce: {0:s}. Choose from {1:s}'.format(
+            str(reduce), ', '.join(_reducers.keys())))
@@ -0,0 +1,218 @@
+"""
+Dynamic (work-stealing) scheduler of independent tasks over MPI ranks or
+processes
+"""
+
+from __future__ import print_function
+
+import sys
+import time
+import traceback
+import multiprocessing
+import numpy as np
+
+def run_tasks(func, tasks, skip=None, nretry=1, comm=None, nprocs=1,
+              return_results=False, verbose=True):
+    """Run func(task) for all tasks, handing out tasks one at a time to
+    whichever MPI rank (or process) is free.
+
+    Unlike splitting tasks statically (split_container and COMM.scatter),
+    ranks that finish early keep taking tasks, so that expensive tasks (e.g.,
+    late snapshots with many star particles) do not leave other ranks idle.
+    Tasks are handed out in the given order; putting expensive tasks first
+    improves load balance further.
+
+    With MPI, the next task index is taken from a shared counter on rank 0
+    (MPI-3 one-sided atomic fetch-and-add), so all ranks work and no master
+    rank is needed. Without MPI, a multiprocessing pool is used if nprocs > 1
+    (fork start method), or tasks are run serially.
+
+    Parameters
+    ----------
+    func : function
+        Function called with a task as its only argument.
+    tasks : sequence
+        Tasks (e.g., snapshot numbers). Must be the same on all ranks.
+    skip : function
+        skip(task) returns True if the output of task already exists, in which
+        case the task is not run.
+    nretry : int
+        Number of times a failed task is retried. Default value is 1.
+    comm : MPI communicator
+        If None, MPI.COMM_WORLD is used if mpi4py.MPI has been imported.
+    nprocs : int
+        Number of processes used when not running with MPI. Default value is 1.
+    return_results : bool
+        If True, return values of func are included in records (must be
+        picklable with MPI or multiprocessing). Default value is False.
+    verbose : bool
+        Print progress and summary (on rank 0 only). Default value is True.
+
+    Returns
+    -------
+    records : list of dict
+        One record per task (in the order of tasks) with keys task, rank,
+        status ('done', 'skipped', or 'failed'), time [s], ntry, error (last
+        line of traceback of the last failure or None), and result. The same
+        list is returned on all ranks.
+
+    Examples
+    --------
+    >>> from mpi4py import MPI
+    >>> r = run_tasks(lambda num: s.read_prj(num), s.nums, comm=MPI.COMM_WORLD)
+    """
+
+    tasks = list(tasks)
+    if comm is None and 'mpi4py.MPI' in sys.modules:
+        comm = sys.modules['mpi4py.MPI'].COMM_WORLD
+    if comm is not None and comm.size == 1:
+        comm = None
+
+    rank = 0 if comm is None else comm.rank
+    verbose = verbose and rank == 0
+
+    def _run_one(i, rank):
+        task = tasks[i]
+        rec = dict(task=task, rank=rank, status=None, time=0.0, ntry=0,
+                   error=None, result=None)
+        t0 = time.time()
+        try:
+            if skip is not None and skip(task):
+                rec['status'] = 'skipped'
+        except Exception:
+            # Task is run if skip fails
+            print('[run_tasks] rank {0:d} task {1!r} skip failed: {2:s}'.\
+                  format(rank, task,
+                         traceback.format_exc().strip().splitlines()[-1]),
+                  flush=True)
+
+        while rec['status'] is None:
+            rec['ntry'] += 1
+            try:
+                res = func(task)
+                rec['status'] = 'done'
+                if return_results:
+                    rec['result'] = res
+            except Exception:
+                rec['error'] = traceback.format_exc().strip().splitlines()[-1]
+                print('[run_tasks] rank {0:d} task {1!r} try {2:d} failed: {3:s}'.\
+                      format(rank, task, rec['ntry'], rec['error']), flush=True)
+                if rec['ntry'] > nretry:
+                    rec['status'] = 'failed'
+
+        rec['time'] = time.time() - t0
+        return rec
+
+    t0 = time.time()
+    if comm is not None:
+        records = _run_mpi(comm, _run_one, len(tasks))
+    elif nprocs > 1 and len(tasks) > 1:
+        records = _run_pool(_run_one, len(tasks), nprocs)
+    else:
+        records = [(i, _run_one(i, 0)) for i in range(len(tasks))]
+
+    # Sort by index of task
+    records = [rec for _, rec in sorted(records, key=lambda x: x[0])]
+    if verbose:
+        print_task_summary(records, time.time() - t0)
+
+    return records
+
+
+def print_task_summary(records, walltime=None, nslowest=5):
+    """Print number of done/skipped/failed tasks, load of each rank, and
+    slowest tasks.
+    """
+
+    status = [rec['status'] for rec in records]
+    print('[run_tasks] {0:d} tasks: {1:d} done, {2:d} skipped, {3:d} failed'.\
+          format(len(records), status.count('done'), status.count('skipped'),
+                 status.count('failed')) +
+          ('' if walltime is None else ' in {0:.2f} s'.format(walltime)))
+
+    ranks = sorted(set([rec['rank'] for rec in records]))
+    for r in ranks:
+        t = [rec['time'] for rec in records if rec['rank'] == r]
+        print('  rank {0:3d}: {1:4d} tasks {2:10.2f} s'.format(r, len(t), sum(t)))
+
+    done = sorted([rec for rec in records if rec['status'] == 'done'],
+                  key=lambda rec: -rec['time'])
+    if done:
+        t = np.array([rec['time'] for rec in done])
+        print('  task time [s] mean: {0:.2f} median: {1:.2f} max: {2:.2f}'.format(
+            t.mean(), np.median(t), t.max()))
+        print('  slowest: ' + ', '.join(['{0!r} ({1:.2f} s)'.format(
+            rec['task'], rec['time']) for rec in done[:nslowest]]))
+
+    for rec in records:
+        if rec['status'] == 'failed':
+            print('  failed: {0!r} ({1:s})'.format(rec['task'], rec['error']))
+
+    sys.stdout.flush()
+
+
+def _run_mpi(comm, run_one, ntask):
+    """Run tasks taking next index from shared counter on rank 0.
+    Returns list of (index, record) of all ranks.
+    """
+
+    from mpi4py import MPI
+
+    itemsize = MPI.INT64_T.Get_size()
+    win = MPI.Win.Allocate(itemsize if comm.rank == 0 else 0, itemsize,
+                           comm=comm)
+    records = []
+    try:
+        if comm.rank == 0:
+            win.Lock(0)
+            win.Put(np.zeros(1, dtype=np.int64), 0)
+            win.Unlock(0)
+        comm.Barrier()
+
+        one = np.ones(1, dtype=np.int64)
+        idx = np.zeros(1, dtype=np.int64)
+        while True:
+            win.Lock(0, MPI.LOCK_SHARED)
+            win.Fetch_and_op(one, idx, 0, 0, MPI.SUM)
+            win.Unlock(0)
+            i = int(idx[0])
+            if i >= ntask:
+                break
+            records.append((i, run_one(i, comm.rank)))
+
+        comm.Barrier()
+    finally:
+        win.Free()
+
+    return [r for records_ in comm.allgather(records) for r in records_]
+
+
+# Function run by pool workers (set before fork, so that it is not pickled)
+_pool_run_one = None
+# Index of pool worker (0, ..., nprocs-1)
+_pool_rank = None
+
+def _pool_init(counter):
+    global _pool_rank
+
+    with counter.get_lock():
+        _pool_rank = counter.value
+        counter.value += 1
+
+def _pool_worker(i):
+    return (i, _pool_run_one(i, _pool_rank))
+
+def _run_pool(run_one, ntask, nprocs):
+    global _pool_run_one
+
+    _pool_run_one = run_one
+    try:
+        ctx = multiprocessing.get_context('fork')
+        counter = ctx.Value('i', 0)
+        with ctx.Pool(min(nprocs, ntask), initializer=_pool_init,
+                      initargs=(counter,)) as pool:
+            # chunksize=1: next task goes to the first free process
+            return list(pool.imap_unordered(_pool_worker, range(ntask),
+                                            chunksize=1))
+    finally:
+        _pool_run_one = None
@@ -0,0 +1,139 @@
+import os
+import logging
+
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from pyathena.load_sim import LoadSim
+from pyathena.util.analysis_cache import cached_analysis, cache_key, _KEEP_FILES
+
+class Sim(object):
+    """Minimal stand-in for LoadSim with vtk, starpar_vtk, and hst files"""
+
+    _get_fvtk = LoadSim._get_fvtk
+
+    def __init__(self, basedir, nums=(0, 1)):
+        self.basedir = basedir
+        self.savdir = os.path.join(basedir, 'sav')
+        self.problem_id = 'prob'
+        self.logger = logging.getLogger('test_analysis_cache')
+        self.nums = list(nums)
+        self.nums_starpar = list(nums)
+        self.files = dict(vtk=[], starpar_vtk=[],
+                          hst=os.path.join(basedir, 'prob.hst'))
+        for num in nums:
+            self.files['vtk'].append(self.touch('prob.{0:04d}.vtk'.format(num)))
+            self.files['starpar_vtk'].append(
+                self.touch('prob.{0:04d}.starpar.vtk'.format(num)))
+        self.touch('prob.hst')
+        self.calls = []
+
+    def touch(self, fname, mtime_ns=10**18):
+        fname = os.path.join(self.basedir, fname)
+        with open(fname, 'a'):
+            pass
+        os.utime(fname, ns=(mtime_ns, mtime_ns))
+        return fname
+
+    @cached_analysis
+    def read_vtk(self, num, savdir=None, force_override=False):
+        self.calls.append(('vtk', num))
+        return dict(num=num, a=np.arange(10.0))
+
+    @cached_analysis(source='starpar_vtk')
+    def read_sp(self, num, savdir=None, force_override=False):
+        self.calls.append(('sp', num))
+        return dict(num=num)
+
+    @cached_analysis
+    def read_vtk_all(self, nums=None, savdir=None, force_override=False):
+        self.calls.append(('vtk_all', nums))
+        return dict(n=len(self.nums if nums is None else nums))
+
+def test_invalidate_on_source_mtime(tmp_path):
+    s = Sim(str(tmp_path))
+    s.read_vtk(0)
+    s.read_vtk(0)
+    s.read_vtk(1)
+    assert s.calls == [('vtk', 0), ('vtk', 1)]
+
+    s.calls = []
+    s.touch('prob.0000.vtk', mtime_ns=2*10**18)
+    s.read_vtk(0)
+    s.read_vtk(1)
+    assert s.calls == [('vtk', 0)]
+
+def test_source_kind(tmp_path):
+    s = Sim(str(tmp_path))
+    s.read_sp(0)
+    s.read_vtk_all()
+
+    # History file is not a source of either
+    s.calls = []
+    s.touch('prob.hst', mtime_ns=2*10**18)
+    s.touch('prob.0000.vtk', mtime_ns=2*10**18)
+    s.read_sp(0)
+    assert s.calls == []
+    s.touch('prob.0000.starpar.vtk', mtime_ns=2*10**18)
+    s.read_sp(0)
+    assert s.calls == [('sp', 0)]
+
+    # Methods without num depend on all snapshots
+    s.calls = []
+    s.read_vtk_all()
+    s.read_vtk_all()
+    assert s.calls == [('vtk_all', None)]
+    s.touch('prob.0001.vtk', mtime_ns=2*10**18)
+    s.read_vtk_all()
+    assert len(s.calls) == 2
+
+def test_memory_tier_returns_copies(tmp_path):
+    s = Sim(str(tmp_path))
+    r = s.read_vtk(0)
+    r['a'][:] = -1.0
+    r = s.read_vtk(0)
+    assert np.array_equal(r['a'], np.arange(10.0))
+    r['a'] += 1.0
+    assert np.array_equal(s.read_vtk(0)['a'], np.arange(10.0))
+    assert s.calls == [('vtk', 0)]
+
+def test_old_files_removed(tmp_path):
+    s = Sim(str(tmp_path))
+    s.read_vtk(0)
+    s.read_vtk(1)
+    s.read_sp(0)
+    s.read_vtk_all()
+    def get_files(prefix):
+        # Cache files of a method are in savdir/<prefix>
+        dirname = os.path.join(s.savdir, prefix.split('_0')[0].rstrip('.'))
+        return sorted([f for f in os.listdir(dirname) if f.startswith(prefix)])
+
+    f0 = get_files('vtk_0000.')
+    assert len(f0) == 1
+    for i in range(2*_KEEP_FILES):
+        s.touch('prob.0000.vtk', mtime_ns=(i + 2)*10**18)
+        s.read_vtk(0)
+        fnames = get_files('vtk_0000.')
+        assert len(fnames) == min(i + 2, _KEEP_FILES)
+
+    # Most recent file is kept; other nums and methods are untouched
+    assert f0[0] not in fnames
+    assert len(get_files('vtk_0001.')) == 1
+    assert len(get_files('sp_0000.')) == 1
+    assert len(get_files('vtk_all.')) == 1
+    s.calls = []
+    s.read_vtk(0)
+    assert s.calls == []
+
+class Param(object):
+    def __init__(self, a):
+        self.a = a
+
+def test_key_of_object_argument():
+    k1 = cache_key('f', dict(p=Param(1.0)), 0, [])
+    assert k1 == cache_key('f', dict(p=Param(1.0)), 0, [])
+    assert k1 != cache_key('f', dict(p=Param(2.0)), 0, [])
+    with pytest.raises(TypeError):
+        cache_key('f', dict(p=object()), 0, [])
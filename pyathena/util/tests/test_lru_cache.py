@@ -0,0 +1,74 @@
+import threading
+
+import numpy as np
+
+from pyathena.util.lru_cache import LRUCache
+
+def get_array(n=100):
+    # 800 bytes
+    return np.zeros(n)
+
+def test_eviction():
+    c = LRUCache(maxbytes=2000)
+    c.put('a', get_array())
+    c.put('b', get_array())
+    assert len(c) == 2 and c.nbytes == 1600
+
+    # a is most recently used; b is evicted
+    assert c.get('a') is not None
+    c.put('c', get_array())
+    assert 'a' in c and 'b' not in c and 'c' in c
+    assert c.nbytes == 1600
+    assert c.stats() == dict(hits=1, misses=0, evictions=1, count=2,
+                             nbytes=1600, maxbytes=2000)
+
+    assert c.get('b') is None
+    assert c.get('b', 0) == 0
+    assert (c.hits, c.misses) == (1, 2)
+
+    # Replacing an item does not count twice
+    c.put('a', get_array(50))
+    assert len(c) == 2 and c.nbytes == 1200
+
+    # Shrinking the budget evicts least recently used items
+    c.maxbytes = 500
+    assert list(c._data.keys()) == ['a'] and c.evictions == 2
+
+    c.reset_stats()
+    assert (c.hits, c.misses, c.evictions) == (0, 0, 0)
+
+def test_oversize_and_clear():
+    c = LRUCache(maxbytes=1000)
+    c.put('a', get_array())
+    c.put('b', get_array(200))
+    assert 'b' not in c and 'a' in c and c.evictions == 0
+
+    # Oversize item replaces the old one without being stored
+    c.put('a', dict(x=get_array(), y=get_array()))
+    assert len(c) == 0 and c.nbytes == 0
+
+    c.put('a', (get_array(50), get_array(50)))
+    assert c.nbytes > 800
+    c.get('a')
+    c.clear()
+    assert len(c) == 0 and c.nbytes == 0 and c.hits == 1
+    assert LRUCache(maxbytes=0).get('a') is None
+
+def test_threads():
+    c = LRUCache(maxbytes=8000)
+    def worker(i):
+        for j in range(200):
+            key = (i + j) % 20
+            if c.get(key) is None:
+                c.put(key, get_array())
+            key in c
+            len(c)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(c) == 10 and c.nbytes == 8000
+    assert c.hits + c.misses == 8*200
@@ -0,0 +1,97 @@
+import os
+import glob
+
+import pytest
+
+from pyathena.util.manifest import Manifest
+
+OLD = 10**18
+
+def touch(path, mtime_ns=OLD):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'a'):
+        pass
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+def set_old_mtime(basedir):
+    """Set mtime of all directories to the past so that listings are cached"""
+    for d, _, _ in os.walk(basedir):
+        os.utime(d, ns=(OLD, OLD))
+
+@pytest.fixture
+def basedir(tmp_path):
+    basedir = str(tmp_path / 'sim')
+    for rank in range(12):
+        fname = 'prob.0000.vtk' if rank == 0 else \
+            'prob-id{0:d}.0000.vtk'.format(rank)
+        touch(os.path.join(basedir, 'id{0:d}'.format(rank), fname))
+    for fname in ['prob.0000.vtk', 'prob.0001.vtk', 'prob.0001.tar',
+                  '.prob.0002.vtk', 'prob.0000.starpar.vtk']:
+        touch(os.path.join(basedir, 'vtk', fname))
+    touch(os.path.join(basedir, '.hidden', 'prob.0003.vtk'))
+    touch(os.path.join(basedir, 'id0', 'prob.hst'))
+    touch(os.path.join(basedir, 'athinput.runtime'))
+    touch(os.path.join(basedir, 'id1x'))
+    set_old_mtime(basedir)
+
+    return basedir
+
+PATTERNS = [('id0', 'prob.????.vtk'),
+            ('id*', '*.????.vtk'),
+            ('id*',),
+            ('id[0-9]', '*-id*.0000.vtk'),
+            ('vtk', '*.????.vtk'),
+            ('vtk', '*'),
+            ('vtk', '.*'),
+            ('vtk', '.prob.????.vtk'),
+            ('*', '*.????.vtk'),
+            ('.*', '*.vtk'),
+            ('*', 'prob.hst'),
+            ('athinput.*',),
+            ('id0', 'prob.hst'),
+            ('id99', '*.vtk'),
+            ('vtk', 'prob.0001.tar'),
+            ('vtk', 'prob.9999.tar')]
+
+@pytest.mark.parametrize('parts', PATTERNS)
+def test_glob(basedir, parts):
+    m = Manifest(basedir)
+    assert m.glob(*parts) == sorted(glob.glob(os.path.join(basedir, *parts)))
+
+def test_refresh(basedir, tmp_path):
+    fcache = str(tmp_path / 'manifest.p')
+    m = Manifest(basedir, fcache=fcache)
+    assert len(m.glob('id*', '*.????.vtk')) == 12
+
+    # Listing is cached as long as mtime of the directory is unchanged
+    fname = os.path.join(basedir, 'id3', 'prob-id3.0001.vtk')
+    touch(fname)
+    os.utime(os.path.dirname(fname), ns=(OLD, OLD))
+    m.refresh()
+    assert len(m.glob('id*', '*.????.vtk')) == 12
+
+    os.utime(os.path.dirname(fname), ns=(2*OLD, 2*OLD))
+    m.refresh()
+    assert fname in m.glob('id*', '*.????.vtk')
+    assert m.getsize(fname) == 0
+
+    # New directory under basedir
+    touch(os.path.join(basedir, 'id12', 'prob-id12.0000.vtk'))
+    m.refresh()
+    parts = ('id*', '*.0000.vtk')
+    assert m.glob(*parts) == sorted(glob.glob(os.path.join(basedir, *parts)))
+    assert len(m.glob(*parts)) == 13
+
+    # Listings are saved and reused
+    set_old_mtime(basedir)
+    m.refresh()
+    m.glob('id*', '*.????.vtk')
+    m.save()
+    m2 = Manifest(basedir, fcache=fcache)
+    assert m2._dirs.keys() == m._dirs.keys()
+    assert m2.glob('id*', '*.????.vtk') == m.glob('id*', '*.????.vtk')
+
+    # Removed file is no longer listed
+    os.remove(fname)
+    m2.refresh()
+    assert fname not in m2.glob('id*', '*.????.vtk')
@@ -0,0 +1,113 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('h5py')
+
+from pyathena.util.map_reduce import map_reduce, map_reduce_incremental
+
+def get_hist(num, version=0):
+    rng = np.random.default_rng(100*num + version)
+    return dict(time_code=0.1*num,
+                dp=dict(xe=np.linspace(0.0, 1.0, 11),
+                        H=rng.uniform(0.0, 1.0, (10, 10))*1e8,
+                        Hw=rng.uniform(0.0, 1.0, (10, 10))/3.0))
+
+class Runner(object):
+    """Incremental map over nums with results that can be replaced"""
+
+    def __init__(self, fname, reduce):
+        self.fname = fname
+        self.reduce = reduce
+        self.versions = dict()
+        self.computed = []
+
+    def func(self, num):
+        self.computed.append(num)
+        r = get_hist(num, self.versions.get(num, 0))
+        if self.reduce == 'records':
+            return dict(time=r['time_code'], H=r['dp']['H'].sum())
+        return r
+
+    def get_key(self, num):
+        return '{0:d}.{1:d}'.format(num, self.versions.get(num, 0))
+
+    def __call__(self, nums):
+        self.computed = []
+        return map_reduce_incremental(self.func, nums, self.fname,
+                                      self.get_key, reduce=self.reduce,
+                                      backend='serial')
+
+    def full(self, nums):
+        return map_reduce(self.func, nums, reduce=self.reduce)
+
+def assert_hist_equal(h1, h2):
+    assert h1['time_code'] == h2['time_code']
+    for k in ('xe', 'H', 'Hw'):
+        assert np.array_equal(h1['dp'][k], h2['dp'][k])
+
+@pytest.mark.parametrize('reduce', ['hist', 'sum'])
+def test_incremental_append(tmp_path, reduce):
+    run = Runner(str(tmp_path / 'state.h5'), reduce)
+    run([0, 1, 2])
+    assert run.computed == [0, 1, 2]
+    r = run([0, 1, 2, 3])
+    assert run.computed == [3]
+    ref = run.full([0, 1, 2, 3])
+    if reduce == 'hist':
+        assert_hist_equal(r, ref)
+    else:
+        assert np.array_equal(r['dp']['H'], ref['dp']['H'])
+
+def test_incremental_remove_and_replace(tmp_path):
+    run = Runner(str(tmp_path / 'state.h5'), 'hist')
+    nums = list(range(6))
+    run(nums)
+
+    # Removing a num and alternating between subsets must give the same
+    # result as a full reduction (no accumulated round-off)
+    subset = nums[:2] + nums[3:]
+    for i in range(3):
+        assert_hist_equal(run(subset), run.full(subset))
+        assert_hist_equal(run(nums), run.full(nums))
+
+    run.versions[4] = 1
+    assert_hist_equal(run(nums), run.full(nums))
+    run([0, 1])
+    r = run([0, 1])
+    assert run.computed == []
+    assert_hist_equal(r, run.full([0, 1]))
+
+def test_incremental_records(tmp_path):
+    run = Runner(str(tmp_path / 'state.h5'), 'records')
+    run([0, 1, 2, 3])
+    df = run([0, 2, 3])
+    assert run.computed == []
+    assert list(df['time']) == [0.1*num for num in (0, 2, 3)]
+    run.versions[2] = 1
+    df = run([0, 2, 3])
+    assert run.computed == [2]
+    assert df.equals(run.full([0, 2, 3]))
+
+@pytest.mark.parametrize('backend, nworkers', [
+    ('serial', 1), ('process', 1), ('process', 3), ('thread', 3)])
+def test_map_reduce_backends(backend, nworkers):
+    nums = list(range(5))
+    ref = [get_hist(num) for num in nums]
+
+    # Results are in the order of tasks
+    r = map_reduce(get_hist, nums, backend=backend, nworkers=nworkers)
+    for r_, ref_ in zip(r, ref):
+        assert_hist_equal(r_, ref_)
+
+    h = map_reduce(get_hist, nums, reduce='hist', backend=backend,
+                   nworkers=nworkers)
+    assert h['time_code'] == [0.1*num for num in nums]
+    H = ref[0]['dp']['H'].copy()
+    for ref_ in ref[1:]:
+        H += ref_['dp']['H']
+    assert np.array_equal(h['dp']['H'], H)
+
+    df = map_reduce(lambda num: dict(num=num, t=0.1*num), nums,
+                    reduce='records', backend=backend, nworkers=nworkers,
+                    local=lambda num: num % 2 == 0)
+    assert list(df['num']) == nums
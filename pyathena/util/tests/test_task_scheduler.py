@@ -0,0 +1,67 @@
+import os
+
+import pytest
+
+from pyathena.util.task_scheduler import run_tasks
+
+class Task(object):
+    """Task 3 always fails, task 5 fails at the first try, task 6 is skipped,
+    and skip raises for task 7. Attempts are recorded as files so that they
+    are visible from pool workers.
+    """
+
+    def __init__(self, dirname):
+        self.dirname = dirname
+
+    def __call__(self, task):
+        if task == 3:
+            raise ValueError('bad task')
+        if task == 5:
+            fname = os.path.join(self.dirname, 'tried')
+            try:
+                os.close(os.open(fname, os.O_CREAT | os.O_EXCL))
+                raise RuntimeError('first try')
+            except FileExistsError:
+                pass
+
+        return task**2
+
+    def skip(self, task):
+        if task == 7:
+            raise IOError('cannot check output')
+        return task == 6
+
+@pytest.mark.parametrize('nprocs', [1, 3])
+def test_run_tasks(tmp_path, capfd, nprocs):
+    tasks = list(range(10))
+    task = Task(str(tmp_path))
+    records = run_tasks(task, tasks, skip=task.skip, nretry=2, nprocs=nprocs,
+                        return_results=True, verbose=False)
+
+    # Records are in the order of tasks
+    assert [rec['task'] for rec in records] == tasks
+    for rec in records:
+        t = rec['task']
+        if t == 3:
+            assert rec['status'] == 'failed' and rec['ntry'] == 3
+            assert rec['error'] == 'ValueError: bad task'
+            assert rec['result'] is None
+        elif t == 6:
+            assert rec['status'] == 'skipped' and rec['ntry'] == 0
+        else:
+            assert rec['status'] == 'done'
+            assert rec['result'] == t**2
+            assert rec['ntry'] == (2 if t == 5 else 1)
+
+    out = capfd.readouterr().out
+    assert 'task 7 skip failed: OSError: cannot check output' in out
+    assert out.count('task 3 try') == 3
+    if nprocs > 1:
+        assert set([rec['rank'] for rec in records]) <= set(range(nprocs))
+
+def test_no_retry(tmp_path):
+    task = Task(str(tmp_path))
+    records = run_tasks(task, [5, 3], nretry=0, verbose=False)
+    assert [rec['status'] for rec in records] == ['failed', 'failed']
+    assert records[0]['error'] == 'RuntimeError: first try'
+    assert [rec['result'] for rec in records] == [None, None]
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import os
+import os.path as osp
+import sys
+import json
+import subprocess
+import argparse
+
+# Statements timed in a fresh interpreter, and modules that they must not
+# import (importing them is a regression of lazy imports in pyathena)
+stmts_def = {
+    'import pyathena': ['yt', 'IPython', 'matplotlib', 'scipy', 'astropy',
+                        'pandas', 'xarray', 'pyathena.load_sim'],
+    'from pyathena import read_hst': ['yt', 'IPython', 'matplotlib', 'scipy'],
+    'from pyathena import LoadSim': ['yt', 'IPython', 'matplotlib', 'scipy',
+                                     'pyathena.classic'],
+}
+
+check_modules = ['yt', 'IPython', 'matplotlib', 'scipy', 'astropy', 'pandas',
+                 'xarray', 'pyathena.load_sim', 'pyathena.classic']
+
+code = '''
+import sys, time, json
+t0 = time.perf_counter()
+{stmt}
+t = time.perf_counter() - t0
+print(json.dumps(dict(time=t, modules=[m for m in {modules!r} if m in sys.modules])))
+'''
+
+parser = argparse.ArgumentParser(
+    description='''Measure time to import pyathena in a fresh interpreter and
+check that heavy dependencies (yt, matplotlib, scipy, IPython, ...) are not
+imported eagerly. Exit with status 1 if a check fails.''')
+
+parser.add_argument('-n', '--nrepeat', type=int, default=5,
+                    help='Number of interpreters started per statement')
+parser.add_argument('-t', '--max_time', type=float, default=None,
+                    help='Fail if median time of "import pyathena" [s] is larger')
+args = parser.parse_args()
+
+# Import pyathena from this repository
+env = dict(os.environ)
+repo = osp.dirname(osp.dirname(osp.abspath(__file__)))
+env['PYTHONPATH'] = os.pathsep.join([repo] + \
+    ([env['PYTHONPATH']] if 'PYTHONPATH' in env else []))
+
+failed = False
+for stmt, forbidden in stmts_def.items():
+    times = []
+    for i in range(args.nrepeat):
+        # -B: do not write bytecode so that every run starts from the same state
+        out = subprocess.check_output(
+            [sys.executable, '-B', '-c',
+             code.format(stmt=stmt, modules=check_modules)], env=env,
+            stderr=subprocess.DEVNULL)
+        res = json.loads(out.decode().strip().splitlines()[-1])
+        times.append(res['time'])
+
+    times.sort()
+    tmed = times[len(times)//2]
+    bad = [m for m in res['modules'] if m in forbidden]
+    print('{0:35s} median: {1:7.3f} s  min: {2:7.3f} s  imported: {3:s}'.format(
+        stmt, tmed, times[0], ', '.join(res['modules']) or '-'))
+    if bad:
+        print('  FAIL: imports {0:s}'.format(', '.join(bad)))
+        failed = True
+    if stmt == 'import pyathena' and args.max_time is not None and \
+       tmed > args.max_time:
+        print('  FAIL: median time > {0:g} s'.format(args.max_time))
+        failed = True
+
+sys.exit(1 if failed else 0)